@@ -1,9 +1,80 @@
-import uvicorn
+import argparse
+import multiprocessing
 import os
+import signal
+import time
+import uvicorn
+
+# 多进程模式 (--workers N，仅支持 POSIX 平台，依赖 fcntl)：
+#   每个工作进程监听独立端口 port, port+1, ..., port+N-1。
+#   第一个进程是主进程，独占大厅/隧道注册表、在线状态、事件流和管理接口；
+#   其余从进程处理无状态的路由，以及用主进程发布的房间镜像处理 GET /api/lobby/rooms 和 /api/lobby/rooms/search。
+#   所有进程通过共享内存共用限流额度、自动封禁、规则版本和房间镜像。
+#   Nginx 示例：
+#     upstream mcfrp_all { server 127.0.0.1:9000; server 127.0.0.1:9001; server 127.0.0.1:9002; server 127.0.0.1:9003; }
+#     upstream mcfrp_primary { server 127.0.0.1:9000; }
+#     map $request_method $mcfrp_rooms { GET mcfrp_all; default mcfrp_primary; }
+#     location ~ ^/api/lobby/rooms(/search)?$ { proxy_pass http://$mcfrp_rooms; ... }
+#     location ~ ^/api/(lobby|tunnel|admin)/ { proxy_pass http://mcfrp_primary; proxy_buffering off; ... }
+#     location / { proxy_pass http://mcfrp_all; ... }
+
+
+def _run_worker(role: str, host: str, port: int):
+    from src.shared_state import WORKER_ROLE_ENV
+    os.environ[WORKER_ROLE_ENV] = role
+    uvicorn.run("src.main:app", host=host, port=port, reload=False)
+
+
+def run_workers(workers: int, host: str, port: int):
+    """启动多进程模式，工作进程意外退出时自动重启"""
+    from src.shared_state import SharedState, SHARED_STATE_ENV, ROLE_PRIMARY, ROLE_SECONDARY
+
+    state = SharedState.create()
+    os.environ[SHARED_STATE_ENV] = state.name
+    ctx = multiprocessing.get_context("spawn")
+    specs = [(ROLE_PRIMARY if i == 0 else ROLE_SECONDARY, host, port + i) for i in range(workers)]
+    procs = [None] * workers
+
+    def _stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, _stop)
+    try:
+        while True:
+            for i, spec in enumerate(specs):
+                if procs[i] is None or not procs[i].is_alive():
+                    if procs[i] is not None:
+                        print(f"Worker on port {spec[2]} exited with {procs[i].exitcode}, restarting")
+                    procs[i] = ctx.Process(target=_run_worker, args=spec, daemon=False)
+                    procs[i].start()
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proc in procs:
+            if proc is not None and proc.is_alive():
+                proc.terminate()
+        for proc in procs:
+            if proc is not None:
+                proc.join()
+        state.close()
+
 
 if __name__ == "__main__":
-    # 在生产环境中，建议使用 gunicorn 或类似工具管理 uvicorn
-    # 但为了简单起见，这里直接启动
+    parser = argparse.ArgumentParser(description="MinecraftFRP Lobby Server")
     # host="0.0.0.0" 监听所有网卡
+    parser.add_argument("--host", default="0.0.0.0")
     # port=9000 服务端内部端口，Nginx反代到此端口
-    uvicorn.run("src.main:app", host="0.0.0.0", port=9000, reload=False)
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--workers", type=int, default=1, help="工作进程数，大于 1 时启用多进程模式")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        from src.shared_state import HAS_FCNTL
+        if not HAS_FCNTL:
+            # 共享状态的进程间锁依赖 fcntl
+            parser.error("--workers > 1 requires a POSIX platform (Linux/macOS); run a single worker instead")
+        run_workers(args.workers, args.host, args.port)
+    else:
+        # 单进程模式：所有状态都在本进程内
+        uvicorn.run("src.main:app", host=args.host, port=args.port, reload=False)
@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+from .database import insert_access_logs, prune_access_logs
+from .logger import logger
+
+# 原始访问日志（按天分表）保留天数
+ACCESS_LOG_RETENTION_DAYS = 14
+# 每小时汇总保留天数
+ACCESS_ROLLUP_RETENTION_DAYS = 90
+
+
+class AccessLogWriter:
+    """
+    访问日志后台批量写入器 (write-behind)
+
+    - 请求路径只调用 record()：一次 LRU 字典查询 + 追加到内存队列，不触碰 SQLite
+    - 去重：同一 (ip, action) 在 dedupe_window 秒内只记录一次（与旧实现的5分钟去重一致）
+    - 每小时汇总：每个请求（包括被去重的）都计入 (小时, IP) 和 (小时, 路由) 计数，随日志一起累加落库
+    - 后台线程每 flush_interval 秒或累计 batch_size 行时，在单个事务中批量写入
+    - 写入失败时日志行和汇总计数放回缓冲区，下次刷新重试；缓冲的行数超过 max_pending 时丢弃最早的行
+    - stop() 会写完剩余的日志后再退出
+    """
+
+    def __init__(self, dedupe_window: float = 300, max_entries: int = 100000,
+                 flush_interval: float = 0.5, batch_size: int = 500, max_pending: int = 100000):
+        """
+        :param dedupe_window: 去重时间窗口（秒）
+        :param max_entries: 去重 LRU 表的最大条目数，超出时淘汰最久未出现的 (ip, action)
+        :param flush_interval: 后台刷新间隔（秒）
+        :param batch_size: 队列达到该行数时立即刷新
+        :param max_pending: 写入失败后缓冲区保留的最大日志行数（汇总计数的键数同样以此为上限）
+        """
+        self.dedupe_window = dedupe_window
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+
+        # (ip, action) -> 最近一次写入日志的时间
+        self._seen = OrderedDict()
+        self._pending: List[Tuple[str, float, str]] = []
+        # (小时, ip) / (小时, action) -> 本批次的请求数
+        self._ip_counts: Dict[Tuple[int, str], int] = {}
+        self._route_counts: Dict[Tuple[int, str], int] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def record(self, client_ip: str, action: str, now: float = None) -> bool:
+        """记录一次访问，返回是否进入写入队列（被去重时返回 False）"""
+        if now is None:
+            now = time.time()
+        key = (client_ip, action)
+        last = self._seen.get(key)
+        duplicate = last is not None and now - last < self.dedupe_window
+        if not duplicate:
+            self._seen[key] = now
+        self._seen.move_to_end(key)
+        if len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+
+        hour = int(now) // 3600 * 3600
+        with self._lock:
+            self._ip_counts[hour, client_ip] = self._ip_counts.get((hour, client_ip), 0) + 1
+            self._route_counts[hour, action] = self._route_counts.get((hour, action), 0) + 1
+            if duplicate:
+                return False
+            self._pending.append((client_ip, now, action))
+            pending = len(self._pending)
+        if pending >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def flush(self) -> int:
+        """把队列中的日志和汇总计数写入数据库，返回写入的日志行数"""
+        with self._lock:
+            rows, self._pending = self._pending, []
+            ip_counts, self._ip_counts = self._ip_counts, {}
+            route_counts, self._route_counts = self._route_counts, {}
+        if not rows and not ip_counts:
+            return 0
+        try:
+            insert_access_logs(rows,
+                               [(hour, ip, n) for (hour, ip), n in ip_counts.items()],
+                               [(hour, action, n) for (hour, action), n in route_counts.items()])
+        except Exception as e:
+            dropped = self._restore(rows, ip_counts, route_counts)
+            logger.error(f"Failed to flush {len(rows)} access logs, will retry"
+                         f"{f' (dropped {dropped} oldest rows)' if dropped else ''}: {e}")
+            return 0
+        return len(rows)
+
+    def _restore(self, rows: list, ip_counts: dict, route_counts: dict) -> int:
+        """写入失败后把这一批放回缓冲区（排在新记录之前），返回因超出上限丢弃的行数"""
+        with self._lock:
+            self._pending[:0] = rows
+            dropped = max(0, len(self._pending) - self.max_pending)
+            if dropped:
+                del self._pending[:dropped]
+            for counts, restored in ((self._ip_counts, ip_counts), (self._route_counts, route_counts)):
+                for key, n in restored.items():
+                    if key in counts or len(counts) < self.max_pending:
+                        counts[key] = counts.get(key, 0) + n
+        return dropped
+
+    def prune(self, now: float = None) -> Tuple[int, int]:
+        """删除超出保留期的日志分表和汇总行"""
+        return prune_access_logs(ACCESS_LOG_RETENTION_DAYS, ACCESS_ROLLUP_RETENTION_DAYS, now)
+
+    def start(self):
+        """启动后台写入线程"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="AccessLogWriter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台线程并写完剩余日志"""
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+
+    def _run(self):
+        while self._running:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+
+# 全局实例
+access_logger = AccessLogWriter()
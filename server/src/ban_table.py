@@ -0,0 +1,92 @@
+import heapq
+import time
+from typing import Optional
+from .database import ban_ip, load_active_bans
+from .shared_state import SharedState, shared_state
+from .logger import logger
+
+
+class BanTable:
+    """
+    内存中的自动封禁表 (IP -> 解封时间)
+
+    - is_banned() 只查字典，不做任何 I/O
+    - 按解封时间排序的小顶堆用于过期清理，每次只弹出已到期的条目
+    - SQLite (blacklist 表) 只负责持久化，启动时通过 load() 恢复
+    - 多进程模式下封禁同时写入共享内存，其它进程查不到本地记录时再查共享表
+    """
+
+    def __init__(self, shared: Optional[SharedState] = None):
+        self._bans = {}
+        self._expiry_heap = []
+        self.shared = shared
+
+    def load(self) -> int:
+        """从数据库加载未过期的封禁记录，返回加载条数"""
+        self._bans.clear()
+        self._expiry_heap.clear()
+        try:
+            for ip, banned_until in load_active_bans():
+                self._add(ip, banned_until)
+        except Exception as e:
+            logger.error(f"Failed to load auto-bans: {e}")
+        return len(self._bans)
+
+    def ban(self, ip: str, duration_minutes: int = 10, reason: str = "Rate limit exceeded") -> float:
+        """封禁 IP：先写内存立即生效，再持久化到数据库"""
+        banned_until = time.time() + duration_minutes * 60
+        self._add(ip, banned_until)
+        if self.shared is not None:
+            self.shared.ban(ip, banned_until)
+        try:
+            ban_ip(ip, banned_until, reason)
+        except Exception as e:
+            logger.error(f"Failed to persist ban for {ip}: {e}")
+        return banned_until
+
+    def _add(self, ip: str, banned_until: float):
+        self._bans[ip] = banned_until
+        heapq.heappush(self._expiry_heap, (banned_until, ip))
+
+    def is_banned(self, ip: str, now: Optional[float] = None) -> bool:
+        """检查 IP 是否处于封禁期，顺带清理已到期的条目"""
+        if now is None:
+            now = time.time()
+        if self._expiry_heap and self._expiry_heap[0][0] <= now:
+            self.purge_expired(now)
+        banned_until = self._bans.get(ip)
+        if banned_until is not None and now < banned_until:
+            return True
+        if self.shared is not None:
+            # 其它进程产生的封禁，命中后缓存到本地表
+            banned_until = self.shared.banned_until(ip)
+            if now < banned_until:
+                self._add(ip, banned_until)
+                return True
+        return False
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """移除所有已到期的封禁，返回移除数量"""
+        if now is None:
+            now = time.time()
+        removed = 0
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            banned_until, ip = heapq.heappop(heap)
+            # 同一 IP 被重复封禁时堆中会有旧条目，只有与当前值一致才删除
+            if self._bans.get(ip) == banned_until:
+                del self._bans[ip]
+                removed += 1
+        return removed
+
+    def clear(self):
+        """清空内存表（测试使用；不影响数据库和共享内存中的记录）"""
+        self._bans.clear()
+        self._expiry_heap.clear()
+
+    def __len__(self):
+        return len(self._bans)
+
+
+# 全局实例
+auto_bans = BanTable(shared_state)
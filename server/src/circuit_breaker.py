@@ -0,0 +1,156 @@
+import time
+from typing import Dict, List, Optional
+from .metrics import counter, gauge
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# 进入 half_open 时放行的那一次试探
+TRIAL = "trial"
+
+BREAKER_OPEN = gauge("mcfrp_probe_breaker_open", "Probe targets whose circuit breaker is open or half-open",
+                     ("scope",))
+BREAKER_TRANSITIONS = counter("mcfrp_probe_breaker_transitions_total", "Probe circuit breaker state changes",
+                              ("scope", "state"))
+BREAKER_REJECTED = counter("mcfrp_probe_breaker_rejected_total", "Probes failed fast by an open circuit breaker",
+                           ("scope",))
+
+
+class _Breaker:
+    __slots__ = ("state", "failures", "last_failure", "open_until", "cooldown")
+
+    def __init__(self, cooldown: float):
+        self.state = CLOSED
+        self.failures = 0
+        self.last_failure = 0.0
+        self.open_until = 0.0
+        self.cooldown = cooldown
+
+
+class CircuitBreaker:
+    """
+    按目标（如 "host:port" 或 "host"）的熔断器
+
+    - closed: 正常放行；failure_window 秒内连续失败 failure_threshold 次后转为 open
+    - open: 冷却期内直接失败，不再探测
+    - half_open: 冷却期结束后只放行一次试探，其余调用仍直接失败；
+      试探成功则恢复 closed，失败则重新 open 且冷却期翻倍（不超过 max_cooldown）
+    只保存有失败记录的目标，成功后即删除；条目数超过 max_entries 时先丢弃仍是 closed 的条目。
+    """
+
+    def __init__(self, scope: str, failure_threshold: int = 3, cooldown: float = 30.0,
+                 max_cooldown: float = 300.0, failure_window: float = 120.0, max_entries: int = 10000):
+        self.scope = scope
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failure_window = failure_window
+        self.max_entries = max_entries
+        self._breakers: Dict[str, _Breaker] = {}
+        # open / half_open 的目标
+        self._open = set()
+
+        self._open_gauge = BREAKER_OPEN.labels(scope)
+        self._rejected = BREAKER_REJECTED.labels(scope)
+        self.rejected = 0
+        self.opened = 0
+
+    def __len__(self):
+        return len(self._breakers)
+
+    def state(self, key: str) -> str:
+        breaker = self._breakers.get(key)
+        return breaker.state if breaker else CLOSED
+
+    def allow(self, key: str, now: Optional[float] = None) -> Optional[str]:
+        """
+        是否放行一次调用
+        :return: CLOSED 正常调用；TRIAL 本次是 half_open 的唯一试探，调用方必须随后 record() 或 abandon()；
+                 None 直接失败
+        """
+        breaker = self._breakers.get(key)
+        if breaker is None or breaker.state == CLOSED:
+            return CLOSED
+        now = time.monotonic() if now is None else now
+        if breaker.state == OPEN and now >= breaker.open_until:
+            self._transition(breaker, HALF_OPEN)
+            return TRIAL
+        self.rejected += 1
+        self._rejected.inc()
+        return None
+
+    def abandon(self, key: str):
+        """放弃已领取的试探（未实际调用），下一次调用重新获得试探机会"""
+        breaker = self._breakers.get(key)
+        if breaker is not None and breaker.state == HALF_OPEN:
+            breaker.state = OPEN
+
+    def record(self, key: str, ok: bool, now: Optional[float] = None) -> bool:
+        """记录一次调用结果，返回本次是否使目标从 closed 进入熔断"""
+        breaker = self._breakers.get(key)
+        if ok:
+            if breaker is not None:
+                if breaker.state != CLOSED:
+                    self._transition(breaker, CLOSED)
+                    self._open.discard(key)
+                    self._update_gauge()
+                del self._breakers[key]
+            return False
+
+        now = time.monotonic() if now is None else now
+        if breaker is None:
+            if len(self._breakers) >= self.max_entries:
+                self._evict()
+            breaker = self._breakers[key] = _Breaker(self.cooldown)
+        if breaker.state == HALF_OPEN:
+            # 试探失败：重新熔断，冷却期翻倍
+            breaker.cooldown = min(breaker.cooldown * 2, self.max_cooldown)
+            breaker.last_failure = now
+            breaker.open_until = now + breaker.cooldown
+            self._transition(breaker, OPEN)
+            return False
+        if breaker.state == OPEN:
+            # 熔断前已发出的调用的结果
+            return False
+
+        if now - breaker.last_failure > self.failure_window:
+            breaker.failures = 0
+        breaker.failures += 1
+        breaker.last_failure = now
+        if breaker.failures >= self.failure_threshold:
+            breaker.open_until = now + breaker.cooldown
+            self._transition(breaker, OPEN)
+            self._open.add(key)
+            self._update_gauge()
+            self.opened += 1
+            return True
+        return False
+
+    def _transition(self, breaker: _Breaker, state: str):
+        breaker.state = state
+        BREAKER_TRANSITIONS.labels(self.scope, state).inc()
+
+    def _update_gauge(self):
+        self._open_gauge.set(len(self._open))
+
+    def _evict(self):
+        self._breakers = {k: b for k, b in self._breakers.items() if b.state != CLOSED}
+        if len(self._breakers) >= self.max_entries:
+            # 全部处于熔断状态：保留最近失败的一半
+            keep = sorted(self._breakers.items(), key=lambda item: item[1].last_failure,
+                          reverse=True)[:self.max_entries // 2]
+            self._breakers = dict(keep)
+            self._open = {k for k in self._open if k in self._breakers}
+            self._update_gauge()
+
+    def open_keys(self) -> List[str]:
+        return sorted(self._open)
+
+    def stats(self) -> dict:
+        return {
+            "tracked": len(self._breakers),
+            "open": len(self._open),
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
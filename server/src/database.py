@@ -1,431 +1,339 @@
 import sqlite3
 import time
 import json
-import threading
-from typing import List, Optional
-from .models import RoomCreate, RoomInfo
-from .logger import logger
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from .models import RoomInfo
+from .db_pool import ConnectionPool
+from .metrics import histogram
 
 DB_PATH = "data.db"
 
-# Global lock for thread safety
-_db_lock = threading.Lock()
+# 按线程复用的长连接池 (WAL 等 PRAGMA 只在建连时执行一次)
+_pool = ConnectionPool(DB_PATH)
+
+# 访问日志按天分表：access_logs_YYYYMMDD（本地日期），过期的分表整表删除
+ACCESS_LOG_PREFIX = "access_logs_"
+# 本进程已确认存在的分表，避免每批写入都执行 CREATE TABLE
+_access_partitions = set()
+
+# 每个数据库函数的调用耗时（以函数名为标签）
+DB_CALL_SECONDS = histogram("mcfrp_db_call_duration_seconds", "SQLite call time per database.py function",
+                            ("function",))
+_timed = DB_CALL_SECONDS.timed
 
 def get_db_connection():
-    """获取数据库连接，启用 WAL 模式"""
-    conn = sqlite3.connect(DB_PATH)
-    # 开启 WAL 模式以提升并发性能
-    conn.execute("PRAGMA journal_mode=WAL;")
-    return conn
+    """获取当前线程的复用连接。调用方不要 close()，写操作使用 `with conn:` 提交/回滚"""
+    return _pool.connection()
+
+def set_db_path(path: str):
+    """切换数据库文件（测试/基准使用），会关闭所有已缓存的连接"""
+    global DB_PATH
+    DB_PATH = path
+    _pool.reset(path)
+    _access_partitions.clear()
 
+def close_db():
+    """关闭所有连接（服务关闭时调用）"""
+    _pool.close_all()
+
+@_timed
 def init_db():
     conn = get_db_connection()
-    c = conn.cursor()
-    # 创建房间表
-    c.execute('''CREATE TABLE IF NOT EXISTS rooms
-                 (full_room_code TEXT PRIMARY KEY,
-                  remote_port INTEGER,
-                  node_id INTEGER,
-                  room_name TEXT,
-                  game_version TEXT,
-                  player_count INTEGER,
-                  max_players INTEGER,
-                  description TEXT,
-                  is_public INTEGER,
-                  host_player TEXT,
-                  server_addr TEXT,
-                  updated_at REAL,
-                  client_ip TEXT)''')
-    # 创建索引以便快速清理
-    c.execute('''CREATE INDEX IF NOT EXISTS idx_updated_at ON rooms (updated_at)''')
-    
-    # 创建黑名单表
-    c.execute('''CREATE TABLE IF NOT EXISTS blacklist
-                 (ip_address TEXT PRIMARY KEY,
-                  banned_until REAL,
-                  reason TEXT,
-                  created_at REAL)''')
-    
-    # 创建在线用户心跳表
-    c.execute('''CREATE TABLE IF NOT EXISTS online_users
-                 (client_ip TEXT PRIMARY KEY,
-                  last_heartbeat REAL)''')
-    c.execute('''CREATE INDEX IF NOT EXISTS idx_last_heartbeat ON online_users (last_heartbeat)''')
-    
-    # 创建黑名单规则表 (管理员手动添加)
-    c.execute('''CREATE TABLE IF NOT EXISTS blacklist_rules
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  rule TEXT UNIQUE,
-                  reason TEXT,
-                  created_at REAL)''')
-
-    # 创建白名单规则表 (管理员手动添加)
-    c.execute('''CREATE TABLE IF NOT EXISTS whitelist_rules
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  rule TEXT UNIQUE,
-                  description TEXT,
-                  expires_at REAL,
-                  created_at REAL)''')
-
-    # 创建访问日志表 (记录所有上线过的IP)
-    c.execute('''CREATE TABLE IF NOT EXISTS access_logs
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  client_ip TEXT,
-                  timestamp REAL,
-                  action TEXT)''')
-    c.execute('''CREATE INDEX IF NOT EXISTS idx_access_logs_ip ON access_logs (client_ip)''')
-    c.execute('''CREATE INDEX IF NOT EXISTS idx_access_logs_ts ON access_logs (timestamp)''')
-
-    # 创建活跃隧道表 (记录所有正在进行 Tunnel Validation 的客户端)
-    c.execute('''CREATE TABLE IF NOT EXISTS active_tunnels
-                 (client_ip TEXT,
-                  server_addr TEXT,
-                  remote_port INTEGER,
-                  last_heartbeat REAL,
-                  PRIMARY KEY (server_addr, remote_port))''')
-    c.execute('''CREATE INDEX IF NOT EXISTS idx_tunnel_heartbeat ON active_tunnels (last_heartbeat)''')
-
-    conn.commit()
-    conn.close()
-
-def upsert_tunnel(client_ip: str, server_addr: str, remote_port: int):
-    """更新活跃隧道心跳"""
-    conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        now = time.time()
-        c.execute("INSERT OR REPLACE INTO active_tunnels (client_ip, server_addr, remote_port, last_heartbeat) VALUES (?, ?, ?, ?)", 
-                  (client_ip, server_addr, remote_port, now))
-        conn.commit()
-    finally:
-        conn.close()
-
-def cleanup_stale_tunnels(timeout_seconds: int = 40) -> int:
-    """清理超时的活跃隧道 (默认40秒，客户端每15秒发一次)"""
-    conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        threshold = time.time() - timeout_seconds
-        c.execute("DELETE FROM active_tunnels WHERE last_heartbeat < ?", (threshold,))
-        deleted = c.rowcount
-        conn.commit()
-        return deleted
-    finally:
-        conn.close()
-
-def get_active_tunnels() -> List[dict]:
-    """获取所有活跃隧道信息"""
+    with conn:
+        c = conn.cursor()
+        # 创建房间表
+        c.execute('''CREATE TABLE IF NOT EXISTS rooms
+                     (full_room_code TEXT PRIMARY KEY,
+                      remote_port INTEGER,
+                      node_id INTEGER,
+                      room_name TEXT,
+                      game_version TEXT,
+                      player_count INTEGER,
+                      max_players INTEGER,
+                      description TEXT,
+                      is_public INTEGER,
+                      host_player TEXT,
+                      server_addr TEXT,
+                      updated_at REAL,
+                      client_ip TEXT)''')
+        # 创建索引以便快速清理
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_updated_at ON rooms (updated_at)''')
+
+        # 创建黑名单表
+        c.execute('''CREATE TABLE IF NOT EXISTS blacklist
+                     (ip_address TEXT PRIMARY KEY,
+                      banned_until REAL,
+                      reason TEXT,
+                      created_at REAL)''')
+
+        # 创建在线统计表 (按小时/按天的独立用户 HyperLogLog 草图和在线峰值)
+        c.execute('''CREATE TABLE IF NOT EXISTS presence_stats
+                     (bucket TEXT PRIMARY KEY,
+                      peak INTEGER,
+                      sketch BLOB)''')
+
+        # 创建黑名单规则表 (管理员手动添加)
+        c.execute('''CREATE TABLE IF NOT EXISTS blacklist_rules
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      rule TEXT UNIQUE,
+                      reason TEXT,
+                      created_at REAL)''')
+
+        # 创建白名单规则表 (管理员手动添加)
+        c.execute('''CREATE TABLE IF NOT EXISTS whitelist_rules
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      rule TEXT UNIQUE,
+                      description TEXT,
+                      expires_at REAL,
+                      created_at REAL)''')
+
+        # 访问日志按天分表（见 insert_access_logs），这里只建每小时汇总表：
+        # 每个 IP / 每个路由每小时的请求数（含去重前的全部请求），管理后台的统计查询只读汇总表
+        c.execute('''CREATE TABLE IF NOT EXISTS access_rollup_ip
+                     (hour INTEGER,
+                      client_ip TEXT,
+                      requests INTEGER,
+                      PRIMARY KEY (hour, client_ip)) WITHOUT ROWID''')
+        c.execute('''CREATE TABLE IF NOT EXISTS access_rollup_route
+                     (hour INTEGER,
+                      action TEXT,
+                      requests INTEGER,
+                      PRIMARY KEY (hour, action)) WITHOUT ROWID''')
+
+        # 创建活跃隧道表 (记录所有正在进行 Tunnel Validation 的客户端)
+        c.execute('''CREATE TABLE IF NOT EXISTS active_tunnels
+                     (client_ip TEXT,
+                      server_addr TEXT,
+                      remote_port INTEGER,
+                      last_heartbeat REAL,
+                      PRIMARY KEY (server_addr, remote_port))''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_tunnel_heartbeat ON active_tunnels (last_heartbeat)''')
+
+def _fetch_dicts(sql: str, params=()) -> List[dict]:
+    """执行查询并以字典列表返回（row_factory 只设置在游标上，不污染共享连接）"""
+    c = get_db_connection().cursor()
+    c.row_factory = sqlite3.Row
+    c.execute(sql, params)
+    return [dict(row) for row in c.fetchall()]
+
+def tunnel_row(tunnel: dict) -> tuple:
+    """active_tunnels 表的一行"""
+    return (tunnel["client_ip"], tunnel["server_addr"], tunnel["remote_port"], tunnel["last_heartbeat"])
+
+@_timed
+def save_tunnels(rows: List[tuple], removed_keys: List[tuple]):
+    """写入活跃隧道快照：变化的行（tunnel_row() 生成）覆盖写入，已移除的 (server_addr, remote_port) 删除（单个事务）"""
     conn = get_db_connection()
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    try:
-        c.execute("SELECT * FROM active_tunnels ORDER BY last_heartbeat DESC")
-        rows = c.fetchall()
-        return [dict(row) for row in rows]
-    finally:
-        conn.close()
-
-def log_access(client_ip: str, action: str = "connect"):
-    """记录访问日志"""
+    with conn:
+        if removed_keys:
+            conn.executemany("DELETE FROM active_tunnels WHERE server_addr = ? AND remote_port = ?", removed_keys)
+        if rows:
+            conn.executemany("INSERT OR REPLACE INTO active_tunnels (client_ip, server_addr, remote_port, last_heartbeat) VALUES (?, ?, ?, ?)",
+                             rows)
+
+@_timed
+def load_tunnels() -> List[dict]:
+    """读取持久化的隧道快照（启动时恢复内存注册表）"""
+    return _fetch_dicts("SELECT * FROM active_tunnels")
+
+def _access_partition(ts: float) -> str:
+    return ACCESS_LOG_PREFIX + time.strftime("%Y%m%d", time.localtime(ts))
+
+def _access_partition_names(conn) -> List[str]:
+    """现有的访问日志分表，按日期升序"""
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?",
+                        (ACCESS_LOG_PREFIX + "[0-9]" * 8,)).fetchall()
+    return sorted(name for (name,) in rows)
+
+@_timed
+def insert_access_logs(rows: List[tuple], ip_counts: List[tuple] = (), route_counts: List[tuple] = ()):
+    """
+    批量写入访问日志，单个事务提交
+    :param rows: (client_ip, timestamp, action)，按日期写入对应的分表
+    :param ip_counts: (hour, client_ip, requests)，累加到每小时 IP 汇总
+    :param route_counts: (hour, action, requests)，累加到每小时路由汇总
+    """
+    partitions = defaultdict(list)
+    for row in rows:
+        partitions[_access_partition(row[1])].append(row)
     conn = get_db_connection()
-    c = conn.cursor()
-    try:
+    with conn:
+        for name, part in partitions.items():
+            if name not in _access_partitions:
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {name} "
+                             "(id INTEGER PRIMARY KEY, client_ip TEXT, timestamp REAL, action TEXT)")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{name}_ip ON {name} (client_ip)")
+            conn.executemany(f"INSERT INTO {name} (client_ip, timestamp, action) VALUES (?, ?, ?)", part)
+        if ip_counts:
+            conn.executemany("INSERT INTO access_rollup_ip (hour, client_ip, requests) VALUES (?, ?, ?) "
+                             "ON CONFLICT (hour, client_ip) DO UPDATE SET requests = requests + excluded.requests",
+                             ip_counts)
+        if route_counts:
+            conn.executemany("INSERT INTO access_rollup_route (hour, action, requests) VALUES (?, ?, ?) "
+                             "ON CONFLICT (hour, action) DO UPDATE SET requests = requests + excluded.requests",
+                             route_counts)
+    # 事务提交后才记入缓存，回滚时下次会重新建表
+    _access_partitions.update(partitions)
+
+@_timed
+def prune_access_logs(retention_days: int, rollup_retention_days: int, now: Optional[float] = None) -> Tuple[int, int]:
+    """
+    删除超出保留期的访问日志：整张删除过期的日分表，按小时范围删除过期的汇总行。
+    删除释放的页由 SQLite 复用，数据库文件大小随保留窗口稳定，无需 VACUUM。
+    :return: (删除的分表数, 删除的汇总行数)
+    """
+    if now is None:
         now = time.time()
-        # 简单的去重逻辑：如果该IP在最近5分钟内有相同操作，则不记录
-        threshold = now - 300
-        c.execute("SELECT id FROM access_logs WHERE client_ip = ? AND action = ? AND timestamp > ?", (client_ip, action, threshold))
-        if not c.fetchone():
-            c.execute("INSERT INTO access_logs (client_ip, timestamp, action) VALUES (?, ?, ?)", (client_ip, now, action))
-            conn.commit()
-    except Exception as e:
-        logger.error(f"Failed to log access: {e}")
-    finally:
-        conn.close()
-
+    cutoff = _access_partition(now - retention_days * 86400)
+    rollup_cutoff = int(now - rollup_retention_days * 86400) // 3600 * 3600
+    conn = get_db_connection()
+    with conn:
+        expired = [name for name in _access_partition_names(conn) if name < cutoff]
+        for name in expired:
+            conn.execute(f"DROP TABLE IF EXISTS {name}")
+            _access_partitions.discard(name)
+        removed = conn.execute("DELETE FROM access_rollup_ip WHERE hour < ?", (rollup_cutoff,)).rowcount
+        removed += conn.execute("DELETE FROM access_rollup_route WHERE hour < ?", (rollup_cutoff,)).rowcount
+
+        # 分表之前的单表 access_logs：按时间清理，清空后删除
+        legacy = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'access_logs'").fetchone()
+        if legacy:
+            conn.execute("DELETE FROM access_logs WHERE timestamp < ?", (now - retention_days * 86400,))
+            if conn.execute("SELECT 1 FROM access_logs LIMIT 1").fetchone() is None:
+                conn.execute("DROP TABLE access_logs")
+    return len(expired), removed
+
+@_timed
 def add_blacklist_rule(rule: str, reason: str):
     conn = get_db_connection()
-    c = conn.cursor()
-    try:
+    with conn:
         now = time.time()
-        c.execute("INSERT OR REPLACE INTO blacklist_rules (rule, reason, created_at) VALUES (?, ?, ?)", (rule, reason, now))
-        conn.commit()
-    finally:
-        conn.close()
+        conn.execute("INSERT OR REPLACE INTO blacklist_rules (rule, reason, created_at) VALUES (?, ?, ?)", (rule, reason, now))
 
+@_timed
 def remove_blacklist_rule(rule: str):
     conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        c.execute("DELETE FROM blacklist_rules WHERE rule = ?", (rule,))
-        conn.commit()
-    finally:
-        conn.close()
+    with conn:
+        conn.execute("DELETE FROM blacklist_rules WHERE rule = ?", (rule,))
 
+@_timed
 def get_blacklist_rules():
-    conn = get_db_connection()
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    try:
-        c.execute("SELECT * FROM blacklist_rules ORDER BY created_at DESC")
-        return [dict(row) for row in c.fetchall()]
-    finally:
-        conn.close()
+    return _fetch_dicts("SELECT * FROM blacklist_rules ORDER BY created_at DESC")
 
+@_timed
 def add_whitelist_rule(rule: str, description: str, duration_minutes: int = 0):
     conn = get_db_connection()
-    c = conn.cursor()
-    try:
+    with conn:
         now = time.time()
         expires_at = (now + duration_minutes * 60) if duration_minutes > 0 else 0
-        c.execute("INSERT OR REPLACE INTO whitelist_rules (rule, description, expires_at, created_at) VALUES (?, ?, ?, ?)", (rule, description, expires_at, now))
-        conn.commit()
-    finally:
-        conn.close()
+        conn.execute("INSERT OR REPLACE INTO whitelist_rules (rule, description, expires_at, created_at) VALUES (?, ?, ?, ?)", (rule, description, expires_at, now))
 
+@_timed
 def remove_whitelist_rule(rule: str):
     conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        c.execute("DELETE FROM whitelist_rules WHERE rule = ?", (rule,))
-        conn.commit()
-    finally:
-        conn.close()
+    with conn:
+        conn.execute("DELETE FROM whitelist_rules WHERE rule = ?", (rule,))
 
+@_timed
 def get_whitelist_rules():
+    return _fetch_dicts("SELECT * FROM whitelist_rules ORDER BY created_at DESC")
+
+@_timed
+def get_access_logs(limit: int = 100) -> List[dict]:
+    """最近的访问日志（从最新的分表往前读，按写入顺序倒序，不做全表排序）"""
     conn = get_db_connection()
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    try:
-        c.execute("SELECT * FROM whitelist_rules ORDER BY created_at DESC")
-        return [dict(row) for row in c.fetchall()]
-    finally:
-        conn.close()
-
-def get_access_logs(limit: int = 100):
+    logs = []
+    for name in reversed(_access_partition_names(conn)):
+        logs += _fetch_dicts(f"SELECT * FROM {name} ORDER BY id DESC LIMIT ?", (limit - len(logs),))
+        if len(logs) >= limit:
+            break
+    return logs
+
+@_timed
+def get_access_stats(since_hour: int, limit: int = 20) -> Dict[str, List[dict]]:
+    """从每小时汇总表统计 since_hour 之后的请求数：按小时的总数、请求最多的 IP 和路由"""
+    return {
+        "hourly": _fetch_dicts("SELECT hour, SUM(requests) AS requests FROM access_rollup_route "
+                               "WHERE hour >= ? GROUP BY hour ORDER BY hour", (since_hour,)),
+        "top_ips": _fetch_dicts("SELECT client_ip, SUM(requests) AS requests FROM access_rollup_ip "
+                                "WHERE hour >= ? GROUP BY client_ip ORDER BY requests DESC LIMIT ?",
+                                (since_hour, limit)),
+        "top_routes": _fetch_dicts("SELECT action, SUM(requests) AS requests FROM access_rollup_route "
+                                   "WHERE hour >= ? GROUP BY action ORDER BY requests DESC LIMIT ?",
+                                   (since_hour, limit))
+    }
+
+@_timed
+def save_presence_stats(rows: List[tuple]):
+    """写入在线统计 (bucket, peak, sketch)，单个事务提交"""
     conn = get_db_connection()
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    try:
-        c.execute("SELECT * FROM access_logs ORDER BY timestamp DESC LIMIT ?", (limit,))
-        return [dict(row) for row in c.fetchall()]
-    finally:
-        conn.close()
-
-def update_online_heartbeat(client_ip: str):
-    """更新在线用户心跳时间"""
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO presence_stats (bucket, peak, sketch) VALUES (?, ?, ?)", rows)
+
+@_timed
+def load_presence_stats(buckets: Optional[List[str]] = None) -> List[dict]:
+    """读取在线统计；buckets 为空时返回全部，按 bucket 排序"""
+    if buckets is None:
+        return _fetch_dicts("SELECT * FROM presence_stats ORDER BY bucket")
+    if not buckets:
+        return []
+    placeholders = ", ".join("?" * len(buckets))
+    return _fetch_dicts(f"SELECT * FROM presence_stats WHERE bucket IN ({placeholders}) ORDER BY bucket", buckets)
+
+@_timed
+def prune_presence_stats(hourly_cutoff: str, daily_cutoff: str) -> int:
+    """删除早于截止时段的在线统计（小时 bucket "YYYY-MM-DD HH" / 天 bucket "YYYY-MM-DD" 各自的截止），返回删除行数"""
     conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        now = time.time()
-        c.execute("INSERT OR REPLACE INTO online_users VALUES (?, ?)", (client_ip, now))
-        conn.commit()
-    finally:
-        conn.close()
-
-def get_online_count(timeout_seconds: int = 15) -> int:
-    """获取在线用户数量（超过timeout_seconds未心跳的视为离线）"""
-    with _db_lock:
-        conn = get_db_connection()
-        c = conn.cursor()
-        threshold = time.time() - timeout_seconds
-        c.execute("SELECT COUNT(*) FROM online_users WHERE last_heartbeat >= ?", (threshold,))
-        count = c.fetchone()[0]
-        return count
-
-def get_online_users_list(timeout_seconds: int = 15) -> List[dict]:
-    """获取在线用户列表（软件在线）"""
-    with _db_lock:
-        conn = get_db_connection()
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        threshold = time.time() - timeout_seconds
-        c.execute("SELECT * FROM online_users WHERE last_heartbeat >= ? ORDER BY last_heartbeat DESC", (threshold,))
-        return [dict(row) for row in c.fetchall()]
+    with conn:
+        return conn.execute("DELETE FROM presence_stats WHERE (length(bucket) > 10 AND bucket < ?) "
+                            "OR (length(bucket) = 10 AND bucket < ?)", (hourly_cutoff, daily_cutoff)).rowcount
 
-def cleanup_offline_users(timeout_seconds: int = 15) -> int:
-    """清理超时的离线用户"""
+@_timed
+def ban_ip(ip: str, banned_until: float, reason: str = "Rate limit exceeded"):
+    """持久化 IP 自动封禁记录（内存中的封禁表见 ban_table.py）"""
     conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        threshold = time.time() - timeout_seconds
-        c.execute("DELETE FROM online_users WHERE last_heartbeat < ?", (threshold,))
-        deleted = c.rowcount
-        conn.commit()
-    finally:
-        conn.close()
-    return deleted
-
-def ban_ip(ip: str, duration_minutes: int = 10, reason: str = "Rate limit exceeded"):
-    """封禁 IP 指定时长"""
-    conn = get_db_connection()
-    c = conn.cursor()
-    try:
+    with conn:
         now = time.time()
-        banned_until = now + (duration_minutes * 60)
-        c.execute("INSERT OR REPLACE INTO blacklist VALUES (?, ?, ?, ?)",
-                  (ip, banned_until, reason, now))
-        conn.commit()
-    finally:
-        conn.close()
-
-def is_ip_banned(ip: str) -> bool:
-    """检查 IP 是否被封禁，如果封禁过期则自动解封"""
-    conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        c.execute("SELECT banned_until FROM blacklist WHERE ip_address = ?", (ip,))
-        row = c.fetchone()
-        
-        is_banned = False
-        if row:
-            banned_until = row[0]
-            if time.time() < banned_until:
-                is_banned = True
-            else:
-                # 封禁已过期，移除记录
-                c.execute("DELETE FROM blacklist WHERE ip_address = ?", (ip,))
-                conn.commit()
-    finally:
-        conn.close()
-    return is_banned
-
-def check_ip_conflict(client_ip: str, full_room_code: str) -> bool:
-    """检查同一IP是否已开设其他房间（防多开）"""
-    existing_room_code = None
-    conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        # 查找 IP 相同但房间号不同的记录
-        c.execute("SELECT full_room_code FROM rooms WHERE client_ip = ? AND full_room_code != ?", (client_ip, full_room_code))
-        row = c.fetchone()
-        if row:
-            existing_room_code = row[0]
-    finally:
-        conn.close()
-    
-    if existing_room_code:
-        logger.warning(f"Conflict found for IP {client_ip}: Requesting {full_room_code}, but {existing_room_code} already exists.")
-        return True
-    
-    # logger.info(f"No conflict for IP {client_ip} ({full_room_code})") # Debug log
-    return False
-
-def upsert_room(room: RoomCreate, client_ip: str):
+        conn.execute("INSERT OR REPLACE INTO blacklist VALUES (?, ?, ?, ?)",
+                     (ip, banned_until, reason, now))
+
+@_timed
+def load_active_bans() -> List[tuple]:
+    """读取所有未过期的自动封禁 (ip_address, banned_until)"""
+    c = get_db_connection().execute("SELECT ip_address, banned_until FROM blacklist WHERE banned_until > ?", (time.time(),))
+    return c.fetchall()
+
+@_timed
+def cleanup_expired_bans() -> int:
+    """删除已过期的自动封禁记录"""
     conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        now = time.time()
-        
-        # 客户端默认值列表（这些值应该被服务端探测结果覆盖）
-        CLIENT_DEFAULT_VERSIONS = ("未知版本", "1.20.1", "")
-        
-        # 先检查房间是否已存在，如果存在则保留已探测的 game_version 和 description
-        c.execute("SELECT game_version, description FROM rooms WHERE full_room_code = ?", (room.full_room_code,))
-        existing = c.fetchone()
-
-        if existing:
-            # 房间已存在，保留服务端探测的版本和描述（如果有效）
-            existing_version, existing_desc = existing
-
-            # 版本优先级逻辑：
-            if existing_version and existing_version not in CLIENT_DEFAULT_VERSIONS:
-                # 已有有效的探测版本，保留它
-                game_version = existing_version
-            elif room.game_version in CLIENT_DEFAULT_VERSIONS:
-                # 客户端发的也是默认值，保持现有（可能是等待探测中）
-                game_version = existing_version or room.game_version
-            else:
-                # 客户端发来了有效版本，使用它
-                game_version = room.game_version
-
-            # 描述同理：保留非空的现有描述
-            description = existing_desc if existing_desc else room.description
-
-            # 更新房间信息，但保留探测到的版本和描述
-            c.execute('''UPDATE rooms SET 
-                         remote_port = ?, node_id = ?, room_name = ?, game_version = ?,
-                         player_count = ?, max_players = ?, description = ?, is_public = ?,
-                         host_player = ?, server_addr = ?, updated_at = ?, client_ip = ?
-                         WHERE full_room_code = ?''',
-                      (room.remote_port, room.node_id, room.room_name, game_version,
-                       room.player_count, room.max_players, description, 1 if room.is_public else 0,
-                       room.host_player, room.server_addr, now, client_ip, room.full_room_code))
-        else:
-            # 新房间，直接插入
-            c.execute('''INSERT INTO rooms VALUES 
-                         (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                      (room.full_room_code, room.remote_port, room.node_id,
-                       room.room_name, room.game_version, room.player_count,
-                       room.max_players, room.description, 1 if room.is_public else 0,
-                       room.host_player, room.server_addr, now, client_ip))
-
-        conn.commit()
-    finally:
-        conn.close()
-
-def delete_room(remote_port: int, node_id: int):
-    full_room_code = f"{remote_port}_{node_id}"
+    with conn:
+        c = conn.execute("DELETE FROM blacklist WHERE banned_until <= ?", (time.time(),))
+        return c.rowcount
+
+def room_row(room: RoomInfo) -> tuple:
+    """rooms 表的一行（在事件循环线程中生成，交给写入线程的只有不可变的元组）"""
+    return (room.full_room_code, room.remote_port, room.node_id,
+            room.room_name, room.game_version, room.player_count,
+            room.max_players, room.description, 1 if room.is_public else 0,
+            room.host_player, room.server_addr, room.updated_at, room.client_ip)
+
+@_timed
+def save_rooms(rows: List[tuple], removed_codes: List[str]):
+    """写入房间快照：变化的房间（room_row() 生成的行）覆盖写入，已移除的房间删除（单个事务）"""
     conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        c.execute("DELETE FROM rooms WHERE full_room_code = ?", (full_room_code,))
-        conn.commit()
-    finally:
-        conn.close()
-
-def get_rooms(limit: int = 100) -> List[RoomInfo]:
+    with conn:
+        if removed_codes:
+            conn.executemany("DELETE FROM rooms WHERE full_room_code = ?", [(code,) for code in removed_codes])
+        if rows:
+            conn.executemany("INSERT OR REPLACE INTO rooms VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+@_timed
+def load_rooms() -> List[RoomInfo]:
+    """读取持久化的房间快照（启动时恢复内存注册表）"""
     rooms = []
-    conn = get_db_connection()
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    try:
-        # 简单的获取所有公开房间，按更新时间倒序
-        c.execute("SELECT * FROM rooms WHERE is_public = 1 ORDER BY updated_at DESC LIMIT ?", (limit,))
-        rows = c.fetchall()
-        
-        # 必须在连接关闭前处理数据
-        for row in rows:
-            rooms.append(RoomInfo(
-                full_room_code=row['full_room_code'],
-                remote_port=row['remote_port'],
-                node_id=row['node_id'],
-                room_name=row['room_name'],
-                game_version=row['game_version'],
-                player_count=row['player_count'],
-                max_players=row['max_players'],
-                description=row['description'],
-                is_public=bool(row['is_public']),
-                host_player=row['host_player'],
-                server_addr=row['server_addr'],
-                updated_at=row['updated_at'],
-                client_ip=row['client_ip']
-            ))
-    finally:
-        conn.close()
-    
+    for row in _fetch_dicts("SELECT * FROM rooms"):
+        row['is_public'] = bool(row['is_public'])
+        rooms.append(RoomInfo(**row))
     return rooms
-
-def update_room_status(full_room_code: str, version: str, description: str):
-    """更新房间的探测信息（版本和MOTD）"""
-    conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        c.execute("UPDATE rooms SET game_version = ?, description = ? WHERE full_room_code = ?", 
-                  (version, description, full_room_code))
-        conn.commit()
-    finally:
-        conn.close()
-
-def cleanup_stale_rooms(timeout_seconds: int = 10):
-    """清理超时的房间"""
-    conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        threshold = time.time() - timeout_seconds
-        c.execute("DELETE FROM rooms WHERE updated_at < ?", (threshold,))
-        deleted_count = c.rowcount
-        conn.commit()
-    finally:
-        conn.close()
-    return deleted_count
-
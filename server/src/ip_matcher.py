@@ -0,0 +1,88 @@
+import bisect
+import ipaddress
+from typing import Iterable, List, Tuple
+
+
+class IPRuleMatcher:
+    """
+    预编译的 IP 规则匹配器
+
+    规则字符串（CIDR、范围(-)、列表(,)，格式同 utils.parse_ip_rule）只在构建时解析一次：
+    - 单个 IP 放入哈希集合，O(1) 查找
+    - CIDR 和范围转换为整数区间，按版本(IPv4/IPv6)排序并合并重叠区间，查找时二分，O(log n)
+
+    实例构建后只读，更新规则时构建新实例并整体替换引用即可（原子切换）。
+    """
+
+    def __init__(self, rules: Iterable[str] = ()):
+        self._singles = {4: set(), 6: set()}
+        intervals = {4: [], 6: []}
+        self.rule_count = 0
+
+        for rule in rules:
+            self.rule_count += 1
+            for part in (rule or "").split(','):
+                part = part.strip()
+                if not part:
+                    continue
+                try:
+                    self._add_part(part, intervals)
+                except ValueError:
+                    # 忽略无效的规则部分
+                    continue
+
+        self._starts = {}
+        self._ends = {}
+        for version, spans in intervals.items():
+            merged = self._merge(spans)
+            self._starts[version] = [s for s, _ in merged]
+            self._ends[version] = [e for _, e in merged]
+
+    def _add_part(self, part: str, intervals):
+        if '-' in part:
+            # Range: 1.1.1.1-1.1.1.5
+            start, end = part.split('-', 1)
+            start_ip = ipaddress.ip_address(start.strip())
+            end_ip = ipaddress.ip_address(end.strip())
+            if start_ip.version != end_ip.version or int(start_ip) > int(end_ip):
+                raise ValueError(part)
+            intervals[start_ip.version].append((int(start_ip), int(end_ip)))
+        elif '/' in part:
+            net = ipaddress.ip_network(part, strict=False)
+            if net.num_addresses == 1:
+                self._singles[net.version].add(int(net.network_address))
+            else:
+                intervals[net.version].append((int(net.network_address), int(net.broadcast_address)))
+        else:
+            ip = ipaddress.ip_address(part)
+            self._singles[ip.version].add(int(ip))
+
+    @staticmethod
+    def _merge(spans: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        merged = []
+        for start, end in sorted(spans):
+            if merged and start <= merged[-1][1] + 1:
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        return merged
+
+    def matches(self, ip_str: str) -> bool:
+        """检查 IP 是否命中任意规则，无效 IP 返回 False"""
+        if not self.rule_count:
+            # 没有规则时（最常见的情况）无需解析 IP
+            return False
+        try:
+            ip = ipaddress.ip_address(ip_str)
+        except ValueError:
+            return False
+        value = int(ip)
+        if value in self._singles[ip.version]:
+            return True
+        starts = self._starts[ip.version]
+        i = bisect.bisect_right(starts, value) - 1
+        return i >= 0 and value <= self._ends[ip.version][i]
+
+    def __len__(self):
+        return self.rule_count
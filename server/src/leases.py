@@ -0,0 +1,180 @@
+import asyncio
+import base64
+import hashlib
+import heapq
+import hmac
+import os
+import random
+import secrets
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from .logger import logger
+from .registry import TUNNEL_TIMEOUT
+
+# 租约有效期等于隧道心跳超时 TUNNEL_TIMEOUT
+# 后台复核间隔（秒），每条隧道在此基础上随机抖动 ±20%
+REVERIFY_INTERVAL = 60
+
+# 签名密钥：多进程部署时需通过环境变量共享，否则每次启动随机生成（重启后旧租约失效，客户端自动重新校验）
+LEASE_SECRET = os.environ.get("MCF_LEASE_SECRET", "").encode() or secrets.token_bytes(32)
+
+
+class TunnelLeaseManager:
+    """
+    隧道校验租约
+
+    首次校验通过后签发租约 (HMAC 签名，绑定 server_addr:remote_port 与过期时间)。
+    之后的心跳只需验证签名并续期，O(1) 且不触发探测；
+    真实的可达性由后台复核任务按各隧道自己的节奏探测，失败后在下一次心跳返回 stop。
+    """
+
+    def __init__(self, secret: bytes = LEASE_SECRET, lease_ttl: float = TUNNEL_TIMEOUT,
+                 reverify_interval: float = REVERIFY_INTERVAL, concurrency: int = 16):
+        self.secret = secret
+        self.lease_ttl = lease_ttl
+        self.reverify_interval = reverify_interval
+        self.concurrency = concurrency
+
+        # key -> 租约过期时间（续期时更新）
+        self._expires: Dict[str, float] = {}
+        # key -> 下次复核时间；(下次复核时间, key) 小顶堆中与之不一致的条目视为作废
+        self._next_check: Dict[str, float] = {}
+        self._schedule = []
+        # key -> (复核失败原因, 失败时间)，等待下一次心跳下发 stop
+        self._failures: Dict[str, Tuple[str, float]] = {}
+        # key -> 撤销时间，此前签发的租约全部作废
+        self._revoked: Dict[str, float] = {}
+
+        self.verifications = 0
+        self.verification_failures = 0
+
+    @staticmethod
+    def _key(server_addr: str, remote_port: int) -> str:
+        return f"{server_addr}:{remote_port}"
+
+    def _sign(self, payload: bytes) -> str:
+        return hmac.new(self.secret, payload, hashlib.sha256).hexdigest()[:32]
+
+    def issue(self, server_addr: str, remote_port: int, now: Optional[float] = None) -> str:
+        """签发（或续期）租约，并把隧道纳入后台复核"""
+        if now is None:
+            now = time.time()
+        key = self._key(server_addr, remote_port)
+        expires = now + self.lease_ttl
+        if key not in self._expires:
+            self._schedule_check(key, now)
+        self._expires[key] = expires
+        # 重新完整校验通过，之前的复核失败不再有效
+        self._failures.pop(key, None)
+
+        payload = f"{key}|{now:.6f}|{expires:.3f}".encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip("=") + "." + self._sign(payload)
+
+    def check(self, token: Optional[str], server_addr: str, remote_port: int,
+              now: Optional[float] = None) -> bool:
+        """验证租约签名、绑定的隧道、过期时间以及是否已被撤销"""
+        if not token or "." not in token:
+            return False
+        if now is None:
+            now = time.time()
+        encoded, signature = token.rsplit(".", 1)
+        try:
+            payload = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+            key, issued_at, expires = payload.decode().rsplit("|", 2)
+            issued_at, expires = float(issued_at), float(expires)
+        except (ValueError, UnicodeDecodeError):
+            return False
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return False
+        if key != self._key(server_addr, remote_port) or expires <= now:
+            return False
+        revoked_at = self._revoked.get(key)
+        return revoked_at is None or issued_at > revoked_at
+
+    def pop_failure(self, server_addr: str, remote_port: int) -> Optional[str]:
+        """取出复核失败原因（如有），同时撤销该隧道的所有租约"""
+        key = self._key(server_addr, remote_port)
+        failure = self._failures.pop(key, None)
+        if failure is None:
+            return None
+        self.revoke(server_addr, remote_port)
+        return failure[0]
+
+    def revoke(self, server_addr: str, remote_port: int, now: Optional[float] = None):
+        key = self._key(server_addr, remote_port)
+        self._revoked[key] = time.time() if now is None else now
+        self._forget(key)
+
+    def _forget(self, key: str):
+        self._expires.pop(key, None)
+        self._next_check.pop(key, None)
+
+    def _schedule_check(self, key: str, now: float):
+        due = now + self.reverify_interval * random.uniform(0.8, 1.2)
+        self._next_check[key] = due
+        heapq.heappush(self._schedule, (due, key))
+
+    def _due(self, now: float):
+        """弹出到期需要复核的隧道；租约已过期（客户端不再心跳）的直接丢弃"""
+        due = []
+        while self._schedule and self._schedule[0][0] <= now:
+            check_at, key = heapq.heappop(self._schedule)
+            if self._next_check.get(key) != check_at:
+                continue
+            del self._next_check[key]
+            if self._expires[key] <= now:
+                del self._expires[key]
+                continue
+            due.append(key)
+        # 清理过期的撤销/失败记录：此前签发的租约最多存活 lease_ttl，之后客户端只能重新完整校验
+        for key, revoked_at in list(self._revoked.items()):
+            if revoked_at + self.lease_ttl < now:
+                del self._revoked[key]
+        for key, (_, failed_at) in list(self._failures.items()):
+            if failed_at + self.lease_ttl < now:
+                del self._failures[key]
+        return due
+
+    async def _verify(self, key: str, probe: Callable[[str, int], Awaitable[Optional[dict]]], slots):
+        host, port = key.rsplit(":", 1)
+        async with slots:
+            try:
+                status = await probe(host, int(port))
+            except Exception:
+                status = None
+        self.verifications += 1
+        if key not in self._expires:
+            return
+        if status:
+            self._schedule_check(key, time.time())
+        else:
+            self.verification_failures += 1
+            self._failures[key] = ("Server validation failed (unstable connection or invalid server)", time.time())
+            self._forget(key)
+            logger.warning(f"Tunnel re-verification failed for {key}")
+
+    async def run_verifier(self, probe: Callable[[str, int], Awaitable[Optional[dict]]], tick: float = 1.0):
+        """后台复核循环：每 tick 秒检查一次到期的隧道并并发探测"""
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        while True:
+            try:
+                for key in self._due(time.time()):
+                    task = asyncio.create_task(self._verify(key, probe, slots))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            except Exception as e:
+                logger.error(f"Tunnel verifier error: {e}")
+            await asyncio.sleep(tick)
+
+    def stats(self) -> dict:
+        return {
+            "active_leases": len(self._expires),
+            "pending_stops": len(self._failures),
+            "verifications": self.verifications,
+            "verification_failures": self.verification_failures,
+        }
+
+
+# 全局实例
+tunnel_leases = TunnelLeaseManager()
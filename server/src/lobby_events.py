@@ -0,0 +1,172 @@
+import asyncio
+import json
+from collections import deque
+from typing import AsyncIterator, List, Optional, Set
+from .room_list import RoomListCache, room_list_cache, public_room_dict
+from .logger import logger
+
+# 每个订阅者最多缓冲的事件数，超出视为慢消费者并断开（客户端重连时用 Last-Event-ID 补齐）
+SUBSCRIBER_BUFFER = 256
+# 空闲时发送 SSE 注释的间隔（秒），用于穿过反代保活并尽早发现已断开的连接
+KEEPALIVE_INTERVAL = 15.0
+# 单进程订阅者上限
+MAX_SUBSCRIBERS = 20000
+# 建议客户端断线后的重连间隔（毫秒）
+RETRY_MS = 3000
+
+_KEEPALIVE = b": ping\n\n"
+
+
+def format_event(event: str, data: bytes, event_id: Optional[int] = None) -> bytes:
+    """组装一条 SSE 消息；data 为单行 JSON"""
+    head = f"event: {event}\n" if event_id is None else f"event: {event}\nid: {event_id}\n"
+    return head.encode() + b"data: " + data + b"\n\n"
+
+
+def _encode(payload: dict) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class Subscriber:
+    """单个订阅连接的有界发送缓冲"""
+
+    __slots__ = ("max_buffer", "closed", "_buffer", "_wakeup")
+
+    def __init__(self, max_buffer: int = SUBSCRIBER_BUFFER):
+        self.max_buffer = max_buffer
+        self.closed = False
+        self._buffer = deque()
+        self._wakeup = asyncio.Event()
+
+    def push(self, chunk: bytes) -> bool:
+        """放入一条消息；缓冲已满时关闭订阅并返回 False"""
+        if self.closed:
+            return False
+        if len(self._buffer) >= self.max_buffer:
+            # 慢消费者：丢弃积压，断开后由客户端重连补齐
+            self._buffer.clear()
+            self.close()
+            return False
+        self._buffer.append(chunk)
+        self._wakeup.set()
+        return True
+
+    def close(self):
+        self.closed = True
+        self._wakeup.set()
+
+    async def drain(self, timeout: float) -> List[bytes]:
+        """等待并取出所有待发送消息，超时返回空列表"""
+        if not self._buffer and not self.closed:
+            # 用定时回调代替 wait_for，避免每次等待都创建一个任务
+            timer = asyncio.get_running_loop().call_later(timeout, self._wakeup.set)
+            try:
+                await self._wakeup.wait()
+            finally:
+                timer.cancel()
+        self._wakeup.clear()
+        chunks = list(self._buffer)
+        self._buffer.clear()
+        return chunks
+
+
+class LobbyEventHub:
+    """
+    大厅事件广播 (Server-Sent Events)
+
+    - 房间新增/更新/移除由注册表的变更钩子触发，每个事件只序列化一次再分发给所有订阅者
+    - 在线人数只在变化时广播，与订阅者数量无关
+    - 每个订阅者的缓冲有上限，积压超限的慢消费者被断开
+    - 事件 id 为房间列表版本号，重连时按 Last-Event-ID 发送增量，否则发送完整列表
+    """
+
+    def __init__(self, cache: RoomListCache, max_buffer: int = SUBSCRIBER_BUFFER,
+                 keepalive: float = KEEPALIVE_INTERVAL, max_subscribers: int = MAX_SUBSCRIBERS):
+        self.cache = cache
+        self.max_buffer = max_buffer
+        self.keepalive = keepalive
+        self.max_subscribers = max_subscribers
+        self.online_count: Optional[int] = None
+        self._subscribers: Set[Subscriber] = set()
+        cache.registry.listeners.append(self._on_room_change)
+
+        self.published = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self) -> Optional[Subscriber]:
+        """新建订阅；达到上限时返回 None"""
+        if len(self._subscribers) >= self.max_subscribers:
+            return None
+        subscriber = Subscriber(self.max_buffer)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscriber.close()
+        self._subscribers.discard(subscriber)
+
+    def publish(self, chunk: bytes):
+        """把一条已格式化的消息分发给所有订阅者"""
+        self.published += 1
+        evicted = [s for s in self._subscribers if not s.push(chunk)]
+        for subscriber in evicted:
+            self._subscribers.discard(subscriber)
+        if evicted:
+            self.evicted += len(evicted)
+            logger.warning(f"Evicted {len(evicted)} slow lobby event subscribers")
+
+    def _on_room_change(self, version: int, full_room_code: str):
+        if not self._subscribers:
+            return
+        room = self.cache.registry.get(full_room_code)
+        if room is not None and room.is_public:
+            self.publish(format_event("room", _encode(public_room_dict(room)), version))
+        else:
+            self.publish(format_event("remove", _encode({"full_room_code": full_room_code}), version))
+
+    def set_online_count(self, count: int):
+        """更新在线人数，变化时广播"""
+        if count == self.online_count:
+            return
+        self.online_count = count
+        if self._subscribers:
+            self.publish(format_event("online", _encode({"online_count": count})))
+
+    def initial_events(self, last_event_id: Optional[str] = None) -> bytes:
+        """新连接的首批消息：重连且增量可用时发送 delta，否则发送完整列表"""
+        chunks = [f"retry: {RETRY_MS}\n\n".encode()]
+        delta = None
+        if last_event_id and last_event_id.strip().isdigit():
+            delta = self.cache.delta(int(last_event_id))
+        if delta is not None:
+            chunks.append(format_event("delta", delta, self.cache.registry.version))
+        else:
+            snapshot = self.cache.get()
+            chunks.append(format_event("snapshot", snapshot.body, snapshot.version))
+        if self.online_count is not None:
+            chunks.append(format_event("online", _encode({"online_count": self.online_count})))
+        return b"".join(chunks)
+
+    async def stream(self, subscriber: Subscriber, first: bytes) -> AsyncIterator[bytes]:
+        """单个连接的消息流；连接断开（生成器被取消或关闭）时自动退订"""
+        try:
+            yield first
+            while not subscriber.closed:
+                chunks = await subscriber.drain(self.keepalive)
+                yield b"".join(chunks) if chunks else _KEEPALIVE
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "evicted": self.evicted
+        }
+
+
+# 全局实例
+lobby_events = LobbyEventHub(room_list_cache)
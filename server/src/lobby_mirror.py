@@ -0,0 +1,70 @@
+import json
+from typing import Optional
+from .models import RoomInfo
+from .registry import RoomRegistry, room_registry
+from .shared_state import SharedState, shared_state, worker_role, ROLE_PRIMARY
+from .metrics import counter
+from .logger import logger
+
+# 主进程检查列表版本并发布镜像的间隔（秒），即从进程数据相对主进程的最大延迟
+PUBLISH_INTERVAL = 0.5
+
+MIRROR_PUBLISHES = counter("mcfrp_lobby_mirror_publishes_total", "Lobby mirror snapshots published by the primary")
+MIRROR_SYNCS = counter("mcfrp_lobby_mirror_syncs_total", "Lobby mirror snapshots loaded by a secondary worker")
+
+
+class LobbyMirror:
+    """
+    多进程模式下公开房间的跨进程镜像
+
+    主进程在公开列表版本变化后，把全部公开房间和版本号编码写入共享内存段的大厅镜像区；
+    从进程处理大厅读请求前比较发布序号，变化时把镜像装入本进程的注册表（RoomRegistry.replace）。
+    之后房间列表（含预序列化/gzip 缓存和 ETag）与检索走和主进程完全相同的代码路径，
+    ETag 和 since 版本号在所有进程间一致。镜像最多落后主进程 PUBLISH_INTERVAL 秒。
+    主进程首次发布之前从进程没有可用的房间数据（ready 为 False），大厅读请求应返回 503，
+    而不是用本进程的空注册表和它自己的版本号作答。
+    """
+
+    def __init__(self, registry: RoomRegistry, shared: Optional[SharedState], primary: bool):
+        self.registry = registry
+        self.shared = shared
+        self.primary = primary
+        self._published_version: Optional[int] = None
+        self._seq = 0
+
+    @property
+    def ready(self) -> bool:
+        """本进程能否处理大厅读请求：主进程 / 单进程模式总是可以，从进程需要已装入一份镜像"""
+        return self.shared is None or self.primary or self._seq > 0
+
+    def publish(self) -> bool:
+        """主进程：列表版本变化时发布新镜像，返回是否发布"""
+        version = self.registry.version
+        if self.shared is None or version == self._published_version:
+            return False
+        rooms = [room.model_dump() for room in self.registry.list_public(limit=None)]
+        payload = json.dumps({"version": version, "rooms": rooms}, ensure_ascii=False,
+                             separators=(",", ":")).encode("utf-8")
+        self._published_version = version
+        if not self.shared.publish_lobby(payload):
+            logger.error(f"Lobby mirror of {len(rooms)} rooms ({len(payload)} bytes) exceeds the shared "
+                         f"segment ({self.shared.lobby_bytes} bytes); secondaries keep the previous snapshot")
+            return False
+        MIRROR_PUBLISHES.inc()
+        return True
+
+    def sync(self) -> bool:
+        """从进程：镜像有新的发布时装入本进程的注册表，返回是否更新"""
+        if self.shared is None or self.primary or self.shared.lobby_seq == self._seq:
+            return False
+        seq, payload = self.shared.read_lobby()
+        data = json.loads(payload)
+        # 数据由主进程的 RoomInfo 序列化而来，不再重复校验
+        self.registry.replace([RoomInfo.model_construct(**room) for room in data["rooms"]], data["version"])
+        self._seq = seq
+        MIRROR_SYNCS.inc()
+        return True
+
+
+# 全局实例（单进程模式下 publish / sync 都不做任何事）
+lobby_mirror = LobbyMirror(room_registry, shared_state, worker_role() == ROLE_PRIMARY)
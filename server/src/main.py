@@ -1,24 +1,42 @@
-from fastapi import FastAPI, Request, HTTPException, BackgroundTasks, Header, Depends
+from fastapi import FastAPI, Request, Response, HTTPException, BackgroundTasks, Header, Depends
+from fastapi.responses import StreamingResponse
 from contextlib import asynccontextmanager
 import asyncio
-from typing import List, Optional
+import os
+import time
+from typing import Optional
 from datetime import datetime
-from .models import RoomCreate, RoomDelete, RuleCreate, RuleDelete, ViolationReport, TunnelInfo
-from .database import (init_db, upsert_room, delete_room, get_rooms, cleanup_stale_rooms, 
-                       check_ip_conflict, update_room_status, update_online_heartbeat, 
-                       get_online_count, cleanup_offline_users,
+from .models import RoomCreate, RoomDelete, RuleCreate, RuleDelete, ViolationReport, TunnelInfo, ModerationCheck
+from .database import (init_db,
                        add_blacklist_rule, remove_blacklist_rule, get_blacklist_rules,
                        add_whitelist_rule, remove_whitelist_rule, get_whitelist_rules,
-                       get_access_logs, upsert_tunnel, cleanup_stale_tunnels, get_active_tunnels,
-                       get_online_users_list)
-from .utils import get_effective_ip, mask_ip
+                       get_access_logs, get_access_stats,
+                       cleanup_expired_bans, close_db)
+from .utils import get_effective_ip, etag_matches
 from .logger import logger
-from .security import RateLimitMiddleware
+from .security import RateLimitMiddleware, WorkerRouteGuard, reload_rules, publish_rules_change, rule_listeners
+from .shared_state import shared_state, worker_role, ROLE_PRIMARY
+from .metrics import MetricsMiddleware, CONTENT_TYPE as METRICS_CONTENT_TYPE, gauge_function, track_task
+from .metrics import registry as metrics_registry
+from .access_log import access_logger
+from .ban_table import auto_bans
 from .moderation import moderator
-from .minecraft_pinger import get_server_motd, get_server_status
+from .minecraft_pinger import get_server_motd, robust_get_server_status, endpoint_breaker, host_breaker, PROBE_MAX_SECONDS
+from .probe_cache import probe_cache
+from .leases import tunnel_leases
+from .registry import room_registry, tunnel_registry, TUNNEL_TIMEOUT
+from .room_list import room_list_cache, public_room_dict
+from .lobby_events import lobby_events
+from .lobby_mirror import lobby_mirror, PUBLISH_INTERVAL
+from .room_search import room_search
+from .presence import presence
+from .version_sweep import VersionSweeper, ProbeScheduler
 
 ADMIN_KEY = "mcf-admin-8888"
 
+# 房间列表允许客户端缓存，但每次使用前必须用 ETag 重新验证
+ROOM_LIST_CACHE_CONTROL = "no-cache"
+
 async def verify_admin(x_admin_key: str = Header(None)):
     if x_admin_key != ADMIN_KEY:
         raise HTTPException(status_code=403, detail="Invalid Admin Key")
@@ -27,61 +45,130 @@ async def verify_admin(x_admin_key: str = Header(None)):
 async def cleanup_task():
     while True:
         try:
-            # 每60秒清理一次超时10秒的房间（与 database 默认值一致）
-            deleted_rooms = cleanup_stale_rooms(timeout_seconds=10)
-            if deleted_rooms > 0:
-                logger.info(f"Cleaned up {deleted_rooms} stale rooms")
-            
-            # 清理超时的在线用户（15秒超时）
-            offline = cleanup_offline_users(timeout_seconds=15)
-            if offline > 0:
-                logger.info(f"Cleaned up {offline} offline users")
-                
-            # 清理超时的隧道（40秒超时）
-            deleted_tunnels = cleanup_stale_tunnels(timeout_seconds=40)
-            if deleted_tunnels > 0:
-                logger.info(f"Cleaned up {deleted_tunnels} stale tunnels")
-                
+            with track_task("cleanup"):
+                # 在线统计（每小时/每天的独立用户草图）落库
+                presence.flush()
+
+                # 清理已过期的自动封禁（内存表 + 持久化记录）
+                auto_bans.purge_expired()
+                cleanup_expired_bans()
+
+                # 删除超出保留期的访问日志分表和汇总（整表删除可能较慢，放到线程里）
+                dropped, _ = await asyncio.to_thread(access_logger.prune)
+                if dropped:
+                    logger.info(f"Dropped {dropped} expired access log partitions")
+
+                # 删除超出保留期的在线统计草图
+                pruned = await asyncio.to_thread(presence.prune)
+                if pruned:
+                    logger.info(f"Pruned {pruned} expired presence stats buckets")
         except Exception as e:
             logger.error(f"Cleanup error: {e}")
         await asyncio.sleep(60)
 
-# 版本探测任务
-async def version_detection_task():
-    """后台任务：定期探测所有房间的真实版本和MOTD，并更新数据库"""
+# 房间/隧道注册表维护任务
+async def registry_task(flush_interval: float = 5.0):
+    """每秒推进时间轮移除超时的房间和隧道；每 flush_interval 秒把变化写入数据库"""
+    last_flush = 0.0
     while True:
         try:
-            rooms = get_rooms(limit=500)
-            for room in rooms:
-                try:
-                    # 获取服务器真实状态
-                    status = await get_server_status(room.server_addr, room.remote_port)
+            with track_task("registry_expire"):
+                expired_rooms = room_registry.expire()
+                if expired_rooms > 0:
+                    logger.info(f"Cleaned up {expired_rooms} stale rooms")
+                expired_tunnels = tunnel_registry.expire()
+                if expired_tunnels > 0:
+                    logger.info(f"Cleaned up {expired_tunnels} stale tunnels")
+                presence.expire()
+
+            now = asyncio.get_running_loop().time()
+            if now - last_flush >= flush_interval:
+                last_flush = now
+                with track_task("registry_flush"):
+                    await _flush_registries_async()
+        except Exception as e:
+            logger.error(f"Registry maintenance error: {e}")
+        await asyncio.sleep(1)
+
+def _flush_registries():
+    room_registry.flush()
+    tunnel_registry.flush()
+
+async def _flush_registries_async():
+    """在事件循环线程中生成快照行，只把不可变的行交给线程写入 SQLite"""
+    for registry in (room_registry, tunnel_registry):
+        snapshot = registry.snapshot()
+        if snapshot is None:
+            continue
+        try:
+            await asyncio.to_thread(registry.write_snapshot, snapshot)
+        except Exception as e:
+            registry.restore_snapshot(snapshot)
+            logger.error(f"Failed to persist {type(registry).__name__} snapshot: {e}")
 
-                    if status:
-                        version = status.get("version", "")
-                        description = status.get("description", "")
+# 大厅镜像发布任务（多进程模式的主进程）
+async def lobby_mirror_task(interval: float = PUBLISH_INTERVAL):
+    """公开列表版本变化后把房间镜像发布到共享内存，供从进程处理大厅读请求"""
+    while True:
+        try:
+            with track_task("lobby_mirror"):
+                lobby_mirror.publish()
+        except Exception as e:
+            logger.error(f"Lobby mirror publish error: {e}")
+        await asyncio.sleep(interval)
 
-                        # 更新数据库中的版本和MOTD
-                        update_room_status(room.full_room_code, version, description)
+# 在线人数广播任务
+async def online_count_task(interval: float = 5.0):
+    """定期统计在线人数，变化时推送给大厅事件订阅者（开销与订阅者数量无关）"""
+    while True:
+        try:
+            lobby_events.set_online_count(presence.count())
+        except Exception as e:
+            logger.error(f"Online count broadcast error: {e}")
+        await asyncio.sleep(interval)
 
-                        # 同时检查MOTD敏感词
-                        bad_word = moderator.check_text(description)
-                        if bad_word:
-                            logger.warning(f"VERSION_DETECT VIOLATION: Room {room.full_room_code} MOTD contains '{bad_word}'. Deleting.")
-                            delete_room(room.remote_port, room.node_id)
+# 版本探测任务
+async def handle_version_result(room, status: Optional[dict]):
+    """处理单个房间的探测结果：更新版本和MOTD，并检查MOTD敏感词"""
+    # 先记录结果，决定该房间下一次的探测时间
+    probe_scheduler.observe(room.full_room_code, status)
+    if not status:
+        return
+    version = status.get("version", "")
+    description = status.get("description", "")
 
-                except Exception as e:
-                    # 单个房间探测失败不影响其他房间
-                    pass
+    # 更新注册表中的版本和MOTD
+    room_registry.update_status(room.full_room_code, version, description)
 
-                # 避免过快请求，每个房间间隔0.5秒
-                await asyncio.sleep(0.5)
+    # 同时检查MOTD敏感词
+    bad_word = moderator.check_text(description)
+    if bad_word:
+        logger.warning(f"VERSION_DETECT VIOLATION: Room {room.full_room_code} MOTD contains '{bad_word}'. Deleting.")
+        room_registry.delete(room.remote_port, room.node_id)
+
+# 全局并发 32，同一 FRP 节点最多 4 个并发、探测间隔 0.1 秒
+# 探测走 probe_cache，与房间心跳/隧道校验共享结果
+version_sweeper = VersionSweeper(handle_version_result, concurrency=32,
+                                 per_host_concurrency=4, per_host_interval=0.1)
+# 新房间和结果有变化的房间每 30 秒探测，结果不变的房间逐步退避到 10 分钟
+probe_scheduler = ProbeScheduler()
+# 调度检查间隔（秒）和每轮最多探测的房间数
+VERSION_TICK = 5
+VERSION_BATCH = 500
 
+async def version_detection_task():
+    """后台任务：按自适应调度并发探测到期房间的真实版本和MOTD，并更新注册表"""
+    while True:
+        try:
+            with track_task("version_sweep"):
+                probe_scheduler.sync(room_registry.list_public(limit=None))
+                rooms = probe_scheduler.due(limit=VERSION_BATCH)
+                if rooms:
+                    await version_sweeper.sweep(rooms)
         except Exception as e:
             logger.error(f"Version detection task error: {e}")
 
-        # 每30秒执行一轮扫描
-        await asyncio.sleep(30)
+        await asyncio.sleep(VERSION_TICK)
 
 async def audit_room_task(host: str, port: int, full_room_code: str, remote_port: int, node_id: int):
     """后台任务：审核房间 MOTD"""
@@ -99,31 +186,11 @@ async def audit_room_task(host: str, port: int, full_room_code: str, remote_port
         if bad_word:
             logger.warning(f"AUDIT VIOLATION: Room {full_room_code} has bad word '{bad_word}' in MOTD. Deleting.")
             # 3. 违规删除
-            delete_room(remote_port, node_id)
+            room_registry.delete(remote_port, node_id)
             
     except Exception as e:
         logger.error(f"Audit task failed for {full_room_code}: {e}")
 
-async def robust_get_server_status(host: str, port: int, retries: int = 3) -> Optional[dict]:
-    """
-    Robust server status check with progressive timeout strategy.
-    Tries 3 times with increasing timeouts (2s, 3s, 5s) to handle network congestion
-    while avoiding overly long blocking.
-    """
-    timeouts = [2.0, 3.0, 5.0]
-    
-    for i, timeout in enumerate(timeouts):
-        status = await get_server_status(host, port, timeout=timeout)
-        if status:
-            return status
-            
-        # Exponential backoff for retry interval: 0.5s, 1.0s, etc.
-        if i < len(timeouts) - 1:
-            sleep_time = 0.5 * (2 ** i)
-            await asyncio.sleep(sleep_time)
-            
-    return None
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 启动时初始化数据库
@@ -132,57 +199,130 @@ async def lifespan(app: FastAPI):
     
     # 加载敏感词规则
     moderator.load_rules()
+    if moderator.load_rules not in rule_listeners:
+        rule_listeners.append(moderator.load_rules)
+
+    # 编译黑白名单规则
+    reload_rules()
+
+    # 恢复未过期的自动封禁
+    bans = auto_bans.load()
+    logger.info(f"Loaded {bans} active auto-bans")
+
+    # 启动访问日志后台写入
+    access_logger.start()
     
     # 启动后台清理任务
     cleanup = asyncio.create_task(cleanup_task())
     logger.info("Background cleanup task started")
-    
-    # 启动版本探测任务
-    version_detect = asyncio.create_task(version_detection_task())
-    logger.info("Version detection task started")
+
+    # 大厅/隧道状态只在主进程中维护（多进程模式下从进程只处理无状态的路由）
+    primary = worker_role() == ROLE_PRIMARY
+    tasks = []
+    if primary:
+        # 恢复当前小时/当天的在线统计
+        presence.load()
+
+        # 从上次的快照恢复房间和隧道（各自重新获得一个完整的心跳超时周期）
+        rooms, tunnels = room_registry.load(), tunnel_registry.load()
+        logger.info(f"Restored {rooms} rooms and {tunnels} tunnels")
+
+        tasks = [
+            # 注册表过期/持久化任务
+            asyncio.create_task(registry_task()),
+            # 在线人数广播任务
+            asyncio.create_task(online_count_task()),
+            # 版本探测任务
+            asyncio.create_task(version_detection_task()),
+            # 隧道租约后台复核
+            asyncio.create_task(tunnel_leases.run_verifier(robust_get_server_status))
+        ]
+        if shared_state is not None:
+            # 多进程模式：立即发布恢复的房间，缩短从进程等待首个镜像（返回 503）的时间；之后由后台任务发布
+            lobby_mirror.publish()
+            # 发布房间镜像，从进程据此处理房间列表和检索
+            tasks.append(asyncio.create_task(lobby_mirror_task()))
+        logger.info("Lobby state and version detection tasks started")
+    else:
+        logger.info(f"Secondary worker {os.getpid()}: serving lobby reads from the primary's mirror; "
+                    f"other lobby/tunnel/admin routes are served by the primary")
 
     yield
     
     # 关闭时取消任务
     cleanup.cancel()
-    version_detect.cancel()
+    for task in tasks:
+        task.cancel()
+    if primary:
+        _flush_registries()
+        presence.flush()
+    access_logger.stop()
+    close_db()
+    if shared_state is not None:
+        shared_state.close()
     logger.info("Server shutting down...")
 
 app = FastAPI(lifespan=lifespan)
 
+# 多进程模式的从进程：拒绝只能由主进程处理的路由
+if worker_role() != ROLE_PRIMARY:
+    app.add_middleware(WorkerRouteGuard)
+
 # 注册限流中间件：每IP每分钟限制60次请求
 app.add_middleware(RateLimitMiddleware, limit=60, window=60)
 
+# 请求指标放在最外层，被限流拒绝的请求也计入
+app.add_middleware(MetricsMiddleware)
+
+# 采集时读取的状态指标（多进程模式下每个进程各自暴露，从进程的房间数来自镜像，其余大厅状态为空）
+gauge_function("mcfrp_rooms", "Rooms in the registry", lambda: len(room_registry))
+gauge_function("mcfrp_tunnels", "Active tunnels in the registry", lambda: len(tunnel_registry))
+gauge_function("mcfrp_online_users", "Lobby users with a recent heartbeat", lambda: len(presence))
+gauge_function("mcfrp_lobby_event_subscribers", "Open lobby event streams", lambda: len(lobby_events))
+gauge_function("mcfrp_auto_bans", "IPs in the in-memory auto-ban table", lambda: len(auto_bans))
+gauge_function("mcfrp_access_log_pending", "Access log rows waiting to be written", lambda: access_logger.pending_count)
+
 @app.post("/api/tunnel/validate")
 async def validate_tunnel(tunnel: TunnelInfo, request: Request):
     """
     Validate a generic tunnel (mapping).
-    Client sends heartbeat here. Server performs robust check.
-    If check fails multiple times (handled by robust_get_server_status), 
-    commands client to stop.
+    Client sends heartbeat here. The first heartbeat (or one without a valid
+    lease) gets a robust check and, if it passes, a signed lease.
+    Heartbeats carrying a valid lease only renew it; the background verifier
+    re-probes each tunnel on its own schedule, and a failure there commands
+    the client to stop on its next heartbeat.
     """
     client_ip = get_effective_ip(request)
-    
-    # Perform robust check (5 retries)
-    status = await robust_get_server_status(tunnel.server_addr, tunnel.remote_port)
-    
-    if not status:
-        logger.warning(f"Tunnel validation failed for {client_ip} -> {tunnel.server_addr}:{tunnel.remote_port}")
-        return {
-            "success": False, 
-            "command": "stop", 
-            "reason": "Server validation failed (unstable connection or invalid server)"
-        }
+
+    if tunnel_leases.check(tunnel.lease, tunnel.server_addr, tunnel.remote_port):
+        # 持有有效租约：检查后台复核结果，通过则 O(1) 续期
+        failure = tunnel_leases.pop_failure(tunnel.server_addr, tunnel.remote_port)
+        if failure:
+            logger.warning(f"Tunnel re-verification failed for {client_ip} -> {tunnel.server_addr}:{tunnel.remote_port}")
+            return {"success": False, "command": "stop", "reason": failure}
+    else:
+        # Perform robust check (3 retries, shared with other callers via probe_cache)
+        status = await robust_get_server_status(tunnel.server_addr, tunnel.remote_port)
+
+        if not status:
+            logger.warning(f"Tunnel validation failed for {client_ip} -> {tunnel.server_addr}:{tunnel.remote_port}")
+            return {
+                "success": False, 
+                "command": "stop", 
+                "reason": "Server validation failed (unstable connection or invalid server)"
+            }
     
     # Validation passed: Update tunnel heartbeat
     try:
-        upsert_tunnel(client_ip, tunnel.server_addr, tunnel.remote_port)
+        tunnel_registry.upsert(client_ip, tunnel.server_addr, tunnel.remote_port)
     except Exception as e:
         logger.error(f"Failed to upsert tunnel: {e}")
 
     return {
         "success": True, 
-        "command": "keep-alive"
+        "command": "keep-alive",
+        "lease": tunnel_leases.issue(tunnel.server_addr, tunnel.remote_port),
+        "lease_ttl": TUNNEL_TIMEOUT
     }
 
 @app.post("/api/lobby/rooms")
@@ -196,7 +336,7 @@ async def create_or_update_room(room: RoomCreate, request: Request, background_t
         raise HTTPException(status_code=422, detail="Text too long")
         
     # 防多开检查
-    if check_ip_conflict(client_ip, room.full_room_code):
+    if room_registry.check_ip_conflict(client_ip, room.full_room_code):
         logger.warning(f"Blocked multi-instance attempt from {client_ip}")
         return {"success": False, "message": "禁止多开，此IP已被占用"}
     
@@ -212,13 +352,15 @@ async def create_or_update_room(room: RoomCreate, request: Request, background_t
         return {"success": False, "message": f"简介包含敏感词: {bad_word}"}
 
     # Minecraft 服务器可访问性验证 (Robust Check)
+    # 探测最长可能超过房间超时：先把房主已有的房间保留到探测结束，避免健康但响应慢的房间被过期后又重新出现
+    room_registry.extend(room.full_room_code, client_ip, PROBE_MAX_SECONDS)
     status = await robust_get_server_status(room.server_addr, room.remote_port)
     if not status:
         logger.warning(f"Validation failed for {room.server_addr}:{room.remote_port}. Not a valid Minecraft server.")
         return {"success": False, "message": "Validation failed"}
 
     try:
-        upsert_room(room, client_ip)
+        room_registry.upsert(room, client_ip)
         
         # 触发后台动态审核 (MOTD)
         # 只有当房间是公开的时才需要审核
@@ -241,44 +383,81 @@ async def create_or_update_room(room: RoomCreate, request: Request, background_t
 async def remove_room(room: RoomDelete):
     """移除房间"""
     try:
-        delete_room(room.remote_port, room.node_id)
+        room_registry.delete(room.remote_port, room.node_id)
         logger.info(f"Room removed: {room.remote_port}_{room.node_id}")
         return {"success": True, "message": "Room removed"}
     except Exception as e:
         logger.error(f"Error removing room: {e}")
         return {"success": False, "message": str(e)}
 
+def _sync_lobby_mirror():
+    """从进程装入最新的房间镜像；主进程尚未发布过镜像时返回 503，客户端稍后重试"""
+    lobby_mirror.sync()
+    if not lobby_mirror.ready:
+        raise HTTPException(status_code=503, detail="Lobby mirror not ready",
+                            headers={"Retry-After": "1"})
+
 @app.get("/api/lobby/rooms")
-async def list_rooms():
-    """获取房间列表，返回脱敏的房主IP"""
-    rooms = get_rooms()
-    # 将房间列表转为字典并脱敏IP
-    rooms_data = []
-    for room in rooms:
-        room_dict = {
-            "full_room_code": room.full_room_code,
-            "remote_port": room.remote_port,
-            "node_id": room.node_id,
-            "room_name": room.room_name,
-            "game_version": room.game_version,
-            "player_count": room.player_count,
-            "max_players": room.max_players,
-            "description": room.description,
-            "is_public": room.is_public,
-            "host_player": room.host_player,
-            "server_addr": room.server_addr,
-            "host_ip": mask_ip(room.client_ip),  # 脱敏后的房主IP
-            "updated_at": room.updated_at
-        }
-        rooms_data.append(room_dict)
-    return {"success": True, "rooms": rooms_data}
+async def list_rooms(request: Request, since: Optional[int] = None):
+    """
+    获取房间列表，返回脱敏的房主IP
+    - If-None-Match 命中当前版本时返回 304
+    - since=<version> 时只返回该版本之后的变化；落后太多时返回完整列表 (full=true)
+    多进程模式下从进程使用主进程发布的镜像，从进程上的 since 请求返回完整列表
+    """
+    _sync_lobby_mirror()
+    headers = {"ETag": room_registry.etag, "Cache-Control": ROOM_LIST_CACHE_CONTROL,
+               "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("If-None-Match"), room_registry.etag):
+        return Response(status_code=304, headers=headers)
+
+    if since is not None:
+        body = room_list_cache.delta(since)
+        if body is not None:
+            return Response(body, media_type="application/json", headers=headers)
+
+    # 每个列表版本只序列化/压缩一次，之后直接返回缓存的字节
+    snapshot = room_list_cache.get()
+    if snapshot.gzip_body is not None and "gzip" in request.headers.get("Accept-Encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(snapshot.gzip_body, media_type="application/json", headers=headers)
+    return Response(snapshot.body, media_type="application/json", headers=headers)
+
+@app.get("/api/lobby/rooms/search")
+async def search_rooms(q: str = "", game_version: Optional[str] = None, node_id: Optional[int] = None,
+                       sort: str = "fresh", limit: int = 20, cursor: Optional[str] = None):
+    """
+    检索公开房间：q 匹配房间名和简介，game_version / node_id 精确过滤
+    sort 为 fresh（最近心跳）或 players（人数），用返回的 next_cursor 翻页
+    """
+    _sync_lobby_mirror()
+    try:
+        rooms, next_cursor = room_search.search(q, game_version=game_version, node_id=node_id,
+                                                sort=sort, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"success": True, "rooms": [public_room_dict(room) for room in rooms], "next_cursor": next_cursor}
+
+@app.get("/api/lobby/events")
+async def lobby_event_stream(last_event_id: Optional[str] = Header(None)):
+    """
+    大厅事件流 (Server-Sent Events)，替代客户端轮询房间列表和在线人数
+    事件: snapshot / delta（连接时）、room、remove、online
+    """
+    subscriber = lobby_events.subscribe()
+    if subscriber is None:
+        raise HTTPException(status_code=503, detail="Too many subscribers")
+    # 订阅与首批消息在同一步内完成，之后的变化都会进入订阅者缓冲，不会遗漏
+    first = lobby_events.initial_events(last_event_id)
+    return StreamingResponse(lobby_events.stream(subscriber, first), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.post("/api/lobby/heartbeat")
 async def user_heartbeat(request: Request):
     """用户在线心跳，用于统计在线人数"""
     client_ip = get_effective_ip(request)
     try:
-        update_online_heartbeat(client_ip)
+        presence.heartbeat(client_ip)
         return {"success": True}
     except Exception as e:
         logger.error(f"Heartbeat error from {client_ip}: {e}")
@@ -288,12 +467,23 @@ async def user_heartbeat(request: Request):
 async def get_online():
     """获取当前在线用户数量"""
     try:
-        count = get_online_count(timeout_seconds=15)
-        return {"success": True, "online_count": count}
+        return {"success": True, "online_count": presence.count()}
     except Exception as e:
         logger.error(f"Get online count error: {e}")
         return {"success": False, "online_count": 0}
 
+@app.get("/metrics")
+async def metrics(request: Request, x_admin_key: str = Header(None)):
+    """
+    Prometheus 指标。本机直连（Prometheus 抓取 127.0.0.1:端口/metrics）无需密钥，
+    经反代转发的请求需要管理密钥。多进程模式下每个工作进程需单独抓取。
+    """
+    direct_local = request.client is not None and request.client.host in ("127.0.0.1", "::1") \
+        and "x-forwarded-for" not in request.headers and "x-real-ip" not in request.headers
+    if not direct_local and x_admin_key != ADMIN_KEY:
+        raise HTTPException(status_code=403, detail="Invalid Admin Key")
+    return Response(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/")
 async def root():
     return {"message": "MinecraftFRP Lobby Server is running"}
@@ -304,15 +494,45 @@ async def root():
 async def api_get_access_logs():
     return {"success": True, "logs": get_access_logs()}
 
+@app.get("/api/admin/access_stats", dependencies=[Depends(verify_admin)])
+async def api_get_access_stats(hours: int = 24, limit: int = 20):
+    """最近 hours 小时的请求统计（读每小时汇总表）"""
+    hours = max(1, min(hours, 24 * 90))
+    since_hour = int(time.time()) // 3600 * 3600 - (hours - 1) * 3600
+    return {"success": True, "since_hour": since_hour, **get_access_stats(since_hour, max(1, min(limit, 200)))}
+
+@app.get("/api/admin/stats", dependencies=[Depends(verify_admin)])
+async def api_get_stats():
+    """后台任务运行统计"""
+    return {
+        "success": True,
+        "version_sweep": version_sweeper.stats(),
+        "probe_scheduler": probe_scheduler.stats(),
+        "probe_cache": probe_cache.stats(),
+        "probe_breakers": {
+            "endpoint": endpoint_breaker.stats(),
+            "host": {**host_breaker.stats(), "open_hosts": host_breaker.open_keys()[:100]},
+        },
+        "registry": {"rooms": len(room_registry), "tunnels": len(tunnel_registry)},
+        "room_list": room_list_cache.stats(),
+        "lobby_events": lobby_events.stats(),
+        "tunnel_leases": tunnel_leases.stats()
+    }
+
 @app.get("/api/admin/online_users", dependencies=[Depends(verify_admin)])
 async def api_get_online_users():
     """获取所有活跃隧道（在线用户）信息"""
-    return {"success": True, "users": get_active_tunnels()}
+    return {"success": True, "users": tunnel_registry.list_active()}
 
 @app.get("/api/admin/online_app_users", dependencies=[Depends(verify_admin)])
 async def api_get_online_app_users():
     """获取所有软件在线用户（大厅心跳）"""
-    return {"success": True, "users": get_online_users_list()}
+    return {"success": True, "users": presence.list_users()}
+
+@app.get("/api/admin/presence_stats", dependencies=[Depends(verify_admin)])
+async def api_get_presence_stats(hours: int = 24, days: int = 7):
+    """最近每小时/每天的独立用户数（HyperLogLog 估计）和在线峰值"""
+    return {"success": True, **presence.stats(min(hours, 24 * 14), min(days, 366))}
 
 @app.get("/api/admin/blacklist", dependencies=[Depends(verify_admin)])
 async def api_get_blacklist():
@@ -322,6 +542,7 @@ async def api_get_blacklist():
 async def api_add_blacklist(rule: RuleCreate):
     try:
         add_blacklist_rule(rule.rule, rule.reason)
+        publish_rules_change()
         return {"success": True}
     except Exception as e:
         return {"success": False, "message": str(e)}
@@ -329,6 +550,7 @@ async def api_add_blacklist(rule: RuleCreate):
 @app.delete("/api/admin/blacklist", dependencies=[Depends(verify_admin)])
 async def api_remove_blacklist(rule: RuleDelete):
     remove_blacklist_rule(rule.rule)
+    publish_rules_change()
     return {"success": True}
 
 @app.get("/api/admin/whitelist", dependencies=[Depends(verify_admin)])
@@ -339,6 +561,7 @@ async def api_get_whitelist():
 async def api_add_whitelist(rule: RuleCreate):
     try:
         add_whitelist_rule(rule.rule, rule.reason, rule.duration_minutes)
+        publish_rules_change()
         return {"success": True}
     except Exception as e:
         return {"success": False, "message": str(e)}
@@ -346,8 +569,22 @@ async def api_add_whitelist(rule: RuleCreate):
 @app.delete("/api/admin/whitelist", dependencies=[Depends(verify_admin)])
 async def api_remove_whitelist(rule: RuleDelete):
     remove_whitelist_rule(rule.rule)
+    publish_rules_change()
     return {"success": True}
 
+@app.post("/api/admin/moderation/check", dependencies=[Depends(verify_admin)])
+async def api_check_moderation(check: ModerationCheck):
+    """检查文本命中的所有敏感词及其位置"""
+    matches = moderator.find_matches(check.text)
+    return {"success": True, "matches": [{"offset": offset, "word": word} for offset, word in matches]}
+
+@app.post("/api/admin/moderation/reload", dependencies=[Depends(verify_admin)])
+async def api_reload_moderation():
+    """修改敏感词文件后重新加载（多进程模式下所有进程都会重新加载）"""
+    moderator.load_rules()
+    publish_rules_change()
+    return {"success": True, "rules": len(moderator.rules)}
+
 # --- Client APIs ---
 
 @app.get("/api/check_access")
@@ -365,4 +602,5 @@ async def report_violation(report: ViolationReport, request: Request):
     logger.warning(f"Self-reported violation from {client_ip}: {reason}")
     # Add to blacklist rules
     add_blacklist_rule(client_ip, reason)
+    publish_rules_change()
     return {"success": True}
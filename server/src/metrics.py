@@ -0,0 +1,342 @@
+import bisect
+import functools
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 请求/数据库/探测耗时的默认分桶（秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 后台任务耗时分桶（秒）
+TASK_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0)
+
+# Prometheus 文本格式（Starlette 会补上 charset）
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    指标族：按标签值元组保存子指标
+
+    更新不加锁：子指标用 dict.setdefault 创建，计数是普通的整数/浮点累加。
+    事件循环之外的线程（数据库后台写入等）并发更新同一个子指标时极少数情况下可能丢失一次累加，
+    对监控数据可以接受，换来请求路径上没有任何锁。
+    """
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """取得（必要时创建）一组标签值对应的子指标；热路径上应缓存返回值"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render(values, child))
+        return lines
+
+    def _render(self, values, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default.set(value)
+
+
+class _FunctionChild:
+    __slots__ = ("fn",)
+
+    def __init__(self, fn: Callable[[], float]):
+        self.fn = fn
+
+    @property
+    def value(self):
+        return self.fn()
+
+
+class GaugeFunction(_Metric):
+    """采集时调用函数取值的仪表（在线人数、订阅者数等已有的状态，无需在更新处埋点）"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, fn: Callable[[], float]):
+        self._fn = fn
+        super().__init__(name, documentation)
+
+    def _new_child(self):
+        return _FunctionChild(self._fn)
+
+    def collect(self) -> List[str]:
+        try:
+            return super().collect()
+        except Exception:
+            # 取值失败时跳过该指标，不影响其它指标的输出
+            return []
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # 每个桶的非累计计数，最后一个是 +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    """固定分桶直方图，每次观测是一次二分查找和三次累加"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def timed(self, fn):
+        """装饰同步函数：以函数名为唯一的标签值记录每次调用的耗时"""
+        child = self.labels(fn.__name__)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+
+        return wrapper
+
+    def _render(self, values, child) -> List[str]:
+        labels = self.labelnames
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), list(child.counts)):
+            cumulative += count
+            le = 'le="%s"' % _format_value(float(bound))
+            lines.append(f"{self.name}_bucket{_format_labels(labels, values, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels, values)} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{_format_labels(labels, values)} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Prometheus 文本格式 (0.0.4)"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+# 全局实例
+registry = MetricsRegistry()
+
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return registry.register(Gauge(name, documentation, labelnames))
+
+
+def gauge_function(name: str, documentation: str, fn: Callable[[], float]) -> GaugeFunction:
+    return registry.register(GaugeFunction(name, documentation, fn))
+
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (),
+              buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# --- 后台任务 ---
+
+TASK_SECONDS = histogram("mcfrp_task_duration_seconds", "Background task run duration", ("task",), TASK_BUCKETS)
+TASK_ERRORS = counter("mcfrp_task_errors_total", "Background task runs that raised", ("task",))
+TASK_LAST_SUCCESS = gauge("mcfrp_task_last_success_timestamp_seconds",
+                          "Unix time of the last successful background task run", ("task",))
+
+
+@contextmanager
+def track_task(task: str):
+    """记录一次后台任务运行的耗时、异常和最近一次成功的时间"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        TASK_ERRORS.labels(task).inc()
+        raise
+    else:
+        TASK_LAST_SUCCESS.labels(task).set(time.time())
+    finally:
+        TASK_SECONDS.labels(task).observe(time.perf_counter() - start)
+
+
+# --- HTTP 请求 ---
+
+HTTP_REQUESTS = counter("mcfrp_http_requests_total", "HTTP responses by route and status",
+                        ("method", "route", "status"))
+HTTP_SECONDS = histogram("mcfrp_http_request_duration_seconds",
+                         "Time from request start to response headers, by route", ("method", "route"))
+
+
+class MetricsMiddleware:
+    """
+    按路由统计请求数、状态码和延迟（纯 ASGI 中间件，放在最外层以统计被限流拒绝的请求）
+
+    - 路由标签为路由模板（如 /api/lobby/rooms），未匹配路由的请求（404、被中间件拒绝）记为 "unmatched"
+    - 延迟记到响应头发出为止：普通响应与完整耗时几乎相同，SSE 长连接记录的是建立连接的耗时
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Optional[Dict[object, str]] = None
+        # (method, endpoint, status) -> (计数子指标, 直方图子指标)
+        self._children: Dict[tuple, tuple] = {}
+
+    def _route_of(self, scope) -> str:
+        if self._routes is None:
+            routes = getattr(scope.get("app"), "routes", None) or ()
+            self._routes = {getattr(route, "endpoint", None): route.path for route in routes
+                            if hasattr(route, "path")}
+        return self._routes.get(scope.get("endpoint"), "unmatched")
+
+    def _record(self, scope, status: int, elapsed: float):
+        key = (scope["method"], scope.get("endpoint"), status)
+        children = self._children.get(key)
+        if children is None:
+            route = self._route_of(scope)
+            children = (HTTP_REQUESTS.labels(scope["method"], route, str(status)),
+                        HTTP_SECONDS.labels(scope["method"], route))
+            self._children[key] = children
+        children[0].inc()
+        children[1].observe(elapsed)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        observer = _ResponseObserver(self, scope, send)
+        try:
+            await self.app(scope, receive, observer)
+        except BaseException:
+            if not observer.started:
+                self._record(scope, 500, time.perf_counter() - observer.start)
+            raise
+
+
+class _ResponseObserver:
+    """
+    单个请求的 send：响应头发出时记录指标（每个请求一个 __slots__ 对象，代替闭包和 nonlocal 单元）
+    __call__ 不是协程函数，直接返回下游 send 的 awaitable，每条消息少创建一个协程
+    """
+
+    __slots__ = ("middleware", "scope", "send", "start", "started")
+
+    def __init__(self, middleware: MetricsMiddleware, scope, send):
+        self.middleware = middleware
+        self.scope = scope
+        self.send = send
+        self.start = time.perf_counter()
+        self.started = False
+
+    def __call__(self, message):
+        if not self.started and message["type"] == "http.response.start":
+            self.started = True
+            self.middleware._record(self.scope, message["status"], time.perf_counter() - self.start)
+        return self.send(message)
@@ -1,48 +1,297 @@
 import asyncio
-from typing import Optional, Dict
-from mcstatus import JavaServer
+import json
+import random
+import socket
+import struct
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
 from .logger import logger
+from .circuit_breaker import CircuitBreaker, TRIAL
+from .metrics import counter, histogram
+from .probe_cache import probe_cache
+
+# Java 版 Server List Ping 协议
+# https://wiki.vg/Server_List_Ping
+PROTOCOL_VERSION = 47          # 与 mcstatus 默认值一致，服务器会忽略不支持的版本号
+MAX_PACKET_SIZE = 2 * 1024 * 1024  # 状态 JSON 可能带 favicon，上限 2MB
+
+# 主机名解析缓存：避免每次探测都走 getaddrinfo（asyncio 会把它丢进线程池）
+# 主机名由客户端提供，缓存按 LRU 限制条数；解析失败也短暂缓存，避免反复解析不存在的域名
+DNS_CACHE_TTL = 300
+DNS_FAILURE_TTL = 30
+DNS_CACHE_SIZE = 4096
+# host -> (地址，解析失败为 None, 过期时间)
+_dns_cache: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+
+# JSON 文本组件颜色 -> 旧式格式代码
+_COLOR_CODES = {
+    "black": "0", "dark_blue": "1", "dark_green": "2", "dark_aqua": "3",
+    "dark_red": "4", "dark_purple": "5", "gold": "6", "gray": "7",
+    "dark_gray": "8", "blue": "9", "green": "a", "aqua": "b",
+    "red": "c", "light_purple": "d", "yellow": "e", "white": "f",
+}
+_FORMAT_CODES = (("obfuscated", "k"), ("bold", "l"), ("strikethrough", "m"),
+                 ("underlined", "n"), ("italic", "o"))
+
+# 单次 SLP 探测的结果和耗时：ok / timeout / refused（连接或网络错误）/ protocol（响应不合法）
+PROBES = counter("mcfrp_probe_total", "Server List Ping attempts by outcome", ("outcome",))
+PROBE_SECONDS = histogram("mcfrp_probe_duration_seconds", "Server List Ping attempt duration by outcome",
+                          ("outcome",))
+
+
+# 探测目标熔断：同一端点连续 3 次稳健探测失败，或同一 FRP 节点上（跨端点）连续 5 次失败后，
+# 冷却 30 秒内直接判定失败；冷却结束后只发一次单次探测作为试探
+endpoint_breaker = CircuitBreaker("endpoint", failure_threshold=3)
+host_breaker = CircuitBreaker("host", failure_threshold=5)
+# 试探探测的超时（秒），不走 2s+3s+5s 的重试
+TRIAL_TIMEOUT = 3.0
+
+# 稳健探测每次尝试的超时（秒）和重试间隔的基数（0.5s, 1.0s, ...）
+PROBE_TIMEOUTS = (2.0, 3.0, 5.0)
+PROBE_BACKOFF = 0.5
+# 稳健探测的最长耗时：超时分别作用于解析 / 连接 / 状态响应 / ping 四个阶段，再加上重试间隔。
+# 房间心跳在探测完成前会把房间保留这么久（见 RoomRegistry.extend）
+PROBE_MAX_SECONDS = 4 * sum(PROBE_TIMEOUTS) + sum(PROBE_BACKOFF * (2 ** i) for i in range(len(PROBE_TIMEOUTS) - 1))
+
+
+class ProtocolError(Exception):
+    """服务器返回了不符合 SLP 协议的数据"""
+
 
 async def get_server_motd(host: str, port: int) -> Optional[str]:
     """
     异步获取 Minecraft Java 版服务器的 MOTD。
     如果连接失败或超时，返回 None。
     """
-    status = await get_server_status(host, port)
+    status = await robust_get_server_status(host, port)
     if status:
         return status.get("description")
     return None
 
+async def robust_get_server_status(host: str, port: int) -> Optional[dict]:
+    """
+    带缓存的稳健探测：同一 host:port 的并发调用共享一次探测，
+    结果（成功或失败）在 probe_cache 的 TTL 内直接复用。
+    """
+    return await probe_cache.get(host, port, lambda: _guarded_probe(host, port))
+
+async def _guarded_probe(host: str, port: int) -> Optional[dict]:
+    """经过节点 (host) 和端点 (host:port) 两级熔断器的稳健探测"""
+    endpoint = f"{host}:{port}"
+    host_mode = host_breaker.allow(host)
+    if host_mode is None:
+        return None
+    endpoint_mode = endpoint_breaker.allow(endpoint)
+    if endpoint_mode is None:
+        if host_mode == TRIAL:
+            host_breaker.abandon(host)
+        return None
+
+    try:
+        if TRIAL in (host_mode, endpoint_mode):
+            status = await get_server_status(host, port, timeout=TRIAL_TIMEOUT)
+        else:
+            status = await _probe_with_retries(host, port)
+    except BaseException:
+        # 被取消（如服务关闭）时归还试探机会，避免熔断器停在 half_open
+        if host_mode == TRIAL:
+            host_breaker.abandon(host)
+        if endpoint_mode == TRIAL:
+            endpoint_breaker.abandon(endpoint)
+        raise
+
+    ok = bool(status)
+    if host_breaker.record(host, ok):
+        logger.warning(f"Probe circuit opened for node {host}: consecutive probe failures")
+    endpoint_breaker.record(endpoint, ok)
+    return status
+
+async def _probe_with_retries(host: str, port: int) -> Optional[dict]:
+    """
+    Robust server status check with progressive timeout strategy.
+    Tries 3 times with increasing timeouts (2s, 3s, 5s) to handle network congestion
+    while avoiding overly long blocking.
+    """
+    timeouts = PROBE_TIMEOUTS
+    
+    for i, timeout in enumerate(timeouts):
+        status = await get_server_status(host, port, timeout=timeout)
+        if status:
+            return status
+            
+        # Exponential backoff for retry interval: 0.5s, 1.0s, etc.
+        if i < len(timeouts) - 1:
+            sleep_time = PROBE_BACKOFF * (2 ** i)
+            await asyncio.sleep(sleep_time)
+            
+    return None
+
 async def get_server_status(host: str, port: int, timeout: float = 3.0) -> Optional[dict]:
     """
     异步获取 Minecraft 服务器状态 (Version, MOTD, Players)
+
+    纯 asyncio 实现，不占用线程池。timeout 分别作用于每个阶段
+    （连接 / 握手+状态响应 / ping），任一阶段超时即判定失败。
     """
+    writer = None
+    outcome = "protocol"
+    probe_start = time.perf_counter()
     try:
-        # 在 Executor 中运行同步的 mcstatus 代码
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, _get_status_sync, host, port, timeout)
+        address = await _resolve(host, timeout)
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(address, port), timeout)
+
+        # 1. 握手 (next state = 1: status) + 状态请求
+        handshake = (_varint(0) + _varint(PROTOCOL_VERSION) + _string(host)
+                     + struct.pack(">H", port) + _varint(1))
+        writer.write(_frame(handshake) + _frame(_varint(0)))
+        start = time.perf_counter()
+        packet = await asyncio.wait_for(_read_packet(reader), timeout)
+        status_rtt = (time.perf_counter() - start) * 1000
+
+        packet_id, offset = _unpack_varint(packet, 0)
+        if packet_id != 0:
+            raise ProtocolError(f"unexpected status packet id {packet_id}")
+        length, offset = _unpack_varint(packet, offset)
+        raw = json.loads(packet[offset:offset + length].decode("utf-8"))
+
+        # 2. Ping/Pong 测延迟；部分服务器在状态响应后直接断开，此时退回状态往返时间
+        latency = status_rtt
+        try:
+            token = random.getrandbits(63)
+            writer.write(_frame(_varint(1) + struct.pack(">q", token)))
+            start = time.perf_counter()
+            pong = await asyncio.wait_for(_read_packet(reader), timeout)
+            if pong[:1] == b"\x01" and struct.unpack(">q", pong[1:9])[0] == token:
+                latency = (time.perf_counter() - start) * 1000
+        except (asyncio.TimeoutError, OSError, asyncio.IncompleteReadError, struct.error, ProtocolError):
+            pass
+
+        status = _parse_status(raw, latency)
+        outcome = "ok"
+        return status
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        return None
+    except (OSError, asyncio.IncompleteReadError):
+        outcome = "refused"
+        return None
     except Exception as e:
         # logger.debug(f"Ping failed for {host}:{port}: {e}")
         return None
+    finally:
+        if writer is not None:
+            writer.close()
+        PROBES.labels(outcome).inc()
+        PROBE_SECONDS.labels(outcome).observe(time.perf_counter() - probe_start)
+
+def _parse_status(raw: dict, latency: float) -> dict:
+    version = raw["version"]
+    players = raw["players"]
+    return {
+        "version": version["name"],
+        "description": _motd_to_text(raw.get("description", "")),
+        "players_online": players["online"],
+        "players_max": players["max"],
+        "latency": latency
+    }
+
+def _motd_to_text(component, color: Optional[str] = None, formats: Tuple[str, ...] = ()) -> str:
+    """将 MOTD (str / JSON 文本组件 / 组件列表) 转为带 § 格式代码的字符串，子组件继承父组件样式"""
+    if isinstance(component, str):
+        if not component:
+            return ""
+        prefix = (f"§{color}" if color else "") + "".join(f"§{code}" for code in formats)
+        return prefix + component + ("§r" if prefix else "")
+    if isinstance(component, list):
+        return "".join(_motd_to_text(c, color, formats) for c in component)
+    if not isinstance(component, dict):
+        return ""
+
+    color = _COLOR_CODES.get(component.get("color"), color)
+    formats = tuple(code for name, code in _FORMAT_CODES if component.get(name, code in formats))
+    return (_motd_to_text(component.get("text", ""), color, formats)
+            + "".join(_motd_to_text(c, color, formats) for c in component.get("extra", [])))
 
-def _get_status_sync(host: str, port: int, timeout: float) -> Optional[dict]:
+async def _resolve(host: str, timeout: float) -> str:
+    """解析主机名（带缓存），IP 字面量直接返回；解析超过 timeout 秒按超时处理"""
     try:
-        server = JavaServer(host, port, timeout=timeout)
-        status = server.status()
-        
-        # 解析 MOTD (可能是 str, dict 或 list)
-        description = status.description
-        if isinstance(description, dict):
-            description = description.get('text', '')
-        elif isinstance(description, list):
-            description = "".join([d.get('text', '') for d in description if isinstance(d, dict)])
-        
-        return {
-            "version": status.version.name,
-            "description": str(description),
-            "players_online": status.players.online,
-            "players_max": status.players.max,
-            "latency": status.latency
-        }
-    except Exception:
-        return None
+        socket.inet_pton(socket.AF_INET6 if ":" in host else socket.AF_INET, host)
+        return host
+    except OSError:
+        pass
+
+    now = time.monotonic()
+    cached = _dns_cache.get(host)
+    if cached is not None:
+        if cached[1] > now:
+            _dns_cache.move_to_end(host)
+            if cached[0] is None:
+                raise socket.gaierror(f"cached lookup failure for {host}")
+            return cached[0]
+        del _dns_cache[host]
+
+    try:
+        infos = await asyncio.wait_for(
+            asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM), timeout)
+        address = infos[0][4][0]
+    except (OSError, asyncio.TimeoutError):
+        _cache_address(host, None, now + DNS_FAILURE_TTL)
+        raise
+    _cache_address(host, address, now + DNS_CACHE_TTL)
+    return address
+
+def _cache_address(host: str, address: Optional[str], expires: float):
+    _dns_cache[host] = (address, expires)
+    _dns_cache.move_to_end(host)
+    if len(_dns_cache) > DNS_CACHE_SIZE:
+        # 先丢弃已过期的条目，仍然超出时按 LRU 淘汰
+        now = time.monotonic()
+        for key in [k for k, (_, exp) in _dns_cache.items() if exp <= now]:
+            del _dns_cache[key]
+        while len(_dns_cache) > DNS_CACHE_SIZE:
+            _dns_cache.popitem(last=False)
+
+async def _read_packet(reader: asyncio.StreamReader) -> bytes:
+    length = 0
+    for i in range(5):
+        byte = (await reader.readexactly(1))[0]
+        length |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            break
+    else:
+        raise ProtocolError("VarInt too long")
+    if length <= 0 or length > MAX_PACKET_SIZE:
+        raise ProtocolError(f"invalid packet length {length}")
+    return await reader.readexactly(length)
+
+def _unpack_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    value = 0
+    for i in range(5):
+        if offset >= len(data):
+            raise ProtocolError("truncated VarInt")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            return value, offset
+    raise ProtocolError("VarInt too long")
+
+def _varint(value: int) -> bytes:
+    value &= 0xFFFFFFFF
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def _string(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return _varint(len(data)) + data
+
+def _frame(payload: bytes) -> bytes:
+    return _varint(len(payload)) + payload
@@ -41,3 +41,7 @@ class TunnelInfo(BaseModel):
     server_addr: str
     remote_port: int
     client_ip: Optional[str] = None
+    lease: Optional[str] = None  # 上次校验通过后服务端签发的租约
+
+class ModerationCheck(BaseModel):
+    text: str
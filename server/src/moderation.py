@@ -1,21 +1,130 @@
 import os
-from typing import List, Optional
+from collections import deque
+from typing import List, Optional, Tuple
 from .logger import logger
 
 RULES_PATH = "config/black-rules.txt"
 
+def _fold(text: str) -> str:
+    """
+    逐字符转小写，每个字符只映射为一个字符，使匹配下标与原文一致
+    （str.lower() 会把 'İ' 变成两个字符；lower() 不会缩短字符串，长度不变即已逐字符对应）
+    """
+    lower = text.lower()
+    if len(lower) == len(text):
+        return lower
+    return "".join(ch.lower()[:1] for ch in text)
+
+class AhoCorasick:
+    """
+    多模式匹配自动机 (Aho-Corasick)
+
+    构建一次后，对任意文本只需单次扫描即可找出所有规则的出现位置，
+    复杂度 O(len(text) + 匹配数)，与规则数量无关。匹配不区分大小写。
+    """
+
+    def __init__(self, patterns: List[str]):
+        self.patterns = list(patterns)
+        # 节点 i 的转移表 / 失配指针 / 以该节点结尾的规则下标(-1 表示无)
+        self._goto = [{}]
+        self._fail = [0]
+        self._own = [-1]
+        # 沿失配链最近的、自身有规则结尾的节点（用于枚举全部匹配）
+        self._dict_link = [0]
+        # 该节点（含失配链）结尾的规则中下标最小者，用于快速判定首个匹配
+        self._best = [-1]
+        # 每个规则的长度
+        self._lengths = []
+
+        for index, pattern in enumerate(self.patterns):
+            key = _fold(pattern)
+            self._lengths.append(len(key))
+            if not key:
+                continue
+            node = 0
+            for ch in key:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._own.append(-1)
+                    self._dict_link.append(0)
+                    self._best.append(-1)
+                node = nxt
+            # 重复规则只保留第一个
+            if self._own[node] == -1:
+                self._own[node] = index
+                self._best[node] = index
+
+        self._build_links()
+
+    def _build_links(self):
+        goto, fail, own, dict_link, best = self._goto, self._fail, self._own, self._dict_link, self._best
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                queue.append(child)
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(ch, 0)
+                if f == child:
+                    f = 0
+                fail[child] = f
+                dict_link[child] = f if own[f] != -1 else dict_link[f]
+                if best[f] != -1 and (best[child] == -1 or best[f] < best[child]):
+                    best[child] = best[f]
+
+    def _step(self, node: int, ch: str) -> int:
+        goto, fail = self._goto, self._fail
+        while node and ch not in goto[node]:
+            node = fail[node]
+        return goto[node].get(ch, 0)
+
+    def search_first(self, text: str) -> Optional[Tuple[int, str]]:
+        """返回最先结束的匹配 (起始下标, 规则)；同一位置结束的多个规则取规则文件中靠前者"""
+        node = 0
+        best = self._best
+        for i, ch in enumerate(_fold(text)):
+            node = self._step(node, ch)
+            index = best[node]
+            if index != -1:
+                return i - self._lengths[index] + 1, self.patterns[index]
+        return None
+
+    def find_all(self, text: str) -> List[Tuple[int, str]]:
+        """返回全部匹配 [(起始下标, 规则), ...]，按结束位置排序"""
+        matches = []
+        node = 0
+        own, dict_link = self._own, self._dict_link
+        for i, ch in enumerate(_fold(text)):
+            node = self._step(node, ch)
+            out = node if own[node] != -1 else dict_link[node]
+            while out:
+                index = own[out]
+                matches.append((i - self._lengths[index] + 1, self.patterns[index]))
+                out = dict_link[out]
+        return matches
+
+    def __len__(self):
+        return len(self.patterns)
+
 class ContentModerator:
     _instance = None
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(ContentModerator, cls).__new__(cls)
             cls._instance.rules = []
+            cls._instance._automaton = AhoCorasick([])
             cls._instance.load_rules()
         return cls._instance
 
     def load_rules(self):
-        """加载敏感词规则"""
+        """加载敏感词规则，并编译为 Aho-Corasick 自动机"""
         if not os.path.exists(RULES_PATH):
             logger.warning(f"Sensitive words file not found: {RULES_PATH}")
             return
@@ -23,30 +132,43 @@ class ContentModerator:
         try:
             with open(RULES_PATH, 'r', encoding='utf-8') as f:
                 # 读取非空行，去除首尾空格
-                self.rules = [line.strip() for line in f if line.strip()]
+                rules = [line.strip() for line in f if line.strip()]
+            self.set_rules(rules)
             logger.info(f"Loaded {len(self.rules)} sensitive word rules.")
         except Exception as e:
             logger.error(f"Failed to load sensitive words: {e}")
 
+    def set_rules(self, rules: List[str]):
+        """替换规则列表（构建完成后再整体替换，检查过程中不会看到半成品）"""
+        automaton = AhoCorasick(rules)
+        self.rules, self._automaton = automaton.patterns, automaton
+
     def check_text(self, text: str) -> Optional[str]:
         """
         检查文本是否包含敏感词 (模糊匹配/子字符串匹配)
-        
+
         Args:
             text: 待检查的文本
-            
+
         Returns:
-            str: 匹配到的第一个敏感词，如果没有则返回 None
+            str: 文本中最先出现的敏感词，如果没有则返回 None
         """
         if not text:
             return None
-            
-        text_lower = text.lower()
-        for rule in self.rules:
-            # 简单的子字符串匹配
-            if rule.lower() in text_lower:
-                return rule
-        return None
+
+        match = self._automaton.search_first(text)
+        return match[1] if match else None
+
+    def find_matches(self, text: str) -> List[Tuple[int, str]]:
+        """
+        返回文本中所有敏感词及其位置，供管理后台展示
+
+        Returns:
+            list: [(起始下标, 敏感词), ...]
+        """
+        if not text:
+            return []
+        return self._automaton.find_all(text)
 
 # 全局实例
 moderator = ContentModerator()
@@ -0,0 +1,191 @@
+import hashlib
+import math
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+from .timer_wheel import TimerWheel
+from .database import save_presence_stats, load_presence_stats, prune_presence_stats
+from .logger import logger
+
+# 软件在线心跳超时（秒），客户端每 10 秒发送一次
+ONLINE_TIMEOUT = 15
+# 在线统计保留天数：每小时统计 / 每天统计
+PRESENCE_HOURLY_RETENTION_DAYS = 14
+PRESENCE_DAILY_RETENTION_DAYS = 400
+# HyperLogLog 精度：2^12 个寄存器，标准误差约 1.6%，每个草图 4KB（压缩后通常更小）
+HLL_PRECISION = 12
+
+
+class HyperLogLog:
+    """HyperLogLog 基数估计（64 位哈希，小基数使用线性计数修正）"""
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: Optional[bytes] = None):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+        if len(self.registers) != self.m:
+            raise ValueError("register size does not match precision")
+
+    def add(self, item: str):
+        x = int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "big")
+        index = x >> (64 - self.p)
+        rest = x & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def merge(self, other: "HyperLogLog"):
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def to_bytes(self) -> bytes:
+        """压缩后的寄存器（稀疏时只有几十字节）"""
+        return zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data: bytes, precision: int = HLL_PRECISION) -> "HyperLogLog":
+        return cls(precision, zlib.decompress(data))
+
+
+class _Bucket:
+    __slots__ = ("sketch", "peak")
+
+    def __init__(self, sketch: Optional[HyperLogLog] = None, peak: int = 0):
+        self.sketch = sketch or HyperLogLog()
+        self.peak = peak
+
+
+class PresenceTracker:
+    """
+    软件在线状态（大厅心跳）
+
+    - 字典保存每个 IP 的最后心跳时间，时间轮负责按时过期，在线人数即字典大小
+    - 每小时/每天一个 HyperLogLog 草图统计独立用户数，并记录该时段的在线峰值
+    - 心跳和计数都是 O(1) 且不写数据库；统计草图由 flush() 定期压缩落库
+    """
+
+    def __init__(self, timeout: float = ONLINE_TIMEOUT, tick: float = 1.0):
+        self.timeout = timeout
+        self._last_seen: Dict[str, float] = {}
+        self._wheel = TimerWheel(tick=tick)
+        # bucket -> 统计；bucket 为 "YYYY-MM-DD HH"（小时）或 "YYYY-MM-DD"（天），本地时间
+        self._buckets: Dict[str, _Bucket] = {}
+        self._dirty = set()
+        # 当前小时的 [开始, 结束) 和对应的 bucket，避免每次心跳都格式化时间
+        self._hour_range = (0.0, 0.0)
+        self._current: Tuple[str, ...] = ()
+
+    def __len__(self):
+        return len(self._last_seen)
+
+    def _current_buckets(self, now: float) -> Tuple[str, ...]:
+        start, end = self._hour_range
+        if not start <= now < end:
+            tm = time.localtime(now)
+            start = now - (tm.tm_min * 60 + tm.tm_sec) - (now % 1)
+            self._hour_range = (start, start + 3600)
+            self._current = (time.strftime("%Y-%m-%d %H", tm), time.strftime("%Y-%m-%d", tm))
+        return self._current
+
+    def _bucket(self, key: str) -> _Bucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket()
+        return bucket
+
+    def load(self, now: Optional[float] = None) -> int:
+        """从数据库恢复当前小时/当天的统计，使重启前后的独立用户合并计算"""
+        keys = list(self._current_buckets(time.time() if now is None else now))
+        rows = load_presence_stats(keys)
+        for row in rows:
+            self._buckets[row["bucket"]] = _Bucket(HyperLogLog.from_bytes(row["sketch"]), row["peak"])
+        return len(rows)
+
+    def heartbeat(self, client_ip: str, now: Optional[float] = None):
+        """记录一次在线心跳"""
+        if now is None:
+            now = time.time()
+        self._last_seen[client_ip] = now
+        self._wheel.schedule(client_ip, now + self.timeout)
+        online = len(self._last_seen)
+        for key in self._current_buckets(now):
+            bucket = self._bucket(key)
+            bucket.sketch.add(client_ip)
+            if online > bucket.peak:
+                bucket.peak = online
+            self._dirty.add(key)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """移除心跳超时的用户，返回移除数量"""
+        expired = self._wheel.advance(now)
+        for client_ip, _ in expired:
+            self._last_seen.pop(client_ip, None)
+        return len(expired)
+
+    def count(self, now: Optional[float] = None) -> int:
+        """当前在线人数"""
+        self.expire(now)
+        return len(self._last_seen)
+
+    def list_users(self) -> List[dict]:
+        """在线用户列表，按心跳时间倒序"""
+        self.expire()
+        users = [{"client_ip": ip, "last_heartbeat": ts} for ip, ts in self._last_seen.items()]
+        users.sort(key=lambda u: u["last_heartbeat"], reverse=True)
+        return users
+
+    def flush(self, now: Optional[float] = None) -> int:
+        """把有变化的统计写入数据库，并释放已结束时段的内存草图，返回写入的行数"""
+        current = set(self._current_buckets(time.time() if now is None else now))
+        dirty, self._dirty = self._dirty, set()
+        if dirty:
+            rows = [(key, self._buckets[key].peak, self._buckets[key].sketch.to_bytes()) for key in dirty]
+            try:
+                save_presence_stats(rows)
+            except Exception as e:
+                # 写入失败，下次重试
+                self._dirty |= dirty
+                logger.error(f"Failed to persist presence stats: {e}")
+                return 0
+        for key in [k for k in self._buckets if k not in current and k not in self._dirty]:
+            del self._buckets[key]
+        return len(dirty)
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """删除超出保留期的小时/天统计（只访问数据库，可在线程中调用），返回删除行数"""
+        if now is None:
+            now = time.time()
+        return prune_presence_stats(
+            time.strftime("%Y-%m-%d %H", time.localtime(now - PRESENCE_HOURLY_RETENTION_DAYS * 86400)),
+            time.strftime("%Y-%m-%d", time.localtime(now - PRESENCE_DAILY_RETENTION_DAYS * 86400)))
+
+    def stats(self, hours: int = 24, days: int = 7, now: Optional[float] = None) -> dict:
+        """最近 hours 个小时和 days 天的独立用户数估计和在线峰值"""
+        if now is None:
+            now = time.time()
+        hourly = [time.strftime("%Y-%m-%d %H", time.localtime(now - i * 3600)) for i in range(hours)]
+        daily = [time.strftime("%Y-%m-%d", time.localtime(now - i * 86400)) for i in range(days)]
+
+        merged = {row["bucket"]: (row["peak"], HyperLogLog.from_bytes(row["sketch"]))
+                  for row in load_presence_stats(hourly + daily)}
+        # 内存中的当前时段比数据库中的新
+        for key, bucket in self._buckets.items():
+            merged[key] = (bucket.peak, bucket.sketch)
+
+        def _rows(keys):
+            return [{"bucket": k, "unique_users": merged[k][1].count(), "peak_online": merged[k][0]}
+                    for k in keys if k in merged]
+
+        return {"online": self.count(now), "hourly": _rows(hourly), "daily": _rows(daily)}
+
+
+# 全局实例
+presence = PresenceTracker()
@@ -0,0 +1,89 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+# 探测结果缓存时间（秒）。房间心跳每 5 秒一次，10 秒内同一端点最多探测一次
+PROBE_CACHE_TTL = 10.0
+
+
+class ProbeCache:
+    """
+    Minecraft 服务器探测结果缓存 (按 host:port)
+
+    - single-flight: 同一端点同时只有一个探测在进行，并发调用方等待同一个结果
+    - TTL: 探测完成后（无论成功或失败）结果在有效期内直接复用
+    - 探测在独立任务中运行，某个调用方被取消（如客户端断开）不会中断其他调用方
+    """
+
+    def __init__(self, ttl: float = PROBE_CACHE_TTL, failure_ttl: Optional[float] = None,
+                 max_entries: int = 10000):
+        """
+        :param ttl: 成功结果的有效期（秒）
+        :param failure_ttl: 失败结果的有效期（秒），默认与 ttl 相同
+        :param max_entries: 缓存条目上限，超出时先清理过期条目
+        """
+        self.ttl = ttl
+        self.failure_ttl = ttl if failure_ttl is None else failure_ttl
+        self.max_entries = max_entries
+        self._results: Dict[str, Tuple[Optional[dict], float]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, host: str, port: int,
+                  fetch: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        """返回缓存结果，或等待（必要时发起）一次探测"""
+        key = f"{host}:{port}"
+        cached = self._results.get(key)
+        if cached is not None and cached[1] > time.monotonic():
+            self.hits += 1
+            return cached[0]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._run(key, fetch))
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _run(self, key: str, fetch) -> Optional[dict]:
+        try:
+            result = await fetch()
+        except Exception:
+            result = None
+        finally:
+            self._inflight.pop(key, None)
+        self._store(key, result)
+        return result
+
+    def _store(self, key: str, result: Optional[dict]):
+        now = time.monotonic()
+        if len(self._results) >= self.max_entries:
+            self._results = {k: v for k, v in self._results.items() if v[1] > now}
+            if len(self._results) >= self.max_entries:
+                self._results.clear()
+        ttl = self.ttl if result else self.failure_ttl
+        self._results[key] = (result, now + ttl)
+
+    def invalidate(self, host: str, port: int):
+        self._results.pop(f"{host}:{port}", None)
+
+    def clear(self):
+        self._results.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._results),
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+
+# 全局实例
+probe_cache = ProbeCache()
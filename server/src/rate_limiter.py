@@ -0,0 +1,100 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+from .shared_state import SharedState
+
+# 限流状态表的容量上限（按 (IP, 策略) 计），超出时淘汰最久未访问的条目
+MAX_KEYS = 100000
+
+
+class RoutePolicy(NamedTuple):
+    """
+    单个路由组的限流策略
+    :param name: 策略名，同名策略共享同一个额度
+    :param limit: 时间窗口内允许的请求数（也是允许的突发量）
+    :param window: 时间窗口（秒）
+    :param cost: 每次请求消耗的额度
+    :param ban_minutes: 超限时自动封禁的时长，0 表示只拒绝本次请求 (429)
+    """
+    name: str
+    limit: int
+    window: float
+    cost: int = 1
+    ban_minutes: int = 0
+
+
+class RateLimiter:
+    """
+    GCRA（通用信元速率算法，等价于令牌桶）限流器
+
+    - 每个 (IP, 策略) 只保存一个浮点数：理论到达时间 TAT，检查为 O(1)
+    - 状态表为容量固定的 LRU，超出 max_keys 时淘汰最久未访问的条目；
+      被淘汰的条目等同于额度已满的新用户，活跃的超限者总是在表尾不会被淘汰
+    - 路由按前缀匹配策略，最长前缀优先；前缀以 "/" 开头时匹配任意方法，
+      否则形如 "POST /api/..." 同时匹配方法和路径
+    - 传入 shared 时（多进程模式）状态保存在共享内存中，所有工作进程共用同一份额度
+    """
+
+    def __init__(self, default: RoutePolicy, routes: Iterable[Tuple[str, RoutePolicy]] = (),
+                 max_keys: int = MAX_KEYS, shared: Optional[SharedState] = None):
+        self.default = default
+        self.max_keys = max_keys
+        self.shared = shared
+        # 最长前缀优先
+        self._routes = sorted(routes, key=lambda r: len(r[0]), reverse=True)
+        self._tat: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._tat)
+
+    def policy_for(self, method: str, path: str) -> RoutePolicy:
+        action = f"{method} {path}"
+        for prefix, policy in self._routes:
+            if (path if prefix.startswith("/") else action).startswith(prefix):
+                return policy
+        return self.default
+
+    def check(self, client_ip: str, policy: RoutePolicy, now: Optional[float] = None) -> float:
+        """
+        消耗一次额度
+        :return: 0 表示放行；否则为建议的重试等待秒数
+        """
+        if now is None:
+            now = time.monotonic()
+        interval = policy.window / policy.limit
+        if self.shared is not None:
+            return self.shared.gcra(f"{client_ip} {policy.name}", interval * policy.cost, policy.window, now)
+        key = (client_ip, policy.name)
+        tat = self._tat.get(key)
+        if tat is None or tat < now:
+            tat = now
+        new_tat = tat + interval * policy.cost
+        allow_at = new_tat - policy.window
+        if allow_at > now:
+            # 拒绝的请求不消耗额度，但仍刷新 LRU 位置
+            if key in self._tat:
+                self._tat.move_to_end(key)
+            return allow_at - now
+        self._store(key, new_tat)
+        return 0.0
+
+    def _store(self, key: Tuple[str, str], tat: float):
+        self._tat[key] = tat
+        self._tat.move_to_end(key)
+        if len(self._tat) > self.max_keys:
+            self._tat.popitem(last=False)
+            self.evicted += 1
+
+    def reset(self, client_ip: str):
+        """清除某个 IP 在所有策略下的状态（例如已被封禁后）"""
+        for name in {self.default.name, *(policy.name for _, policy in self._routes)}:
+            if self.shared is not None:
+                self.shared.forget(f"{client_ip} {name}")
+            else:
+                self._tat.pop((client_ip, name), None)
+
+    def stats(self) -> Dict[str, int]:
+        if self.shared is not None:
+            return {"shared": True, "max_keys": self.shared.rate_slots}
+        return {"keys": len(self._tat), "max_keys": self.max_keys, "evicted": self.evicted}
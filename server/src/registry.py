@@ -0,0 +1,343 @@
+import time
+from collections import deque
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+from .models import RoomCreate, RoomInfo
+from .timer_wheel import TimerWheel
+from .database import save_rooms, load_rooms, save_tunnels, load_tunnels, room_row, tunnel_row
+from .logger import logger
+
+# 房间心跳超时（秒），客户端每 5 秒发送一次
+ROOM_TIMEOUT = 10
+# 隧道心跳超时（秒），客户端每 15 秒发送一次
+TUNNEL_TIMEOUT = 40
+
+# 房间变更日志保留的条数，落后更多的客户端改为拉取完整列表
+CHANGE_LOG_SIZE = 2048
+
+# 客户端默认值列表（这些值应该被服务端探测结果覆盖）
+CLIENT_DEFAULT_VERSIONS = ("未知版本", "1.20.1", "")
+
+
+class _ExpiringRegistry:
+    """
+    内存注册表基类：字典保存实时状态，时间轮负责按时过期
+
+    内存是实时状态的唯一权威来源；SQLite 只通过 flush() 接收增量快照，用于重启恢复。
+    """
+
+    def __init__(self, timeout: float, tick: float = 1.0):
+        self.timeout = timeout
+        self._entries: Dict[Hashable, object] = {}
+        self._wheel = TimerWheel(tick=tick)
+        # 自上次 flush 以来变化 / 删除的 key
+        self._dirty = set()
+        self._removed = set()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _put(self, key, entry, now: float):
+        self._entries[key] = entry
+        self._wheel.schedule(key, now + self.timeout)
+        self._dirty.add(key)
+        self._removed.discard(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._wheel.cancel(key)
+        self._dirty.discard(key)
+        self._removed.add(key)
+        self._on_removed(key, entry)
+        return entry
+
+    def _on_removed(self, key, entry):
+        pass
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """移除所有超时的条目，返回移除数量"""
+        expired = self._wheel.advance(now)
+        for key, _ in expired:
+            self._remove(key)
+        return len(expired)
+
+    def snapshot(self) -> Optional[tuple]:
+        """
+        取出自上次以来的变化（必须在事件循环线程中调用）
+        返回 (行列表, 删除的 key 列表)，行是不可变的元组，可以安全地交给其它线程写入；没有变化时返回 None
+        """
+        dirty, self._dirty = self._dirty, set()
+        removed, self._removed = self._removed, set()
+        if not dirty and not removed:
+            return None
+        return [self._row(self._entries[k]) for k in dirty if k in self._entries], list(removed)
+
+    def write_snapshot(self, snapshot: tuple):
+        """把 snapshot() 的结果写入 SQLite（单个事务），可在线程中调用，不访问内存状态"""
+        rows, removed = snapshot
+        self._persist(rows, removed)
+
+    def restore_snapshot(self, snapshot: tuple):
+        """写入失败后重新标记快照中的变化（在事件循环线程中调用），下次 flush 重试"""
+        rows, removed = snapshot
+        self._dirty |= {k for k in map(self._key_of_row, rows) if k in self._entries}
+        self._removed |= {k for k in removed if k not in self._entries}
+
+    def flush(self) -> int:
+        """同步写入变化（事件循环之外或关闭时使用），返回写入的行数"""
+        snapshot = self.snapshot()
+        if snapshot is None:
+            return 0
+        try:
+            self.write_snapshot(snapshot)
+        except Exception as e:
+            self.restore_snapshot(snapshot)
+            logger.error(f"Failed to persist {type(self).__name__} snapshot: {e}")
+            return 0
+        return len(snapshot[0]) + len(snapshot[1])
+
+    def _row(self, entry) -> tuple:
+        raise NotImplementedError
+
+    def _key_of_row(self, row: tuple):
+        raise NotImplementedError
+
+    def _persist(self, rows: list, removed_keys: list):
+        raise NotImplementedError
+
+
+class RoomRegistry(_ExpiringRegistry):
+    """房间注册表，key 为 full_room_code"""
+
+    def __init__(self, timeout: float = ROOM_TIMEOUT, tick: float = 1.0):
+        super().__init__(timeout, tick)
+        # client_ip -> {full_room_code}，用于 O(1) 防多开检查
+        self._by_ip: Dict[str, set] = {}
+        # 公开房间列表的版本号：列表内容变化时单调递增，纯心跳（只刷新 updated_at）不递增。
+        # 以启动时的毫秒时间戳为起点，重启后的版本号不会与旧进程的 ETag / since 撞车
+        self.version = int(time.time() * 1000)
+        # 变更日志 (version, full_room_code)，以及日志能覆盖的最早 since
+        self._changes = deque()
+        self._log_floor = self.version
+        # 列表变化监听者 fn(version, full_room_code)，在条目更新后同步调用
+        self.listeners: List[Callable[[int, str], None]] = []
+
+    @property
+    def etag(self) -> str:
+        """公开房间列表的弱校验器；心跳只改变 updated_at 和排序，语义上视为同一份列表"""
+        return f'W/"{self.version}"'
+
+    def _touch_list(self, full_room_code: str, old: Optional[RoomInfo], new: Optional[RoomInfo]):
+        """房间变化影响公开列表时递增版本号"""
+        if not ((old is not None and old.is_public) or (new is not None and new.is_public)):
+            return
+        if old is not None and new is not None and \
+                old.model_dump(exclude={"updated_at"}) == new.model_dump(exclude={"updated_at"}):
+            return
+        self._bump(full_room_code)
+
+    def _bump(self, full_room_code: str):
+        self.version += 1
+        self._changes.append((self.version, full_room_code))
+        if len(self._changes) > CHANGE_LOG_SIZE:
+            self._log_floor = self._changes.popleft()[0]
+        for listener in self.listeners:
+            try:
+                listener(self.version, full_room_code)
+            except Exception as e:
+                logger.error(f"Room list listener failed: {e}")
+
+    def changes_since(self, since: int) -> Optional[Tuple[List[RoomInfo], List[str]]]:
+        """
+        返回 since 之后变化的公开房间和已移除（或转为私有）的房间号。
+        since 超出变更日志覆盖范围时返回 None，调用方应改发完整列表。
+        """
+        if since < self._log_floor or since > self.version:
+            return None
+        changed = []
+        for version, code in reversed(self._changes):
+            if version <= since:
+                break
+            changed.append(code)
+        rooms, removed = [], []
+        for code in dict.fromkeys(changed):
+            room = self._entries.get(code)
+            if room is not None and room.is_public:
+                rooms.append(room)
+            else:
+                removed.append(code)
+        return rooms, removed
+
+    def load(self) -> int:
+        """从数据库恢复房间；恢复的房间重新获得一个完整的超时周期等待心跳"""
+        now = time.time()
+        for room in load_rooms():
+            self._entries[room.full_room_code] = room
+            self._by_ip.setdefault(room.client_ip, set()).add(room.full_room_code)
+            self._wheel.schedule(room.full_room_code, max(room.updated_at, now) + self.timeout)
+        # 恢复的房间不进入变更日志，之前的 since 一律改发完整列表
+        self.version += 1
+        self._changes.clear()
+        self._log_floor = self.version
+        return len(self._entries)
+
+    def replace(self, rooms: List[RoomInfo], version: int):
+        """
+        用主进程发布的镜像整体替换房间（多进程模式的从进程，见 lobby_mirror）
+        镜像只用于读：不安排过期、不标记落库，版本号与主进程一致，之前的 since 改发完整列表
+        """
+        self._entries = {room.full_room_code: room for room in rooms}
+        self._by_ip = {}
+        for room in rooms:
+            self._by_ip.setdefault(room.client_ip, set()).add(room.full_room_code)
+        self.version = version
+        self._changes.clear()
+        self._log_floor = version
+
+    def get(self, full_room_code: str) -> Optional[RoomInfo]:
+        return self._entries.get(full_room_code)
+
+    def upsert(self, room: RoomCreate, client_ip: str) -> RoomInfo:
+        """房间心跳：新建或更新房间，保留服务端已探测的版本和描述"""
+        now = time.time()
+        game_version = room.game_version
+        description = room.description
+
+        existing = self._entries.get(room.full_room_code)
+        if existing:
+            existing_version = existing.game_version
+            # 版本优先级逻辑：
+            if existing_version and existing_version not in CLIENT_DEFAULT_VERSIONS:
+                # 已有有效的探测版本，保留它
+                game_version = existing_version
+            elif room.game_version in CLIENT_DEFAULT_VERSIONS:
+                # 客户端发的也是默认值，保持现有（可能是等待探测中）
+                game_version = existing_version or room.game_version
+
+            # 描述同理：保留非空的现有描述
+            description = existing.description if existing.description else room.description
+
+            if existing.client_ip != client_ip:
+                self._unindex_ip(existing.client_ip, room.full_room_code)
+
+        info = RoomInfo(**room.model_dump(exclude={"game_version", "description"}),
+                        game_version=game_version, description=description,
+                        updated_at=now, client_ip=client_ip)
+        self._put(room.full_room_code, info, now)
+        self._by_ip.setdefault(client_ip, set()).add(room.full_room_code)
+        self._touch_list(room.full_room_code, existing, info)
+        return info
+
+    def extend(self, full_room_code: str, client_ip: str, seconds: float, now: Optional[float] = None) -> bool:
+        """
+        房主的心跳已到达、探测尚未完成时推迟房间过期：截止时间至少延后到 now + seconds
+        只改过期时间，不改变房间内容和 updated_at（不落库、不改变列表版本）；其它 IP 的请求不生效
+        """
+        room = self._entries.get(full_room_code)
+        if room is None or room.client_ip != client_ip:
+            return False
+        now = time.time() if now is None else now
+        deadline = self._wheel.deadline(full_room_code) or now
+        self._wheel.schedule(full_room_code, max(deadline, now + seconds))
+        return True
+
+    def delete(self, remote_port: int, node_id: int) -> bool:
+        return self._remove(f"{remote_port}_{node_id}") is not None
+
+    def _on_removed(self, key, entry):
+        self._unindex_ip(entry.client_ip, key)
+        self._touch_list(key, entry, None)
+
+    def _unindex_ip(self, client_ip: str, full_room_code: str):
+        codes = self._by_ip.get(client_ip)
+        if codes:
+            codes.discard(full_room_code)
+            if not codes:
+                del self._by_ip[client_ip]
+
+    def update_status(self, full_room_code: str, version: str, description: str) -> bool:
+        """更新房间的探测信息（版本和MOTD）"""
+        room = self._entries.get(full_room_code)
+        if room is None:
+            return False
+        if room.game_version == version and room.description == description:
+            return True
+        room.game_version = version
+        room.description = description
+        self._dirty.add(full_room_code)
+        if room.is_public:
+            self._bump(full_room_code)
+        return True
+
+    def check_ip_conflict(self, client_ip: str, full_room_code: str) -> bool:
+        """检查同一IP是否已开设其他房间（防多开）"""
+        codes = self._by_ip.get(client_ip)
+        if not codes:
+            return False
+        others = codes - {full_room_code}
+        if others:
+            logger.warning(f"Conflict found for IP {client_ip}: Requesting {full_room_code}, but {next(iter(others))} already exists.")
+            return True
+        return False
+
+    def list_public(self, limit: Optional[int] = None) -> List[RoomInfo]:
+        """获取公开房间，按更新时间倒序；limit 为 None 时返回全部"""
+        rooms = [r for r in self._entries.values() if r.is_public]
+        rooms.sort(key=lambda r: r.updated_at, reverse=True)
+        return rooms[:limit]
+
+    def _row(self, entry: RoomInfo) -> tuple:
+        return room_row(entry)
+
+    def _key_of_row(self, row: tuple):
+        return row[0]
+
+    def _persist(self, rows: list, removed_keys: list):
+        save_rooms(rows, removed_keys)
+
+
+class TunnelRegistry(_ExpiringRegistry):
+    """活跃隧道注册表，key 为 (server_addr, remote_port)"""
+
+    def __init__(self, timeout: float = TUNNEL_TIMEOUT, tick: float = 1.0):
+        super().__init__(timeout, tick)
+
+    def load(self) -> int:
+        now = time.time()
+        for tunnel in load_tunnels():
+            key = (tunnel["server_addr"], tunnel["remote_port"])
+            self._entries[key] = tunnel
+            self._wheel.schedule(key, max(tunnel["last_heartbeat"], now) + self.timeout)
+        return len(self._entries)
+
+    def upsert(self, client_ip: str, server_addr: str, remote_port: int):
+        """更新活跃隧道心跳"""
+        now = time.time()
+        self._put((server_addr, remote_port), {
+            "client_ip": client_ip,
+            "server_addr": server_addr,
+            "remote_port": remote_port,
+            "last_heartbeat": now
+        }, now)
+
+    def list_active(self) -> List[dict]:
+        """获取所有活跃隧道信息，按心跳时间倒序"""
+        return sorted(self._entries.values(), key=lambda t: t["last_heartbeat"], reverse=True)
+
+    def _row(self, entry: dict) -> tuple:
+        return tunnel_row(entry)
+
+    def _key_of_row(self, row: tuple):
+        return (row[1], row[2])
+
+    def _persist(self, rows: list, removed_keys: list):
+        save_tunnels(rows, removed_keys)
+
+
+# 全局实例
+room_registry = RoomRegistry()
+tunnel_registry = TunnelRegistry()
@@ -0,0 +1,114 @@
+import gzip
+import json
+from typing import NamedTuple, Optional
+from .models import RoomInfo
+from .utils import mask_ip
+from .registry import room_registry
+
+# 小于该长度的响应不值得压缩（gzip 头部开销 + CPU）
+GZIP_MIN_SIZE = 1024
+# 压缩级别：列表每个版本只压缩一次，取中间值兼顾体积和变更后首个请求的延迟
+GZIP_LEVEL = 6
+
+
+class RoomListSnapshot(NamedTuple):
+    """某个列表版本的已序列化响应"""
+    version: int
+    etag: str
+    body: bytes
+    gzip_body: Optional[bytes]
+
+
+def public_room_dict(room: RoomInfo) -> dict:
+    """房间的对外字段，房主IP脱敏"""
+    return {
+        "full_room_code": room.full_room_code,
+        "remote_port": room.remote_port,
+        "node_id": room.node_id,
+        "room_name": room.room_name,
+        "game_version": room.game_version,
+        "player_count": room.player_count,
+        "max_players": room.max_players,
+        "description": room.description,
+        "is_public": room.is_public,
+        "host_player": room.host_player,
+        "server_addr": room.server_addr,
+        "host_ip": mask_ip(room.client_ip),  # 脱敏后的房主IP
+        "updated_at": room.updated_at
+    }
+
+
+def _encode(payload: dict) -> bytes:
+    """与 FastAPI JSONResponse 相同的紧凑 UTF-8 编码"""
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def serialize_room_list(rooms, version: int) -> bytes:
+    """完整列表：客户端以此替换本地房间表，并用 version 作为下次增量请求的 since"""
+    return _encode({"success": True, "full": True, "version": version,
+                    "rooms": [public_room_dict(room) for room in rooms]})
+
+
+def serialize_room_delta(rooms, removed, version: int) -> bytes:
+    """增量列表：rooms 为新增或变化的房间，removed 为已移除房间的 full_room_code"""
+    return _encode({"success": True, "full": False, "version": version,
+                    "rooms": [public_room_dict(room) for room in rooms], "removed": removed})
+
+
+class RoomListCache:
+    """
+    公开房间列表的预序列化响应缓存
+
+    每个列表版本只做一次脱敏、JSON 编码和 gzip 压缩，之后直接返回同一份字节，
+    直到注册表的列表版本变化。纯心跳不改变版本，因此响应中的 updated_at
+    和排序反映的是该版本生成时的状态（与弱 ETag 的语义一致）。
+    完整列表包含全部公开房间：增量和事件流按房间跟踪变化，不截断才能与完整列表拼出同一份状态
+    （按心跳时间取前 N 个的集合会随纯心跳变化，而纯心跳不产生增量）。
+    """
+
+    def __init__(self, registry, gzip_min_size: int = GZIP_MIN_SIZE):
+        self.registry = registry
+        self.gzip_min_size = gzip_min_size
+        self._snapshot: Optional[RoomListSnapshot] = None
+
+        self.hits = 0
+        self.builds = 0
+        self.deltas = 0
+
+    def get(self) -> RoomListSnapshot:
+        """返回当前列表版本的响应，版本变化时重新生成"""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.etag == self.registry.etag:
+            self.hits += 1
+            return snapshot
+
+        # 在生成前读取版本号：生成期间不会让出事件循环，因此与列表内容一致
+        version, etag = self.registry.version, self.registry.etag
+        body = serialize_room_list(self.registry.list_public(), version)
+        gzip_body = gzip.compress(body, GZIP_LEVEL) if len(body) >= self.gzip_min_size else None
+        self._snapshot = RoomListSnapshot(version, etag, body, gzip_body)
+        self.builds += 1
+        return self._snapshot
+
+    def delta(self, since: int) -> Optional[bytes]:
+        """返回 since 之后的增量响应；since 超出变更日志范围时返回 None"""
+        changes = self.registry.changes_since(since)
+        if changes is None:
+            return None
+        self.deltas += 1
+        rooms, removed = changes
+        return serialize_room_delta(rooms, removed, self.registry.version)
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "hits": self.hits,
+            "builds": self.builds,
+            "deltas": self.deltas,
+            "bytes": len(snapshot.body) if snapshot else 0,
+            "gzip_bytes": len(snapshot.gzip_body) if snapshot and snapshot.gzip_body else 0
+        }
+
+
+# 全局实例
+room_list_cache = RoomListCache(room_registry)
@@ -0,0 +1,193 @@
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from .models import RoomInfo
+from .registry import RoomRegistry, room_registry
+
+# 单页最多返回的房间数
+MAX_PAGE_SIZE = 100
+# 英文/数字词只为前缀建索引到该长度，更长的查询词按该长度查找后再校验
+MAX_PREFIX = 16
+
+SORT_FRESH = "fresh"
+SORT_PLAYERS = "players"
+
+_WORD = re.compile(r"[0-9a-z_.\-]+")
+_CJK = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+")
+
+
+def _index_terms(text: str) -> Set[str]:
+    """建索引用的词项：英文/数字词的所有前缀，中日韩文字的单字和相邻二字"""
+    text = text.lower()
+    terms = set()
+    for word in _WORD.findall(text):
+        for i in range(1, min(len(word), MAX_PREFIX) + 1):
+            terms.add(word[:i])
+    for run in _CJK.findall(text):
+        terms.update(run)
+        terms.update(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def _query_terms(query: str) -> Tuple[Set[str], List[str]]:
+    """查询词项，以及需要在原文中逐条校验的片段（长词和多字中文）"""
+    query = query.lower()
+    terms, verify = set(), []
+    for word in _WORD.findall(query):
+        terms.add(word[:MAX_PREFIX])
+        if len(word) > MAX_PREFIX:
+            verify.append(word)
+    for run in _CJK.findall(query):
+        if len(run) == 1:
+            terms.add(run)
+        else:
+            terms.update(run[i:i + 2] for i in range(len(run) - 1))
+            if len(run) > 2:
+                verify.append(run)
+    return terms, verify
+
+
+def _sort_key(room: RoomInfo, sort: str) -> float:
+    return room.player_count if sort == SORT_PLAYERS else room.updated_at
+
+
+def encode_cursor(room: RoomInfo, sort: str) -> str:
+    """keyset 分页游标：上一页最后一个房间的 (排序值, full_room_code)"""
+    return f"{_sort_key(room, sort)!r}~{room.full_room_code}"
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    key, _, code = cursor.partition("~")
+    return float(key), code
+
+
+class RoomSearchIndex:
+    """
+    公开房间的内存检索索引
+
+    - 房间名/简介：倒排索引（英文词前缀 + 中文单字/二字），多个词取交集
+    - game_version / node_id：精确匹配的二级索引
+    - 结果按新鲜度或人数倒序，keyset 分页（游标为上一页最后一行的排序值和房间号）。
+      按新鲜度翻页时，翻页期间发送了心跳的房间会移到前面的页
+
+    索引通过注册表的变更钩子增量维护；注册表从快照恢复等不经过钩子的变化，
+    在下一次查询时发现版本号不一致后整体重建。
+    """
+
+    def __init__(self, registry: RoomRegistry):
+        self.registry = registry
+        self._terms: Dict[str, Set[str]] = {}
+        self._by_version: Dict[str, Set[str]] = {}
+        self._by_node: Dict[int, Set[str]] = {}
+        # full_room_code -> (词项, game_version, node_id)，用于删除旧索引
+        self._docs: Dict[str, Tuple[Set[str], str, int]] = {}
+        self._synced_version: Optional[int] = None
+        registry.listeners.append(self._on_room_change)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _on_room_change(self, version: int, full_room_code: str):
+        if self._synced_version is None:
+            return
+        if self._synced_version != version - 1:
+            # 有未经过钩子的变化，下次查询时重建
+            self._synced_version = None
+            return
+        self._unindex(full_room_code)
+        room = self.registry.get(full_room_code)
+        if room is not None and room.is_public:
+            self._index(room)
+        self._synced_version = version
+
+    def rebuild(self):
+        self._terms.clear()
+        self._by_version.clear()
+        self._by_node.clear()
+        self._docs.clear()
+        for room in self.registry.list_public(limit=None):
+            self._index(room)
+        self._synced_version = self.registry.version
+
+    def _index(self, room: RoomInfo):
+        code = room.full_room_code
+        terms = _index_terms(f"{room.room_name} {room.description or ''}")
+        version = room.game_version or ""
+        for term in terms:
+            self._terms.setdefault(term, set()).add(code)
+        self._by_version.setdefault(version, set()).add(code)
+        self._by_node.setdefault(room.node_id, set()).add(code)
+        self._docs[code] = (terms, version, room.node_id)
+
+    def _unindex(self, code: str):
+        doc = self._docs.pop(code, None)
+        if doc is None:
+            return
+        terms, version, node_id = doc
+        for term in terms:
+            _discard(self._terms, term, code)
+        _discard(self._by_version, version, code)
+        _discard(self._by_node, node_id, code)
+
+    def search(self, query: str = "", game_version: Optional[str] = None,
+               node_id: Optional[int] = None, sort: str = SORT_FRESH, limit: int = 20,
+               cursor: Optional[str] = None) -> Tuple[List[RoomInfo], Optional[str]]:
+        """
+        检索公开房间，返回 (本页房间, 下一页游标)；没有更多结果时游标为 None
+        :raises ValueError: sort 或 cursor 无效
+        """
+        if sort not in (SORT_FRESH, SORT_PLAYERS):
+            raise ValueError(f"Unknown sort: {sort}")
+        after = decode_cursor(cursor) if cursor else None
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        if self._synced_version != self.registry.version:
+            self.rebuild()
+
+        terms, verify = _query_terms(query or "")
+        sets = [self._terms.get(term, set()) for term in terms]
+        if game_version is not None:
+            sets.append(self._by_version.get(game_version, set()))
+        if node_id is not None:
+            sets.append(self._by_node.get(node_id, set()))
+        candidates = _intersect(sets) if sets else self._docs.keys()
+
+        rows = []
+        for code in candidates:
+            room = self.registry.get(code)
+            if room is None or not room.is_public:
+                continue
+            if verify:
+                text = f"{room.room_name} {room.description or ''}".lower()
+                if not all(fragment in text for fragment in verify):
+                    continue
+            key = (_sort_key(room, sort), code)
+            # 倒序分页：只取严格排在游标之后的行
+            if after is not None and key >= after:
+                continue
+            rows.append((key, room))
+
+        rows.sort(key=lambda row: row[0], reverse=True)
+        page = [room for _, room in rows[:limit]]
+        next_cursor = encode_cursor(page[-1], sort) if len(rows) > limit else None
+        return page, next_cursor
+
+
+def _discard(index: dict, key, code: str):
+    codes = index.get(key)
+    if codes is not None:
+        codes.discard(code)
+        if not codes:
+            del index[key]
+
+
+def _intersect(sets: List[Iterable[str]]) -> Set[str]:
+    sets = sorted(sets, key=len)
+    result = set(sets[0])
+    for other in sets[1:]:
+        result &= other
+        if not result:
+            break
+    return result
+
+
+# 全局实例
+room_search = RoomSearchIndex(room_registry)
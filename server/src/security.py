@@ -1,101 +1,211 @@
+import math
 import time
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from collections import defaultdict, deque
-from .utils import get_effective_ip, is_ip_matched
-from .database import (is_ip_banned, ban_ip, get_whitelist_rules, 
-                       get_blacklist_rules, log_access)
+from typing import Iterable, List, Optional, Tuple
+from .utils import get_scope_ip
+from .rate_limiter import RateLimiter, RoutePolicy
+from .ip_matcher import IPRuleMatcher
+from .database import get_whitelist_rules, get_blacklist_rules
+from .ban_table import auto_bans
+from .shared_state import shared_state
+from .metrics import counter
+from .access_log import access_logger
 from .logger import logger
 
-# Simple in-memory cache for rules
+# 预编译的黑白名单规则，管理接口写入后调用 reload_rules() 整体替换
 _rules_cache = {
-    'whitelist': [],
-    'blacklist': [],
-    'last_update': 0
+    'whitelist': IPRuleMatcher(),
+    'blacklist': IPRuleMatcher(),
+    # 最近一条限时白名单的过期时间，到期后重新构建
+    'next_expiry': float('inf'),
+    # 构建时的共享规则版本号（多进程模式）
+    'version': 0
 }
 
-def _refresh_rules_cache():
-    """Refresh rules from DB every 60 seconds"""
-    now = time.time()
-    if now - _rules_cache['last_update'] > 60:
-        try:
-            # Only extract the rule string for matching
-            _rules_cache['whitelist'] = [r['rule'] for r in get_whitelist_rules()]
-            _rules_cache['blacklist'] = [r['rule'] for r in get_blacklist_rules()]
-            _rules_cache['last_update'] = now
-        except Exception as e:
-            logger.error(f"Failed to refresh rules cache: {e}")
-
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, limit: int = 60, window: int = 60):
+# 被拒绝的请求：blacklist（管理员黑名单）/ banned（封禁期内）/ throttled（超限 429）/ ban（超限并触发封禁）
+DENIALS = counter("mcfrp_rate_limit_denials_total", "Requests denied by the security middleware",
+                  ("reason", "policy"))
+_DENIED_BLACKLIST = DENIALS.labels("blacklist", "")
+_DENIED_BANNED = DENIALS.labels("banned", "")
+
+# 其它进程发布规则变化时，除黑白名单外还需要重新加载的进程内规则（如敏感词）
+rule_listeners = []
+
+def reload_rules():
+    """从数据库重新构建规则匹配器并原子替换（启动时及规则变化后调用）"""
+    global _rules_cache
+    # 先读版本号再读数据库，构建期间的新变化会在下一个请求时再次触发重建
+    version = shared_state.rules_version if shared_state is not None else 0
+    try:
+        now = time.time()
+        whitelist = get_whitelist_rules()
+        active = [r for r in whitelist if not r.get('expires_at') or r['expires_at'] > now]
+        expiries = [r['expires_at'] for r in active if r.get('expires_at')]
+        _rules_cache = {
+            'whitelist': IPRuleMatcher(r['rule'] for r in active),
+            'blacklist': IPRuleMatcher(r['rule'] for r in get_blacklist_rules()),
+            'next_expiry': min(expiries) if expiries else float('inf'),
+            'version': version
+        }
+    except Exception as e:
+        logger.error(f"Failed to reload rules: {e}")
+        # 保留旧规则，稍后再试，避免每个请求都重试
+        _rules_cache['next_expiry'] = time.time() + 60
+
+# 按路由分组的限流策略（前缀匹配，最长优先），未匹配的路由使用中间件的默认策略
+ROUTE_POLICIES = (
+    # 客户端心跳：房间每 5 秒、大厅每 10 秒、隧道校验每 15 秒，正常约 22 次/分钟
+    ("POST /api/lobby/rooms", RoutePolicy("heartbeat", limit=60, window=60, ban_minutes=10)),
+    ("DELETE /api/lobby/rooms", RoutePolicy("heartbeat", limit=60, window=60, ban_minutes=10)),
+    ("POST /api/lobby/heartbeat", RoutePolicy("heartbeat", limit=60, window=60, ban_minutes=10)),
+    ("POST /api/tunnel/validate", RoutePolicy("heartbeat", limit=60, window=60, ban_minutes=10)),
+    # 大厅读取：列表已有 ETag/增量/事件流，超限只拒绝不封禁；检索开销更大，消耗双倍额度
+    ("GET /api/lobby/", RoutePolicy("lobby_read", limit=60, window=60)),
+    ("GET /api/lobby/rooms/search", RoutePolicy("lobby_read", limit=60, window=60, cost=2)),
+    # 管理接口：允许后台页面突发请求，但超限封禁以防爆破管理密钥
+    ("/api/admin/", RoutePolicy("admin", limit=120, window=60, ban_minutes=10)),
+)
+
+def publish_rules_change():
+    """管理员修改规则后调用：重建本进程的规则，多进程模式下通知其它进程"""
+    if shared_state is not None:
+        shared_state.bump_rules_version()
+    reload_rules()
+
+def _current_rules() -> dict:
+    if shared_state is not None and shared_state.rules_version != _rules_cache['version']:
+        reload_rules()
+        for listener in rule_listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.error(f"Failed to reload rules in {listener}: {e}")
+    elif time.time() >= _rules_cache['next_expiry']:
+        reload_rules()
+    return _rules_cache
+
+class RateLimitMiddleware:
+    """
+    访问日志 + 黑白名单 + 自动封禁 + 限流（纯 ASGI 中间件）
+
+    直接读取 ASGI scope，不构造 Request 对象、不包装响应流：放行的请求原样交给下游，
+    拒绝的请求在这里直接写出纯文本响应。这样既省去了 BaseHTTPMiddleware 每个请求的
+    任务和内存流开销，也不会干扰 SSE 等流式响应。
+    """
+
+    def __init__(self, app, limit: int = 60, window: int = 60,
+                 routes: Optional[Iterable[Tuple[str, RoutePolicy]]] = ROUTE_POLICIES, max_keys: Optional[int] = None):
         """
-        :param limit: 时间窗口内的最大请求数 (默认 60)
+        :param limit: 未匹配路由的时间窗口内最大请求数 (默认 60)，超限封禁 10 分钟
         :param window: 时间窗口大小（秒） (默认 60秒)
+        :param routes: 按路由分组的限流策略
+        :param max_keys: 限流状态表容量上限，默认见 rate_limiter.MAX_KEYS
         """
-        super().__init__(app)
+        self.app = app
         self.limit = limit
         self.window = window
-        # 使用 deque 存储请求时间戳，键为 IP
-        self.request_history = defaultdict(deque)
-
-    async def dispatch(self, request: Request, call_next):
-        # 1. 获取真实 IP
-        client_ip = get_effective_ip(request)
-        
-        # 0. 记录访问日志 (Fire and forget, potentially slow if sync, but DB is SQLite WAL usually fast enough for low traffic)
-        # For high performance, this should be async or sampled. 
-        # But for this lobby server, it's likely fine.
-        # Check if it's an admin API call to avoid logging too much internal traffic? 
-        # No, log everything for security audit.
-        try:
-            log_access(client_ip, f"{request.method} {request.url.path}")
-        except:
-            pass
-
-        # Refresh cache if needed
-        _refresh_rules_cache()
-
-        # 2. 检查白名单 (Highest Priority)
-        if is_ip_matched(client_ip, _rules_cache['whitelist']):
+        default = RoutePolicy("default", limit=limit, window=window, ban_minutes=10)
+        kwargs = {} if max_keys is None else {"max_keys": max_keys}
+        self.limiter = RateLimiter(default, routes or (), shared=shared_state, **kwargs)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        denial = self.check(get_scope_ip(scope), scope["method"], scope["path"])
+        if denial is None:
+            await self.app(scope, receive, send)
+            return
+
+        status, message, headers = denial
+        body = message.encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"text/plain; charset=utf-8"),
+                        (b"content-length", str(len(body)).encode()), *headers]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def check(self, client_ip: str, method: str, path: str) -> Optional[Tuple[int, str, List[Tuple[bytes, bytes]]]]:
+        """
+        对一个请求执行全部检查
+        :return: None 表示放行；否则为 (状态码, 响应文本, 额外响应头)
+        """
+        # 0. 记录访问日志 (仅写入内存队列，由后台线程批量落库)
+        # No sampling: log everything for security audit.
+        access_logger.record(client_ip, f"{method} {path}")
+
+        rules = _current_rules()
+
+        # 1. 检查白名单 (Highest Priority)
+        if rules['whitelist'].matches(client_ip):
             # Whitelisted IP bypasses all bans and rate limits
-            return await call_next(request)
+            return None
 
-        # 3. 检查黑名单规则 (Admin Bans)
-        if is_ip_matched(client_ip, _rules_cache['blacklist']):
+        # 2. 检查黑名单规则 (Admin Bans)
+        if rules['blacklist'].matches(client_ip):
             logger.warning(f"Blocked blacklisted IP (Admin Rule): {client_ip}")
-            return Response("Access Denied: You are blacklisted by administrator.", status_code=403)
+            _DENIED_BLACKLIST.inc()
+            return 403, "Access Denied: You are blacklisted by administrator.", []
 
-        # 4. 检查自动封禁 (Auto-Ban)
-        if is_ip_banned(client_ip):
+        # 3. 检查自动封禁 (Auto-Ban)
+        if auto_bans.is_banned(client_ip):
             logger.warning(f"Blocked banned IP (Auto-Ban): {client_ip}")
-            return Response("Your IP is temporarily banned due to excessive requests.", status_code=403)
-            
-        # 5. TODO: CN IP Check
+            _DENIED_BANNED.inc()
+            return 403, "Your IP is temporarily banned due to excessive requests.", []
+
+        # 4. TODO: CN IP Check
         # if not is_cn_ip(client_ip):
-        #     return Response("Access Denied: Region not allowed.", status_code=403)
+        #     return 403, "Access Denied: Region not allowed.", []
 
-        # 6. 内存流速限制 (Sliding Window)
-        now = time.time()
-        history = self.request_history[client_ip]
-        
-        # 移除窗口外的时间戳
-        while history and history[0] < now - self.window:
-            history.popleft()
-            
-        # 检查是否超限
-        if len(history) >= self.limit:
-            # 触发封禁：写入数据库，封禁10分钟
-            logger.warning(f"IP {client_ip} exceeded rate limit ({self.limit}/{self.window}s). Banning for 10 min.")
-            ban_ip(client_ip, duration_minutes=10)
-            
-            # 清理内存（既然已被持久化封禁，内存中无需再保留历史）
-            del self.request_history[client_ip]
-            
-            return Response("Rate limit exceeded. You are banned for 10 minutes.", status_code=403)
-        
-        # 记录本次请求
-        history.append(now)
-        
-        # 7. 放行
-        response = await call_next(request)
-        return response
+        # 5. 内存流速限制 (GCRA，按路由策略)
+        policy = self.limiter.policy_for(method, path)
+        retry_after = self.limiter.check(client_ip, policy)
+        if not retry_after:
+            return None
+        if not policy.ban_minutes:
+            DENIALS.labels("throttled", policy.name).inc()
+            return 429, "Rate limit exceeded. Please slow down.", [(b"retry-after", str(math.ceil(retry_after)).encode())]
+
+        # 触发封禁：写入内存封禁表并持久化
+        logger.warning(f"IP {client_ip} exceeded rate limit '{policy.name}' ({policy.limit}/{policy.window}s). "
+                       f"Banning for {policy.ban_minutes} min.")
+        auto_bans.ban(client_ip, duration_minutes=policy.ban_minutes)
+        DENIALS.labels("ban", policy.name).inc()
+
+        # 清理限流状态（既然已被持久化封禁，内存中无需再保留）
+        self.limiter.reset(client_ip)
+
+        return 403, f"Rate limit exceeded. You are banned for {policy.ban_minutes} minutes.", []
+
+
+# 只能由主进程处理的路由：大厅/隧道注册表、在线状态和事件流都只在主进程内存中
+PRIMARY_ONLY_PREFIXES = ("/api/lobby/", "/api/tunnel/", "/api/admin/")
+# 上述前缀中从进程也能处理的只读路由（使用主进程发布的大厅镜像，见 lobby_mirror）
+MIRRORED_READ_ROUTES = {("GET", "/api/lobby/rooms"), ("GET", "/api/lobby/rooms/search")}
+
+class WorkerRouteGuard:
+    """
+    多进程模式下从进程的路由保护（纯 ASGI 中间件）
+
+    反代应把 PRIMARY_ONLY_PREFIXES 转发到主进程（MIRRORED_READ_ROUTES 除外）；
+    误转发到从进程的请求返回 421，而不是读写一份不完整的进程内状态。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(PRIMARY_ONLY_PREFIXES) and \
+                (scope["method"], scope["path"]) not in MIRRORED_READ_ROUTES:
+            body = b"Misdirected Request: this route is served by the primary worker."
+            await send({
+                "type": "http.response.start",
+                "status": 421,
+                "headers": [(b"content-type", b"text/plain; charset=utf-8"),
+                            (b"content-length", str(len(body)).encode())]
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        await self.app(scope, receive, send)
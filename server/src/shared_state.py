@@ -0,0 +1,262 @@
+import hashlib
+import os
+import struct
+import tempfile
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+# 进程间锁使用 fcntl 记录锁，多进程模式只支持 POSIX 平台；单进程模式不需要
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    fcntl = None
+    HAS_FCNTL = False
+
+# 多进程模式下由启动器设置：共享内存段名称 / 本进程角色
+SHARED_STATE_ENV = "MCFRP_SHARED_STATE"
+WORKER_ROLE_ENV = "MCFRP_WORKER_ROLE"
+ROLE_PRIMARY = "primary"
+ROLE_SECONDARY = "secondary"
+
+# 表容量（条目数，必须是 BUCKET 的倍数）。每条 16 字节，默认共约 2.3MB
+RATE_SLOTS = 1 << 17
+BAN_SLOTS = 1 << 14
+# 大厅镜像区大小（主进程发布的公开房间快照，见 lobby_mirror），按需占用物理内存
+LOBBY_BYTES = 8 << 20
+# 每个哈希桶的条目数：同桶内线性查找，桶满时替换值最小（最早过期）的条目
+BUCKET = 4
+# 进程间锁的分段数（对锁文件的不同字节加 fcntl 记录锁）
+LOCK_STRIPES = 256
+
+_MAGIC = b"MCFRPSS2"
+# magic, 规则版本号, 限流表条目数, 封禁表条目数, 大厅镜像区字节数
+_HEADER = struct.Struct("<8sQIII")
+_HEADER_SIZE = 64
+_ENTRY = struct.Struct("<Qd")
+_BUCKET = struct.Struct("<" + "Qd" * BUCKET)
+_VERSION = struct.Struct("<Q")
+# 大厅镜像的发布序号和数据长度
+_LOBBY_META = struct.Struct("<QQ")
+_LOBBY_META_OFFSET = 32
+# 规则版本号 / 大厅镜像各自使用分段锁之后的一个字节
+_RULES_LOCK = LOCK_STRIPES
+_LOBBY_LOCK = LOCK_STRIPES + 1
+
+
+def _hash(text: str) -> int:
+    """跨进程稳定的 64 位键（内置 hash() 每个进程的种子不同），0 保留为空槽"""
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little") or 1
+
+
+class SharedState:
+    """
+    多个工作进程共享的安全状态（共享内存段）
+
+    - 限流表：键 (IP, 策略) -> GCRA 理论到达时间 TAT
+    - 封禁表：键 IP -> 解封时间
+    - 规则版本号：管理员修改黑白名单/敏感词后递增，各进程发现版本变化后重新加载
+    - 大厅镜像：主进程发布的公开房间快照（不透明的字节串），从进程据此处理大厅读请求
+
+    两张表都是固定容量的分桶哈希表，内存在创建时确定、不会增长；桶满时替换值最小的条目，
+    即最早到期的 TAT 或封禁，已到期的条目总是先被替换，效果与 LRU 淘汰相近。
+    读改写在按桶分段的 fcntl 记录锁内进行；封禁查询不加锁（最坏情况是恰好错过正在写入的封禁）。
+    时间使用调用方传入的值：限流用 time.monotonic()（Linux 上各进程共享同一时钟），封禁用 time.time()。
+    只支持 POSIX 平台（需要 fcntl），Windows 上只能以单进程模式运行。
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, lock_path: str, owner: bool = False):
+        self._shm = shm
+        self._buf = shm.buf
+        self.name = shm.name
+        self.lock_path = lock_path
+        self._owner = owner
+        magic, _, self.rate_slots, self.ban_slots, self.lobby_bytes = _HEADER.unpack_from(self._buf, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"Not a shared state segment: {shm.name}")
+        self._rate_offset = _HEADER_SIZE
+        self._ban_offset = _HEADER_SIZE + self.rate_slots * _ENTRY.size
+        self._lobby_offset = self._ban_offset + self.ban_slots * _ENTRY.size
+        self._lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    @classmethod
+    def create(cls, rate_slots: int = RATE_SLOTS, ban_slots: int = BAN_SLOTS,
+               lobby_bytes: int = LOBBY_BYTES) -> "SharedState":
+        """由启动器创建新的共享内存段"""
+        if not HAS_FCNTL:
+            raise RuntimeError("Multi-worker mode requires a POSIX platform (fcntl is unavailable)")
+        if rate_slots % BUCKET or ban_slots % BUCKET:
+            raise ValueError(f"slot counts must be multiples of {BUCKET}")
+        size = _HEADER_SIZE + (rate_slots + ban_slots) * _ENTRY.size + lobby_bytes
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        _HEADER.pack_into(shm.buf, 0, _MAGIC, 0, rate_slots, ban_slots, lobby_bytes)
+        return cls(shm, cls._lock_path(shm.name), owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedState":
+        """工作进程按名称连接已存在的共享内存段"""
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            # 共享内存段由启动器负责回收，工作进程退出时不应被资源跟踪器删除
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return cls(shm, cls._lock_path(name))
+
+    @classmethod
+    def from_env(cls) -> Optional["SharedState"]:
+        """多进程模式下连接启动器创建的共享状态，单进程模式返回 None"""
+        name = os.environ.get(SHARED_STATE_ENV)
+        return cls.attach(name) if name else None
+
+    @staticmethod
+    def _lock_path(name: str) -> str:
+        return os.path.join(tempfile.gettempdir(), f"{name.lstrip('/')}.lock")
+
+    def close(self):
+        self._buf = None
+        self._shm.close()
+        os.close(self._lock_fd)
+        if self._owner:
+            self._shm.unlink()
+            try:
+                os.remove(self.lock_path)
+            except OSError:
+                pass
+
+    def _lock(self, stripe: int):
+        fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, stripe)
+
+    def _unlock(self, stripe: int):
+        fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, stripe)
+
+    def _bucket(self, base: int, slots: int, key: int) -> int:
+        return base + (key % (slots // BUCKET)) * _BUCKET.size
+
+    @staticmethod
+    def _find(entries: tuple, key: int):
+        """在桶内查找键，返回 (下标, 值)；未找到时返回值最小的条目下标和 None"""
+        victim, smallest = 0, None
+        for i in range(BUCKET):
+            if entries[2 * i] == key:
+                return i, entries[2 * i + 1]
+            value = entries[2 * i + 1]
+            if smallest is None or value < smallest:
+                victim, smallest = i, value
+        return victim, None
+
+    # --- 限流 ---
+
+    def gcra(self, key: str, increment: float, window: float, now: float) -> float:
+        """
+        GCRA 检查并消耗额度（语义同 RateLimiter.check）
+        :param increment: 本次请求消耗的时间额度 (window / limit * cost)
+        :return: 0 表示放行；否则为建议的重试等待秒数
+        """
+        k = _hash(key)
+        offset = self._bucket(self._rate_offset, self.rate_slots, k)
+        stripe = (offset // _BUCKET.size) % LOCK_STRIPES
+        self._lock(stripe)
+        try:
+            i, tat = self._find(_BUCKET.unpack_from(self._buf, offset), k)
+            if tat is None or tat < now:
+                tat = now
+            new_tat = tat + increment
+            allow_at = new_tat - window
+            if allow_at > now:
+                return allow_at - now
+            _ENTRY.pack_into(self._buf, offset + i * _ENTRY.size, k, new_tat)
+            return 0.0
+        finally:
+            self._unlock(stripe)
+
+    def forget(self, key: str):
+        """清除某个限流键"""
+        k = _hash(key)
+        offset = self._bucket(self._rate_offset, self.rate_slots, k)
+        stripe = (offset // _BUCKET.size) % LOCK_STRIPES
+        self._lock(stripe)
+        try:
+            i, tat = self._find(_BUCKET.unpack_from(self._buf, offset), k)
+            if tat is not None:
+                _ENTRY.pack_into(self._buf, offset + i * _ENTRY.size, 0, 0.0)
+        finally:
+            self._unlock(stripe)
+
+    # --- 封禁 ---
+
+    def ban(self, ip: str, banned_until: float):
+        k = _hash(ip)
+        offset = self._bucket(self._ban_offset, self.ban_slots, k)
+        stripe = (offset // _BUCKET.size) % LOCK_STRIPES
+        self._lock(stripe)
+        try:
+            i, current = self._find(_BUCKET.unpack_from(self._buf, offset), k)
+            if current is None or current < banned_until:
+                _ENTRY.pack_into(self._buf, offset + i * _ENTRY.size, k, banned_until)
+        finally:
+            self._unlock(stripe)
+
+    def banned_until(self, ip: str) -> float:
+        """IP 的解封时间，没有记录时返回 0"""
+        k = _hash(ip)
+        _, value = self._find(_BUCKET.unpack_from(self._buf, self._bucket(self._ban_offset, self.ban_slots, k)), k)
+        return value or 0.0
+
+    # --- 规则版本 ---
+
+    @property
+    def rules_version(self) -> int:
+        return _VERSION.unpack_from(self._buf, 8)[0]
+
+    def bump_rules_version(self) -> int:
+        """通知所有进程规则已变化，返回新版本号"""
+        self._lock(_RULES_LOCK)
+        try:
+            version = self.rules_version + 1
+            _VERSION.pack_into(self._buf, 8, version)
+            return version
+        finally:
+            self._unlock(_RULES_LOCK)
+
+    # --- 大厅镜像 ---
+
+    @property
+    def lobby_seq(self) -> int:
+        """大厅镜像的发布序号，0 表示尚未发布（不加锁，只用于判断是否需要重新读取）"""
+        return _LOBBY_META.unpack_from(self._buf, _LOBBY_META_OFFSET)[0]
+
+    def publish_lobby(self, payload: bytes) -> int:
+        """
+        发布新的大厅镜像（只由主进程调用）
+        :return: 新的发布序号；payload 超过镜像区大小时返回 0，已发布的镜像保持不变
+        """
+        if len(payload) > self.lobby_bytes:
+            return 0
+        self._lock(_LOBBY_LOCK)
+        try:
+            self._buf[self._lobby_offset:self._lobby_offset + len(payload)] = payload
+            seq = self.lobby_seq + 1
+            _LOBBY_META.pack_into(self._buf, _LOBBY_META_OFFSET, seq, len(payload))
+            return seq
+        finally:
+            self._unlock(_LOBBY_LOCK)
+
+    def read_lobby(self) -> Tuple[int, bytes]:
+        """读取当前的大厅镜像，返回 (发布序号, payload)"""
+        self._lock(_LOBBY_LOCK)
+        try:
+            seq, length = _LOBBY_META.unpack_from(self._buf, _LOBBY_META_OFFSET)
+            return seq, bytes(self._buf[self._lobby_offset:self._lobby_offset + length])
+        finally:
+            self._unlock(_LOBBY_LOCK)
+
+
+def worker_role() -> str:
+    """本进程的角色；单进程模式视为主进程"""
+    return os.environ.get(WORKER_ROLE_ENV, ROLE_PRIMARY)
+
+
+# 全局实例（单进程模式为 None）
+shared_state = SharedState.from_env()
@@ -0,0 +1,75 @@
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+
+class TimerWheel:
+    """
+    哈希时间轮：为大量会被频繁续期的 key 管理过期时间
+
+    - schedule()/cancel() 都是 O(1)（心跳续期只是从一个槽移到另一个槽）
+    - advance(now) 只扫描自上次推进以来经过的槽，返回已到期的 key
+    - 过期精度为一个 tick：key 在其截止时间所在 tick 结束后被返回
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 128, now: Optional[float] = None):
+        self.tick = tick
+        self._slots: List[Dict[Hashable, float]] = [{} for _ in range(slots)]
+        # key -> 所在槽下标
+        self._index: Dict[Hashable, int] = {}
+        # 已处理完的最后一个 tick
+        self._last_tick = self._tick_of(time.time() if now is None else now) - 1
+
+    def _tick_of(self, t: float) -> int:
+        return int(t // self.tick)
+
+    def schedule(self, key: Hashable, deadline: float):
+        """设置（或重设）key 的截止时间"""
+        old = self._index.get(key)
+        if old is not None:
+            self._slots[old].pop(key, None)
+        # 截止时间落在已处理的 tick 内时，放到下一个待处理的 tick
+        tick = max(self._tick_of(deadline), self._last_tick + 1)
+        slot = tick % len(self._slots)
+        self._slots[slot][key] = deadline
+        self._index[key] = slot
+
+    def cancel(self, key: Hashable) -> bool:
+        slot = self._index.pop(key, None)
+        if slot is None:
+            return False
+        self._slots[slot].pop(key, None)
+        return True
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        slot = self._index.get(key)
+        return None if slot is None else self._slots[slot].get(key)
+
+    def advance(self, now: Optional[float] = None) -> List[Tuple[Hashable, float]]:
+        """推进到 now，返回所有已到期的 (key, deadline)"""
+        if now is None:
+            now = time.time()
+        # 只处理完整经过的 tick，当前 tick 内的截止时间留到下一次
+        end_tick = self._tick_of(now) - 1
+        if end_tick <= self._last_tick:
+            return []
+
+        expired = []
+        nslots = len(self._slots)
+        start_tick = max(self._last_tick + 1, end_tick - nslots + 1)
+        for tick in range(start_tick, end_tick + 1):
+            slot = self._slots[tick % nslots]
+            if not slot:
+                continue
+            for key, deadline in list(slot.items()):
+                if self._tick_of(deadline) <= end_tick:
+                    del slot[key]
+                    del self._index[key]
+                    expired.append((key, deadline))
+        self._last_tick = end_tick
+        return expired
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
@@ -1,24 +1,34 @@
 from fastapi import Request
 import ipaddress
-from typing import List, Union
+from typing import List, Optional, Union
+from .ip_matcher import IPRuleMatcher
 
 def get_effective_ip(request: Request) -> str:
     """
     获取客户端真实IP，兼容 Nginx 反代 (X-Forwarded-For, X-Real-IP)。
     """
-    # 优先检查 X-Forwarded-For
-    x_forwarded_for = request.headers.get("X-Forwarded-For")
-    if x_forwarded_for:
-        # 取第一个IP
-        return x_forwarded_for.split(",")[0].strip()
-    
-    # 其次检查 X-Real-IP
-    x_real_ip = request.headers.get("X-Real-IP")
+    return get_scope_ip(request.scope)
+
+def get_scope_ip(scope: dict) -> str:
+    """
+    直接从 ASGI scope 获取客户端真实IP（供纯 ASGI 中间件使用，无需构造 Request）。
+    规则同 get_effective_ip：X-Forwarded-For 第一个IP > X-Real-IP > 直连IP。
+    """
+    x_real_ip = None
+    for name, value in scope.get("headers", ()):
+        # ASGI 规定请求头名为小写字节串
+        if name == b"x-forwarded-for":
+            if value:
+                # 取第一个IP
+                return value.decode("latin-1").split(",")[0].strip()
+        elif name == b"x-real-ip" and x_real_ip is None and value:
+            x_real_ip = value.decode("latin-1")
     if x_real_ip:
         return x_real_ip
-        
+
     # 最后使用直连IP
-    return request.client.host or "127.0.0.1"
+    client = scope.get("client")
+    return (client[0] if client else None) or "127.0.0.1"
 
 def mask_ip(ip: str) -> str:
     """
@@ -33,6 +43,24 @@ def mask_ip(ip: str) -> str:
     # IPv6 或异常格式
     return ip[:len(ip)//2] + "***"
 
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    按弱比较规则判断 If-None-Match 是否命中当前 ETag。
+    支持 "*" 和逗号分隔的多个校验器，忽略 W/ 前缀。
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    target = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == target:
+            return True
+    return False
+
 def parse_ip_rule(rule_str: str) -> List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]:
     """
     解析 IP 规则字符串，支持 CIDR、范围(-)、列表(,)。
@@ -70,14 +98,6 @@ def is_ip_matched(ip_str: str, rules: List[str]) -> bool:
     :param rules: 规则字符串列表 (e.g. ["192.168.1.0/24", "10.0.0.1-10.0.0.5"])
     :return: True if matched
     """
-    try:
-        ip = ipaddress.ip_address(ip_str)
-        for rule in rules:
-            networks = parse_ip_rule(rule)
-            for net in networks:
-                if ip in net:
-                    return True
-    except ValueError:
-        return False
-    return False
+    # 一次性调用时临时编译；请求路径应复用已编译的 IPRuleMatcher
+    return IPRuleMatcher(rules).matches(ip_str)
 
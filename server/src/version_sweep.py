@@ -0,0 +1,241 @@
+import asyncio
+import heapq
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from .logger import logger
+from .minecraft_pinger import robust_get_server_status
+
+
+class VersionSweeper:
+    """
+    并发版本探测扫描器
+
+    一轮扫描中所有房间并发探测，但受两级限制：
+    - 全局并发上限 (concurrency)
+    - 每个 server_addr (FRP 节点) 的并发上限与最小探测间隔，避免同一节点被瞬间打满
+
+    统计信息（扫描耗时、成功率、排队数）通过 stats() 导出。
+    """
+
+    def __init__(self, on_result: Callable[[object, Optional[dict]], Awaitable[None]],
+                 concurrency: int = 32, per_host_concurrency: int = 4,
+                 per_host_interval: float = 0.1, probe=robust_get_server_status):
+        """
+        :param on_result: 每个房间探测完成后的回调 (room, status)，失败时 status 为 None
+        :param concurrency: 全局同时进行的探测数上限
+        :param per_host_concurrency: 同一 server_addr 同时进行的探测数上限
+        :param per_host_interval: 同一 server_addr 相邻两次探测开始的最小间隔（秒）
+        :param probe: 探测函数 (host, port) -> status，默认走 probe_cache 的稳健探测
+        """
+        self.on_result = on_result
+        self.concurrency = concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_interval = per_host_interval
+        self.probe = probe
+
+        self._global = None
+        self._host_slots = {}
+        self._host_next_start = defaultdict(float)
+
+        self.sweeps = 0
+        self.probes_total = 0
+        self.probes_ok = 0
+        self.queue_depth = 0
+        self.in_flight = 0
+        self.last_sweep_rooms = 0
+        self.last_sweep_duration = 0.0
+        self.last_sweep_success_rate = 0.0
+        self.last_sweep_finished_at = 0.0
+
+    async def sweep(self, rooms: Iterable) -> dict:
+        """探测一轮，返回本轮统计"""
+        rooms = list(rooms)
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.concurrency)
+
+        start = time.monotonic()
+        self.queue_depth = len(rooms)
+        results = await asyncio.gather(*(self._probe_room(room) for room in rooms))
+        duration = time.monotonic() - start
+
+        ok = sum(1 for r in results if r)
+        self.sweeps += 1
+        self.last_sweep_rooms = len(rooms)
+        self.last_sweep_duration = duration
+        self.last_sweep_success_rate = ok / len(rooms) if rooms else 1.0
+        self.last_sweep_finished_at = time.time()
+        # 只保留本轮出现过的节点的限流状态
+        hosts = {room.server_addr for room in rooms}
+        self._host_slots = {h: s for h, s in self._host_slots.items() if h in hosts}
+        for host in list(self._host_next_start):
+            if host not in hosts:
+                del self._host_next_start[host]
+        return {"rooms": len(rooms), "ok": ok, "duration": duration}
+
+    async def _probe_room(self, room) -> bool:
+        host = room.server_addr
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.per_host_concurrency)
+
+        async with slot:
+            # 同一节点按最小间隔错开探测开始时间
+            now = time.monotonic()
+            start_at = max(now, self._host_next_start[host])
+            self._host_next_start[host] = start_at + self.per_host_interval
+            if start_at > now:
+                await asyncio.sleep(start_at - now)
+
+            async with self._global:
+                self.queue_depth -= 1
+                self.in_flight += 1
+                try:
+                    status = await self.probe(host, room.remote_port)
+                except Exception:
+                    status = None
+                finally:
+                    self.in_flight -= 1
+
+        self.probes_total += 1
+        if status:
+            self.probes_ok += 1
+        try:
+            await self.on_result(room, status)
+        except Exception as e:
+            # 单个房间处理失败不影响其他房间
+            logger.error(f"Version sweep handler failed for {room.full_room_code}: {e}")
+        return bool(status)
+
+    def stats(self) -> dict:
+        return {
+            "sweeps": self.sweeps,
+            "probes_total": self.probes_total,
+            "probes_ok": self.probes_ok,
+            "success_rate": self.probes_ok / self.probes_total if self.probes_total else 0.0,
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "last_sweep_rooms": self.last_sweep_rooms,
+            "last_sweep_duration": round(self.last_sweep_duration, 3),
+            "last_sweep_success_rate": self.last_sweep_success_rate,
+            "last_sweep_finished_at": self.last_sweep_finished_at,
+        }
+
+
+# 新房间/结果有变化的房间的探测间隔，以及结果不变时退避的上限（秒）
+PROBE_MIN_INTERVAL = 30.0
+PROBE_MAX_INTERVAL = 600.0
+
+
+def status_digest(status: Optional[dict]) -> int:
+    """探测结果中会变化的内容（版本、MOTD、人数）的摘要；探测失败为 0"""
+    if not status:
+        return 0
+    return hash((status.get("version"), status.get("description"),
+                 status.get("players_online"), status.get("players_max"))) or 1
+
+
+class ProbeScheduler:
+    """
+    自适应探测调度：把探测花在状态正在变化的房间上
+
+    - 新出现的房间立即到期
+    - 探测结果（版本、MOTD、人数或成败）与上次不同时，间隔重置为 min_interval
+    - 结果不变时间隔乘以 factor，直到 max_interval
+    到期时间保存在最小堆中（过时的堆条目在弹出时跳过），每轮只取出已到期的房间交给 VersionSweeper。
+    """
+
+    def __init__(self, min_interval: float = PROBE_MIN_INTERVAL, max_interval: float = PROBE_MAX_INTERVAL,
+                 factor: float = 2.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        # full_room_code -> [房间, 到期时间, 当前间隔, 上次结果摘要 (None 表示还没有结果)]
+        self._rooms: Dict[str, list] = {}
+        self._heap: List[Tuple[float, str]] = []
+
+        self.probes = 0
+        self.changed = 0
+        self.unchanged = 0
+
+    def __len__(self):
+        return len(self._rooms)
+
+    def sync(self, rooms: Iterable, now: Optional[float] = None):
+        """与当前房间集合同步：新房间立即到期，已消失的房间不再调度"""
+        now = time.monotonic() if now is None else now
+        current = {}
+        for room in rooms:
+            current[room.full_room_code] = room
+            state = self._rooms.get(room.full_room_code)
+            if state is None:
+                self._rooms[room.full_room_code] = [room, now, self.min_interval, None]
+                heapq.heappush(self._heap, (now, room.full_room_code))
+            else:
+                # 房间对象可能被心跳替换，使用最新的
+                state[0] = room
+        for code in [code for code in self._rooms if code not in current]:
+            del self._rooms[code]
+        # 过时条目太多时重建堆
+        if len(self._heap) > 2 * len(self._rooms) + 64:
+            self._heap = [(state[1], code) for code, state in self._rooms.items()]
+            heapq.heapify(self._heap)
+
+    def due(self, now: Optional[float] = None, limit: Optional[int] = None) -> list:
+        """
+        取出已到期的房间（按到期时间先后）
+        取出的房间先按当前间隔临时排到下一次，observe() 收到结果后再调整
+        """
+        now = time.monotonic() if now is None else now
+        rooms = []
+        while self._heap and self._heap[0][0] <= now and (limit is None or len(rooms) < limit):
+            due_at, code = heapq.heappop(self._heap)
+            state = self._rooms.get(code)
+            if state is None or state[1] != due_at:
+                continue
+            state[1] = now + state[2]
+            heapq.heappush(self._heap, (state[1], code))
+            rooms.append(state[0])
+        return rooms
+
+    def observe(self, full_room_code: str, status: Optional[dict], now: Optional[float] = None) -> bool:
+        """记录一次探测结果，返回结果是否与上次不同"""
+        state = self._rooms.get(full_room_code)
+        if state is None:
+            return False
+        now = time.monotonic() if now is None else now
+        digest = status_digest(status)
+        changed = state[3] is None or state[3] != digest
+        state[2] = self.min_interval if changed else min(state[2] * self.factor, self.max_interval)
+        state[3] = digest
+        state[1] = now + state[2]
+        heapq.heappush(self._heap, (state[1], full_room_code))
+
+        self.probes += 1
+        if changed:
+            self.changed += 1
+        else:
+            self.unchanged += 1
+        return changed
+
+    def next_due(self) -> Optional[float]:
+        """最早的到期时间，没有房间时返回 None"""
+        while self._heap:
+            due_at, code = self._heap[0]
+            state = self._rooms.get(code)
+            if state is not None and state[1] == due_at:
+                return due_at
+            heapq.heappop(self._heap)
+        return None
+
+    def stats(self) -> dict:
+        intervals = [state[2] for state in self._rooms.values()]
+        return {
+            "rooms": len(self._rooms),
+            "probes": self.probes,
+            "changed": self.changed,
+            "unchanged": self.unchanged,
+            "min_interval_rooms": sum(1 for i in intervals if i <= self.min_interval),
+            "max_interval_rooms": sum(1 for i in intervals if i >= self.max_interval),
+            "avg_interval": round(sum(intervals) / len(intervals), 1) if intervals else 0.0,
+        }
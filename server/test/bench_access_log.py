@@ -0,0 +1,83 @@
+"""
+基准测试：访问日志写入方式对比
+
+- sync:  旧实现，每个请求在事件循环里 SELECT 去重 + INSERT
+- write-behind: AccessLogWriter.record() 入队，后台线程批量事务写入
+
+模拟请求流中 (ip, action) 有一定重复率（心跳/大厅刷新），
+报告请求路径每秒可处理的记录数，以及后台写入器的落库吞吐。
+
+运行: python test/bench_access_log.py [请求数]
+"""
+import os
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SERVER_DIR)
+os.chdir(SERVER_DIR)
+
+from src import database
+from src.access_log import AccessLogWriter
+
+ACTIONS = ("POST /api/lobby/heartbeat", "GET /api/lobby/rooms", "POST /api/lobby/rooms",
+           "GET /api/lobby/online", "POST /api/tunnel/validate")
+
+
+def _requests(n, clients=2000):
+    return [(f"10.{i % clients // 65536}.{i % clients // 256 % 256}.{i % 256}", ACTIONS[i % len(ACTIONS)])
+            for i in range(n)]
+
+
+def _sync_log_access(client_ip, action):
+    """旧实现: 每次调用 SELECT + 可能的 INSERT"""
+    conn = database.get_db_connection()
+    with conn:
+        now = time.time()
+        c = conn.execute("SELECT id FROM access_logs WHERE client_ip = ? AND action = ? AND timestamp > ?",
+                         (client_ip, action, now - 300))
+        if not c.fetchone():
+            conn.execute("INSERT INTO access_logs (client_ip, timestamp, action) VALUES (?, ?, ?)",
+                         (client_ip, now, action))
+
+
+def run_benchmark(n=20000):
+    reqs = _requests(n)
+
+    database.set_db_path(os.path.join(tempfile.mkdtemp(), "sync.db"))
+    database.init_db()
+    # 旧实现的单表
+    with database.get_db_connection() as conn:
+        conn.execute("CREATE TABLE access_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, client_ip TEXT, timestamp REAL, action TEXT)")
+        conn.execute("CREATE INDEX idx_access_logs_ip ON access_logs (client_ip)")
+        conn.execute("CREATE INDEX idx_access_logs_ts ON access_logs (timestamp)")
+    start = time.perf_counter()
+    for ip, action in reqs:
+        _sync_log_access(ip, action)
+    sync_rate = n / (time.perf_counter() - start)
+
+    database.set_db_path(os.path.join(tempfile.mkdtemp(), "wb.db"))
+    database.init_db()
+    writer = AccessLogWriter()
+    writer.start()
+    start = time.perf_counter()
+    for ip, action in reqs:
+        writer.record(ip, action)
+    record_rate = n / (time.perf_counter() - start)
+    writer.stop()
+    drain = time.perf_counter() - start
+    rows = len(database.get_access_logs(limit=n))
+    database.close_db()
+
+    print("=" * 60)
+    print(f"访问日志基准 ({n} 个请求, {rows} 行去重后落库)")
+    print("=" * 60)
+    print(f"sync 请求路径:          {sync_rate:>12,.0f} req/s")
+    print(f"write-behind 请求路径:  {record_rate:>12,.0f} req/s ({record_rate / sync_rate:.0f}x)")
+    print(f"write-behind 全部落库耗时: {drain * 1000:.1f} ms")
+    return sync_rate, record_rate
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
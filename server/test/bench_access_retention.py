@@ -0,0 +1,83 @@
+"""
+基准测试：访问日志的长期磁盘占用和查询延迟
+
+模拟 D 天的生产流量（每天 N 条去重后的日志，CLIENTS 个客户端轮流访问常见路由），
+每天结束时执行一次保留期清理，记录数据库文件大小和管理后台查询的耗时：
+- access_logs: 最近 100 条原始日志
+- access_stats: 最近 24 小时的汇总统计（按小时总数 / Top IP / Top 路由）
+
+保留期内两者应该随天数持平，而不是线性增长。
+
+运行: python test/bench_access_retention.py [天数] [每天日志条数]
+"""
+import os
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SERVER_DIR)
+os.chdir(SERVER_DIR)
+
+from src import database
+from src.access_log import AccessLogWriter, ACCESS_LOG_RETENTION_DAYS, ACCESS_ROLLUP_RETENTION_DAYS
+
+ACTIONS = ("POST /api/lobby/heartbeat", "GET /api/lobby/rooms", "POST /api/lobby/rooms",
+           "GET /api/lobby/online", "POST /api/tunnel/validate")
+CLIENTS = 20000
+
+
+def _file_size(path):
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def _timed(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run_benchmark(days=60, per_day=100000):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    database.set_db_path(path)
+    database.init_db()
+    # 不去重，每条记录都落库，便于控制每天的行数
+    writer = AccessLogWriter(dedupe_window=0, batch_size=10 ** 9)
+    start_day = time.mktime(time.strptime("2026-01-01", "%Y-%m-%d"))
+
+    rows = []
+    for day in range(days):
+        base = start_day + day * 86400
+        step = 86400 / per_day
+        for i in range(per_day):
+            client = (day * per_day + i) * 7919 % CLIENTS
+            writer.record(f"10.{client // 65536}.{client // 256 % 256}.{client % 256}",
+                          ACTIONS[i % len(ACTIONS)], now=base + i * step)
+            if i % 5000 == 4999:
+                writer.flush()
+        writer.flush()
+        now = base + 86399
+        writer.prune(now)
+        database.get_db_connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        since_hour = int(now) // 3600 * 3600 - 23 * 3600
+        logs_ms = _timed(lambda: database.get_access_logs(100))
+        stats_ms = _timed(lambda: database.get_access_stats(since_hour))
+        rows.append((day + 1, _file_size(path), logs_ms, stats_ms))
+    database.close_db()
+
+    print("=" * 60)
+    print(f"访问日志长期运行 ({days} 天, 每天 {per_day} 条, 原始日志保留 {ACCESS_LOG_RETENTION_DAYS} 天, "
+          f"汇总保留 {ACCESS_ROLLUP_RETENTION_DAYS} 天)")
+    print("=" * 60)
+    for day, size, logs_ms, stats_ms in rows:
+        if day % 5 == 0 or day == 1:
+            print(f"第 {day:>3} 天: 数据库 {size / 1024 / 1024:>7.1f} MB   "
+                  f"access_logs {logs_ms:>6.2f} ms   access_stats {stats_ms:>6.2f} ms")
+    return rows
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 60,
+                  int(sys.argv[2]) if len(sys.argv) > 2 else 100000)
@@ -0,0 +1,90 @@
+"""
+基准测试：连接池 vs 每次调用新建连接
+
+对比两种模式下典型操作（点查、心跳写入）的 ops/sec:
+- per-call: sqlite3.connect + PRAGMA journal_mode=WAL + close（旧实现）
+- pooled:   按线程复用的长连接 + 预编译语句缓存（ConnectionPool）
+
+运行: python test/bench_db_pool.py [操作次数]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SERVER_DIR)
+os.chdir(SERVER_DIR)
+
+from src.db_pool import ConnectionPool
+
+
+def _prepare(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("CREATE TABLE IF NOT EXISTS online_users (client_ip TEXT PRIMARY KEY, last_heartbeat REAL)")
+    conn.executemany("INSERT OR REPLACE INTO online_users VALUES (?, ?)",
+                     ((f"10.0.{i // 256}.{i % 256}", time.time()) for i in range(5000)))
+    conn.commit()
+    conn.close()
+
+
+def _per_call_read(path, ip):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    try:
+        return conn.execute("SELECT last_heartbeat FROM online_users WHERE client_ip = ?", (ip,)).fetchone()
+    finally:
+        conn.close()
+
+
+def _per_call_write(path, ip):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    try:
+        conn.execute("INSERT OR REPLACE INTO online_users VALUES (?, ?)", (ip, time.time()))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _pooled_read(pool, ip):
+    return pool.connection().execute("SELECT last_heartbeat FROM online_users WHERE client_ip = ?", (ip,)).fetchone()
+
+
+def _pooled_write(pool, ip):
+    conn = pool.connection()
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO online_users VALUES (?, ?)", (ip, time.time()))
+
+
+def _measure(fn, arg, n):
+    start = time.perf_counter()
+    for i in range(n):
+        fn(arg, f"10.0.{(i % 5000) // 256}.{i % 256}")
+    return n / (time.perf_counter() - start)
+
+
+def run_benchmark(n=5000):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    _prepare(path)
+    pool = ConnectionPool(path)
+
+    results = {
+        "read": (_measure(_per_call_read, path, n), _measure(_pooled_read, pool, n)),
+        "write": (_measure(_per_call_write, path, n), _measure(_pooled_write, pool, n)),
+    }
+    pool.close_all()
+
+    print("=" * 60)
+    print(f"SQLite 连接池基准 ({n} ops)")
+    print("=" * 60)
+    print(f"{'操作':<8}{'per-call ops/s':>18}{'pooled ops/s':>18}{'提升':>10}")
+    for name, (old, new) in results.items():
+        print(f"{name:<8}{old:>18,.0f}{new:>18,.0f}{new / old:>9.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,167 @@
+"""
+负载测试：单进程承载大量空闲的大厅事件订阅者 (GET /api/lobby/events)
+
+在子进程中启动真实的 uvicorn 服务，本进程建立 N 条 SSE 长连接，然后:
+- 记录全部连接建立后服务进程的 RSS（以及平均每连接内存）
+- 删除预置房间 R 次，测量 remove 事件送达全部订阅者的延迟
+
+运行: python test/bench_lobby_events.py [订阅者数] [事件数]
+（默认 10000 个订阅者；需要 ulimit -n 大于订阅者数）
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SERVER_DIR)
+os.chdir(SERVER_DIR)
+
+_SERVER_SCRIPT = """
+import sys, uvicorn
+sys.path.insert(0, {server_dir!r})
+from src import database
+from src.main import app
+from src.models import RoomCreate
+from src.registry import room_registry
+
+database.set_db_path({db_path!r})
+database.init_db()
+# 压测连接都来自本机，加入白名单避免触发限流封禁
+database.add_whitelist_rule("127.0.0.1", "bench")
+room_registry.timeout = 3600
+for i in range({rooms}):
+    room_registry.upsert(RoomCreate(remote_port=20000 + i, node_id=1, room_name=f"房间{{i}}",
+                                    host_player="Steve", server_addr="frp.example.com",
+                                    full_room_code=f"{{20000 + i}}_1"), "10.0.0.1")
+uvicorn.run(app, host="127.0.0.1", port={port}, log_level="warning", backlog=16384)
+"""
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_kb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+async def _wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET / HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            await reader.read()
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+class _Subscriber:
+    """极简 SSE 客户端：只统计收到的 remove 事件"""
+
+    def __init__(self, port):
+        self.port = port
+        self.removed = 0
+        self.ready = asyncio.Event()
+        self.changed = asyncio.Event()
+
+    async def run(self):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(b"GET /api/lobby/events HTTP/1.1\r\nHost: bench\r\nAccept: text/event-stream\r\n\r\n")
+        await writer.drain()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                if line.startswith(b"event: snapshot"):
+                    self.ready.set()
+                elif line.startswith(b"event: remove"):
+                    self.removed += 1
+                    self.changed.set()
+        finally:
+            writer.close()
+
+
+async def _delete_room(port, code_port):
+    body = json.dumps({"remote_port": code_port, "node_id": 1}).encode()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"DELETE /api/lobby/rooms HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n"
+                 b"Content-Type: application/json\r\nContent-Length: " + str(len(body)).encode() +
+                 b"\r\n\r\n" + body)
+    await writer.drain()
+    await reader.read()
+    writer.close()
+
+
+async def _run(n, events):
+    port = _free_port()
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    script = _SERVER_SCRIPT.format(server_dir=SERVER_DIR, db_path=db_path, rooms=events, port=port)
+    proc = subprocess.Popen([sys.executable, "-c", script])
+    try:
+        await _wait_ready(port)
+        base_rss = _rss_kb(proc.pid)
+
+        subscribers = [_Subscriber(port) for _ in range(n)]
+        tasks = []
+        start = time.perf_counter()
+        for i in range(0, n, 500):
+            batch = subscribers[i:i + 500]
+            tasks += [asyncio.create_task(s.run()) for s in batch]
+            await asyncio.gather(*(s.ready.wait() for s in batch))
+        connect_time = time.perf_counter() - start
+        await asyncio.sleep(1)
+        rss = _rss_kb(proc.pid)
+
+        latencies = []
+        for i in range(events):
+            for s in subscribers:
+                s.changed.clear()
+            start = time.perf_counter()
+            await _delete_room(port, 20000 + i)
+            await asyncio.gather(*(s.changed.wait() for s in subscribers))
+            latencies.append(time.perf_counter() - start)
+        assert all(s.removed == events for s in subscribers)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    print("=" * 60)
+    print(f"大厅事件流负载测试 ({n} 个订阅者, {events} 个事件)")
+    print("=" * 60)
+    print(f"建立全部连接耗时: {connect_time:.1f}s")
+    print(f"服务进程 RSS: {base_rss / 1024:.1f} MB -> {rss / 1024:.1f} MB "
+          f"(约 {(rss - base_rss) / n:.1f} KB/订阅者)")
+    latencies.sort()
+    print(f"事件送达全部订阅者: 中位 {latencies[len(latencies) // 2] * 1000:.0f} ms, "
+          f"最大 {latencies[-1] * 1000:.0f} ms")
+    return {"connect_time": connect_time, "rss_kb": rss, "latencies": latencies}
+
+
+def run_benchmark(n=10000, events=5):
+    return asyncio.run(_run(n, events))
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+                  int(sys.argv[2]) if len(sys.argv) > 2 else 5)
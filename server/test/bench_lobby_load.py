@@ -0,0 +1,432 @@
+"""
+负载测试：大厅 API 在真实客户端行为组合下的吞吐、延迟和错误率
+
+在子进程中启动真实服务 (src.main:app，临时数据库)，在另一个子进程中启动 N 个假 Minecraft 服务器
+(Server List Ping)，然后用 C 个虚拟客户端模拟真实的请求组合：
+- 所有客户端：用户在线心跳每 10 秒，房间列表 (带 ETag) 每 5 秒，在线人数每 10 秒，搜索每 30 秒
+- 其中一部分是房主：房间心跳每 5 秒（房间指向假服务器，走真实的 SLP 探测），结束时删除房间
+- 其中一部分运行隧道：隧道校验每 15 秒（携带上次签发的租约）
+
+每个客户端有独立的 IP (X-Forwarded-For) 和一条 keep-alive 连接，同一客户端的请求串行发出。
+预热期之后的请求计入统计，按路由输出 JSON：请求数、吞吐、p50/p95/p99 延迟、状态码分布和错误率，
+便于保存下来在不同提交之间对比。
+
+压测客户端、假服务器和服务在同一台机器上争用 CPU，结果只适合同一台机器上的前后对比。
+
+运行: python test/bench_lobby_load.py [--clients 500] [--servers 100] [--duration 60] [--output result.json]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SERVER_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(SERVER_DIR)
+
+from fake_slp import FakeSLPFleet, make_status
+
+_SERVER_SCRIPT = """
+import sys, uvicorn
+sys.path.insert(0, {server_dir!r})
+from src import database
+from src.main import app
+
+database.set_db_path({db_path!r})
+uvicorn.run(app, host="127.0.0.1", port={port}, log_level="warning", backlog=16384)
+"""
+
+# 各类请求的间隔（秒），与客户端的实际行为一致
+ROOM_HEARTBEAT_INTERVAL = 5
+USER_HEARTBEAT_INTERVAL = 10
+TUNNEL_INTERVAL = 15
+ROOM_LIST_INTERVAL = 5
+ONLINE_INTERVAL = 10
+SEARCH_INTERVAL = 30
+
+SEARCH_TERMS = ("", "生存", "空岛", "1.20", "pvp")
+VERSIONS = ("1.20.1", "1.19.4", "1.18.2", "1.12.2")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _letters(i):
+    """房间名里不用数字，避免碰上敏感词规则中的数字串"""
+    return "".join(chr(ord("A") + int(d)) for d in str(i))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+# --- 假 Minecraft 服务器 ---
+
+def _fleet_process(n, ports, stop):
+    """子进程：启动 n 个假 SLP 服务器，把端口列表放入 ports 队列，直到 stop 被设置"""
+    def profile(i, rng):
+        return {"status": make_status(version=VERSIONS[i % len(VERSIONS)], motd=f"假服务器 {i}", online=i % 20)}
+
+    async def run():
+        async with FakeSLPFleet(n, profile) as fleet:
+            ports.put(fleet.ports)
+            while not stop.is_set():
+                await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+
+
+# --- HTTP 客户端 ---
+
+class _Connection:
+    """极简 HTTP/1.1 keep-alive 客户端"""
+
+    def __init__(self, port, ip):
+        self.port = port
+        self.ip = ip.encode()
+        self._reader = None
+        self._writer = None
+
+    async def request(self, method, path, body=None, headers=()):
+        reused = self._writer is not None
+        try:
+            return await self._request(method, path, body, headers)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # 服务端已关闭空闲的 keep-alive 连接（uvicorn 默认 5 秒）：与常见 HTTP 客户端一样重连重试一次
+            if not reused:
+                raise
+            return await self._request(method, path, body, headers)
+
+    async def _request(self, method, path, body, headers):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection("127.0.0.1", self.port)
+        lines = [f"{method} {path} HTTP/1.1".encode(), b"Host: bench", b"X-Forwarded-For: " + self.ip,
+                 b"Accept-Encoding: gzip"]
+        lines += [f"{name}: {value}".encode() for name, value in headers]
+        payload = b""
+        if body is not None:
+            payload = json.dumps(body).encode()
+            lines += [b"Content-Type: application/json", b"Content-Length: " + str(len(payload)).encode()]
+        try:
+            self._writer.write(b"\r\n".join(lines) + b"\r\n\r\n" + payload)
+            await self._writer.drain()
+            return await self._read_response()
+        except BaseException:
+            self.close()
+            raise
+
+    async def _read_response(self):
+        head = await self._reader.readuntil(b"\r\n\r\n")
+        status_line, *header_lines = head[:-4].decode("latin-1").split("\r\n")
+        status = int(status_line.split(" ", 2)[1])
+        headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding") == "chunked":
+            chunks = []
+            while True:
+                size = int((await self._reader.readuntil(b"\r\n"))[:-2].split(b";")[0], 16)
+                chunk = await self._reader.readexactly(size + 2)
+                if not size:
+                    break
+                chunks.append(chunk[:-2])
+            body = b"".join(chunks)
+        else:
+            body = await self._reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection") == "close":
+            self.close()
+        return status, headers, body
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+class _Stats:
+    """按路由记录预热期之后的请求"""
+
+    def __init__(self):
+        self.measure_from = float("inf")
+        self.routes = {}
+
+    def record(self, route, started, elapsed, status, failed):
+        if started < self.measure_from:
+            return
+        entry = self.routes.get(route)
+        if entry is None:
+            entry = self.routes[route] = {"latencies": [], "statuses": {}, "app_failures": 0}
+        entry["latencies"].append(elapsed)
+        entry["statuses"][status] = entry["statuses"].get(status, 0) + 1
+        entry["app_failures"] += failed
+
+    def report(self, seconds):
+        routes = {}
+        for route, entry in sorted(self.routes.items()):
+            latencies = sorted(entry["latencies"])
+            n = len(latencies)
+            errors = sum(count for status, count in entry["statuses"].items()
+                         if status == "error" or status >= 400)
+            routes[route] = {
+                "requests": n,
+                "throughput_rps": round(n / seconds, 2),
+                "latency_ms": {
+                    "mean": round(sum(latencies) / n * 1000, 3),
+                    "p50": round(_percentile(latencies, 50) * 1000, 3),
+                    "p95": round(_percentile(latencies, 95) * 1000, 3),
+                    "p99": round(_percentile(latencies, 99) * 1000, 3),
+                    "max": round(latencies[-1] * 1000, 3),
+                },
+                "statuses": {str(status): count for status, count in sorted(entry["statuses"].items(), key=str)},
+                "errors": errors,
+                "error_rate": round(errors / n, 6),
+                # HTTP 200 但业务返回 success=false（如探测失败、被判定多开）
+                "app_failures": entry["app_failures"],
+            }
+        total = sum(route["requests"] for route in routes.values())
+        errors = sum(route["errors"] for route in routes.values())
+        return routes, {"requests": total, "throughput_rps": round(total / seconds, 2), "errors": errors,
+                        "error_rate": round(errors / total, 6) if total else 0.0}
+
+
+def _percentile(sorted_values, pct):
+    """最近秩 (nearest-rank) 百分位"""
+    index = max(0, -(-len(sorted_values) * pct // 100) - 1)
+    return sorted_values[int(index)]
+
+
+class _VirtualClient:
+    """一个虚拟客户端：若干周期性活动共用一条连接，请求串行发出"""
+
+    def __init__(self, index, port, stats, rng, room=None, tunnel=None):
+        self.ip = f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"
+        self.conn = _Connection(port, self.ip)
+        self.stats = stats
+        self.rng = rng
+        self.room = room
+        self.tunnel = tunnel
+        self.lease = None
+        self.etag = None
+        self._lock = asyncio.Lock()
+
+    async def _call(self, route, method, path, body=None, headers=()):
+        async with self._lock:
+            started = time.monotonic()
+            try:
+                status, _, data = await self.conn.request(method, path, body, headers)
+            except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+                self.stats.record(route, started, time.monotonic() - started, "error", 0)
+                return None, None
+            elapsed = time.monotonic() - started
+        result = None
+        if status == 200 and data[:1] == b"{":
+            try:
+                result = json.loads(data)
+            except ValueError:
+                pass
+        failed = isinstance(result, dict) and result.get("success") is False
+        self.stats.record(route, started, elapsed, status, int(failed))
+        return status, result
+
+    async def room_heartbeat(self):
+        await self._call("POST /api/lobby/rooms", "POST", "/api/lobby/rooms", self.room)
+
+    async def remove_room(self):
+        await self._call("DELETE /api/lobby/rooms", "DELETE", "/api/lobby/rooms",
+                         {"remote_port": self.room["remote_port"], "node_id": self.room["node_id"]})
+
+    async def user_heartbeat(self):
+        await self._call("POST /api/lobby/heartbeat", "POST", "/api/lobby/heartbeat")
+
+    async def validate_tunnel(self):
+        body = dict(self.tunnel, lease=self.lease)
+        _, result = await self._call("POST /api/tunnel/validate", "POST", "/api/tunnel/validate", body)
+        if result:
+            self.lease = result.get("lease")
+
+    async def list_rooms(self):
+        headers = (("If-None-Match", self.etag),) if self.etag else ()
+        async with self._lock:
+            started = time.monotonic()
+            try:
+                status, response_headers, _ = await self.conn.request("GET", "/api/lobby/rooms", headers=headers)
+            except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+                self.stats.record("GET /api/lobby/rooms", started, time.monotonic() - started, "error", 0)
+                return
+            elapsed = time.monotonic() - started
+        self.etag = response_headers.get("etag", self.etag)
+        self.stats.record("GET /api/lobby/rooms", started, elapsed, status, 0)
+
+    async def online(self):
+        await self._call("GET /api/lobby/online", "GET", "/api/lobby/online")
+
+    async def search(self):
+        term = self.rng.choice(SEARCH_TERMS)
+        await self._call("GET /api/lobby/rooms/search", "GET", f"/api/lobby/rooms/search?q={quote(term)}&limit=20")
+
+    def activities(self):
+        plan = [(self.user_heartbeat, USER_HEARTBEAT_INTERVAL), (self.list_rooms, ROOM_LIST_INTERVAL),
+                (self.online, ONLINE_INTERVAL), (self.search, SEARCH_INTERVAL)]
+        if self.room:
+            plan.append((self.room_heartbeat, ROOM_HEARTBEAT_INTERVAL))
+        if self.tunnel:
+            plan.append((self.validate_tunnel, TUNNEL_INTERVAL))
+        return plan
+
+    async def run(self, deadline):
+        await asyncio.gather(*(self._every(action, interval, deadline) for action, interval in self.activities()))
+
+    async def _every(self, action, interval, deadline):
+        # 随机错开首次请求，避免所有客户端同时发出
+        next_at = time.monotonic() + self.rng.uniform(0, interval)
+        while True:
+            now = time.monotonic()
+            if next_at >= deadline:
+                # 下一次请求已超出统计窗口，等到窗口结束即退出
+                await asyncio.sleep(max(0.0, deadline - now))
+                return
+            if next_at > now:
+                await asyncio.sleep(next_at - now)
+            await action()
+            next_at += interval
+
+
+async def _wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET / HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            await reader.read()
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def _scrape_probes(port):
+    """从服务的 /metrics 读取 SLP 探测次数（按结果），本机直连无需管理员密钥"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET /metrics HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+    await writer.drain()
+    text = (await reader.read()).decode("utf-8", "replace")
+    writer.close()
+    probes = {}
+    for line in text.splitlines():
+        if line.startswith('mcfrp_probe_total{outcome="'):
+            labels, value = line.rsplit(" ", 1)
+            probes[labels.split('"')[1]] = int(float(value))
+    return probes
+
+
+async def _drive(port, fleet_ports, clients, host_ratio, tunnel_ratio, duration, warmup, seed):
+    rng = random.Random(seed)
+    stats = _Stats()
+    virtual = []
+    for i in range(clients):
+        room = tunnel = None
+        fake_port = fleet_ports[i % len(fleet_ports)]
+        if rng.random() < host_ratio:
+            # 房间数可能多于假服务器数：同一假服务器用不同的 node_id 区分房间
+            node_id = i // len(fleet_ports) + 1
+            room = {"remote_port": fake_port, "node_id": node_id, "room_name": f"压测房间 {_letters(i)}",
+                    "game_version": VERSIONS[i % len(VERSIONS)], "player_count": i % 20, "max_players": 20,
+                    "description": "生存 空岛 pvp", "is_public": True, "host_player": f"player{i}",
+                    "server_addr": "127.0.0.1", "full_room_code": f"{fake_port}_{node_id}"}
+        if rng.random() < tunnel_ratio:
+            tunnel = {"server_addr": "127.0.0.1", "remote_port": fake_port}
+        virtual.append(_VirtualClient(i, port, stats, random.Random(rng.random()), room, tunnel))
+
+    start = time.monotonic()
+    stats.measure_from = start + warmup
+    deadline = start + warmup + duration
+    await asyncio.gather(*(client.run(deadline) for client in virtual))
+    measured = time.monotonic() - stats.measure_from
+
+    # 房主退出时删除房间（DELETE 请求同样计入统计）
+    await asyncio.gather(*(client.remove_room() for client in virtual if client.room))
+    for client in virtual:
+        client.conn.close()
+    routes, total = stats.report(measured)
+    return {"routes": routes, "total": total, "measured_seconds": round(measured, 3),
+            "rooms": sum(1 for c in virtual if c.room), "tunnels": sum(1 for c in virtual if c.tunnel),
+            "server_probes": await _scrape_probes(port)}
+
+
+def run_benchmark(clients=500, servers=100, duration=60, warmup=10, host_ratio=0.3, tunnel_ratio=0.2, seed=1):
+    ctx = multiprocessing.get_context("spawn")
+    fleet_ports, stop = ctx.Queue(), ctx.Event()
+    fleet = ctx.Process(target=_fleet_process, args=(servers, fleet_ports, stop))
+    fleet.start()
+
+    port = _free_port()
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    proc = subprocess.Popen([sys.executable, "-c", _SERVER_SCRIPT.format(server_dir=SERVER_DIR, db_path=db_path,
+                                                                         port=port)],
+                            stdout=sys.stderr)
+    try:
+        ports = fleet_ports.get(timeout=60)
+
+        async def run():
+            await _wait_ready(port)
+            return await _drive(port, ports, clients, host_ratio, tunnel_ratio, duration, warmup, seed)
+
+        result = asyncio.run(run())
+    finally:
+        proc.terminate()
+        proc.wait()
+        stop.set()
+        fleet.join(timeout=10)
+        if fleet.is_alive():
+            fleet.terminate()
+
+    return {
+        "benchmark": "lobby_load",
+        "commit": _git_commit(),
+        "timestamp": int(time.time()),
+        "cpus": os.cpu_count(),
+        "config": {"clients": clients, "servers": servers, "duration": duration, "warmup": warmup,
+                   "host_ratio": host_ratio, "tunnel_ratio": tunnel_ratio, "seed": seed},
+        **result,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="大厅 API 负载测试")
+    parser.add_argument("--clients", type=int, default=500, help="虚拟客户端数")
+    parser.add_argument("--servers", type=int, default=100, help="假 Minecraft 服务器数")
+    parser.add_argument("--duration", type=float, default=60, help="统计时长（秒，不含预热）")
+    parser.add_argument("--warmup", type=float, default=10, help="预热时长（秒）")
+    parser.add_argument("--hosts", type=float, default=0.3, help="房主所占比例")
+    parser.add_argument("--tunnels", type=float, default=0.2, help="运行隧道的客户端比例")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="结果 JSON 文件路径（默认只输出到标准输出）")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.clients, args.servers, args.duration, args.warmup, args.hosts, args.tunnels,
+                           args.seed)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
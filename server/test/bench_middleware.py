@@ -0,0 +1,141 @@
+"""
+基准测试：限流中间件的请求开销
+
+- none:   不加中间件
+- legacy: 旧实现，BaseHTTPMiddleware.dispatch 中执行同样的检查
+- asgi:   纯 ASGI 中间件 RateLimitMiddleware
+
+直接以 ASGI 协议驱动 FastAPI 应用（不经过网络和 HTTP 解析），分别测量
+放行请求（小 JSON 响应）和被拒绝请求（黑名单 IP）的每秒请求数。
+测量期间关闭日志输出。
+
+运行: python test/bench_middleware.py [请求数]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SERVER_DIR)
+os.chdir(SERVER_DIR)
+
+from fastapi import FastAPI, Request, Response
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from src import database
+from src.access_log import access_logger
+from src.logger import logger
+from src.security import RateLimitMiddleware, reload_rules
+from src.utils import get_effective_ip
+
+CLIENTS = 5000
+CONCURRENCY = 100
+
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    """旧实现的结构：每个请求构造 Request，经 call_next 包装响应流"""
+
+    def __init__(self, app, **kwargs):
+        super().__init__(app)
+        self.checker = RateLimitMiddleware(None, **kwargs)
+
+    async def dispatch(self, request: Request, call_next):
+        denial = self.checker.check(get_effective_ip(request), request.method, request.url.path)
+        if denial is not None:
+            status, message, headers = denial
+            return Response(message, status_code=status, headers={k.decode(): v.decode() for k, v in headers})
+        return await call_next(request)
+
+
+def _build_app(middleware):
+    app = FastAPI()
+    if middleware is not None:
+        # 足够大的额度，放行测试不会触发限流
+        app.add_middleware(middleware, limit=10 ** 9, window=60, routes=())
+
+    @app.get("/api/lobby/online")
+    async def online():
+        return {"success": True, "online_count": 42}
+
+    return app
+
+
+def _scope(ip):
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/api/lobby/online", "raw_path": b"/api/lobby/online",
+        "root_path": "", "query_string": b"", "server": ("127.0.0.1", 8000), "client": (ip, 50000),
+        "headers": [(b"host", b"bench"), (b"accept", b"*/*"), (b"user-agent", b"MinecraftFRP")]
+    }
+
+
+async def _request(app, scope):
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # 请求体已读完，之后只有客户端断开时才会返回
+        await asyncio.Future()
+
+    status = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+async def _drive(app, n, ip_prefix):
+    scopes = [_scope(f"{ip_prefix}.{i // 256 % 256}.{i % 256}") for i in range(CLIENTS)]
+
+    async def worker(offset):
+        for i in range(offset, n, CONCURRENCY):
+            await _request(app, scopes[i % CLIENTS])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(k) for k in range(CONCURRENCY)))
+    return n / (time.perf_counter() - start)
+
+
+def run_benchmark(n=50000):
+    database.set_db_path(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    database.init_db()
+    database.add_blacklist_rule("10.66.0.0/16", "bench")
+    reload_rules()
+    access_logger.start()
+    # 拦截日志是同步写控制台/文件的，会掩盖中间件本身的差异
+    logger.disabled = True
+
+    apps = {"none": _build_app(None), "legacy": _build_app(LegacyRateLimitMiddleware),
+            "asgi": _build_app(RateLimitMiddleware)}
+    results = {}
+    try:
+        for name, app in apps.items():
+            asyncio.run(_drive(app, n // 10, "10.1"))  # 预热
+            allowed = asyncio.run(_drive(app, n, "10.1"))
+            denied = asyncio.run(_drive(app, n, "10.66")) if name != "none" else None
+            results[name] = (allowed, denied)
+    finally:
+        access_logger.stop()
+
+    print("=" * 60)
+    print(f"限流中间件开销 ({n} 个请求, 并发 {CONCURRENCY})")
+    print("=" * 60)
+    base = results["none"][0]
+    for name, (allowed, denied) in results.items():
+        line = f"{name:<8} 放行: {allowed:>9,.0f} req/s (基线的 {allowed / base:.0%})"
+        if denied is not None:
+            line += f"   拒绝: {denied:>9,.0f} req/s"
+        print(line)
+    print(f"放行吞吐提升: {results['asgi'][0] / results['legacy'][0]:.2f}x, "
+          f"拒绝吞吐提升: {results['asgi'][1] / results['legacy'][1]:.2f}x")
+    return results
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
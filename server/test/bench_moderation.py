@@ -0,0 +1,86 @@
+"""
+基准测试：敏感词检测 (逐规则子串扫描 vs Aho-Corasick)
+
+规则集: config/black-rules.txt + 随机生成的中英文词，共 10k 条
+文本:   常见风格的中英文 MOTD / 房间名（大部分不命中）
+
+运行: python test/bench_moderation.py [规则数]
+"""
+import os
+import random
+import sys
+import time
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SERVER_DIR)
+os.chdir(SERVER_DIR)
+
+from src.moderation import AhoCorasick, RULES_PATH
+
+MOTDS = [
+    "§a§l欢迎来到我的生存服务器 §e| §b1.20.1 §e| §d空岛 起床战争 小游戏",
+    "A Minecraft Server",
+    "§6§lHypixel-like Network §7[1.8-1.20] §c§lNEW: SkyWars & BedWars!",
+    "周末一起来联机，纯净生存，无插件，欢迎萌新~",
+    "Welcome to our survival world! Be nice, no griefing, have fun :)",
+    "§b粘液科技§r + §e机械动力 §7| 整合包 v2.3 | QQ群 123456789",
+    "Vanilla SMP - whitelist only - ask on discord",
+    "§c§l[公告] §r服务器今晚 20:00 维护，请提前下线",
+    "Steve的房间",
+    "RLCraft 2.9 hardcore, join at your own risk",
+]
+
+
+def _load_rules(total):
+    with open(RULES_PATH, encoding='utf-8') as f:
+        rules = [line.strip() for line in f if line.strip()]
+    rng = random.Random(0)
+    cjk = [chr(c) for c in range(0x4e00, 0x4e00 + 3000)]
+    while len(rules) < total:
+        if rng.random() < 0.5:
+            rules.append("".join(rng.choice(cjk) for _ in range(rng.randint(2, 5))))
+        else:
+            rules.append("".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 9))))
+    return rules[:total]
+
+
+def _naive_check(text, rules):
+    """旧实现：每次调用都对每条规则 lower() + 子串查找"""
+    text_lower = text.lower()
+    for rule in rules:
+        if rule.lower() in text_lower:
+            return rule
+    return None
+
+
+def run_benchmark(total_rules=10000, rounds=50):
+    rules = _load_rules(total_rules)
+
+    start = time.perf_counter()
+    ac = AhoCorasick(rules)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    n = rounds * len(MOTDS)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for motd in MOTDS:
+            _naive_check(motd, rules)
+    naive = n / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for motd in MOTDS:
+            ac.search_first(motd)
+    fast = n / (time.perf_counter() - start)
+
+    print("=" * 60)
+    print(f"敏感词检测基准 ({len(rules)} 条规则, {n} 次检查)")
+    print("=" * 60)
+    print(f"自动机构建耗时:      {build_ms:>10.1f} ms")
+    print(f"逐规则扫描:          {naive:>10,.0f} checks/s")
+    print(f"Aho-Corasick:        {fast:>10,.0f} checks/s ({fast / naive:.0f}x)")
+    return naive, fast
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
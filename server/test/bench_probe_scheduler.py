@@ -0,0 +1,90 @@
+"""
+基准测试：自适应探测调度与固定 30 秒一轮扫描的对比（模拟时钟，不发起真实探测）
+
+N 个房间中一小部分是"活跃"房间（平均每 ACTIVE_CHANGE 秒人数/MOTD 变化一次），
+其余房间很少变化（平均每 STABLE_CHANGE 秒一次）。按 5 秒一个调度周期模拟 H 小时，报告：
+- 探测次数（每小时）
+- 状态变化到被探测发现的延迟（中位数 / p95），分活跃房间和稳定房间
+
+运行: python test/bench_probe_scheduler.py [房间数] [模拟小时数]
+"""
+import os
+import random
+import sys
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SERVER_DIR)
+os.chdir(SERVER_DIR)
+
+from types import SimpleNamespace
+
+from src.version_sweep import ProbeScheduler
+
+TICK = 5
+ACTIVE_RATIO = 0.05
+ACTIVE_CHANGE = 120
+STABLE_CHANGE = 4 * 3600
+
+
+def _simulate(rooms, hours, adaptive, seed=1):
+    rng = random.Random(seed)
+    duration = int(hours * 3600)
+    objects = [SimpleNamespace(full_room_code=f"{20000 + i}_1") for i in range(rooms)]
+    active = [rng.random() < ACTIVE_RATIO for _ in range(rooms)]
+    # 每个房间的状态版本号，以及尚未被发现的第一次变化的时间
+    state = [0] * rooms
+    pending = [None] * rooms
+    next_change = [rng.expovariate(1 / (ACTIVE_CHANGE if a else STABLE_CHANGE)) for a in active]
+    delays = {True: [], False: []}
+    probes = 0
+
+    scheduler = ProbeScheduler()
+    scheduler.sync(objects, now=0)
+    index = {room.full_room_code: i for i, room in enumerate(objects)}
+
+    for now in range(0, duration, TICK):
+        for i in range(rooms):
+            while next_change[i] <= now:
+                state[i] += 1
+                if pending[i] is None:
+                    pending[i] = next_change[i]
+                next_change[i] += rng.expovariate(1 / (ACTIVE_CHANGE if active[i] else STABLE_CHANGE))
+
+        if adaptive:
+            due = [index[room.full_room_code] for room in scheduler.due(now=now)]
+        else:
+            due = range(rooms) if now % 30 == 0 else ()
+        for i in due:
+            probes += 1
+            if pending[i] is not None:
+                delays[active[i]].append(now - pending[i])
+                pending[i] = None
+            if adaptive:
+                scheduler.observe(objects[i].full_room_code, {"version": "1.20.1", "description": state[i]},
+                                  now=now)
+    return probes / hours, delays
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def run_benchmark(rooms=2000, hours=2):
+    print("=" * 60)
+    print(f"探测调度对比 ({rooms} 个房间, 其中 {ACTIVE_RATIO:.0%} 活跃, 模拟 {hours} 小时)")
+    print("=" * 60)
+    results = {}
+    for name, adaptive in (("固定 30 秒", False), ("自适应", True)):
+        per_hour, delays = _simulate(rooms, hours, adaptive)
+        results[name] = (per_hour, delays)
+        print(f"{name}: 每小时探测 {per_hour:>9,.0f} 次")
+        for kind, label in ((True, "活跃房间"), (False, "稳定房间")):
+            print(f"    {label}发现延迟: 中位 {_percentile(delays[kind], 50):>6.0f}s   "
+                  f"p95 {_percentile(delays[kind], 95):>6.0f}s   ({len(delays[kind])} 次变化)")
+    return results
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+                  float(sys.argv[2]) if len(sys.argv) > 2 else 2)
@@ -0,0 +1,79 @@
+"""
+基准测试：房间列表接口逐次构建 vs 按版本缓存的预序列化字节
+
+对比 list_rooms 在列表不变时的每次请求开销 (req/s):
+- rebuild: 每次请求逐行构建字典、mask_ip、JSONResponse 编码（旧实现）
+- cached:  RoomListCache 返回当前版本已序列化的字节（gzip 版本同理）
+
+运行: python test/bench_room_list.py [房间数] [请求次数]
+"""
+import os
+import sys
+import time
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SERVER_DIR)
+os.chdir(SERVER_DIR)
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from src.models import RoomCreate
+from src.registry import RoomRegistry
+from src.room_list import RoomListCache, public_room_dict
+
+
+def _populate(registry, rooms):
+    for i in range(rooms):
+        registry.upsert(RoomCreate(remote_port=20000 + i, node_id=1, room_name=f"房间{i}",
+                                   host_player=f"Player{i}", server_addr="frp.example.com",
+                                   full_room_code=f"{20000 + i}_1", description="欢迎来玩！" * 4),
+                        f"10.0.{i // 256}.{i % 256}")
+
+
+def _rebuild(registry, cache):
+    rooms = [public_room_dict(room) for room in registry.list_public()]
+    return JSONResponse({"success": True, "full": True, "version": registry.version, "rooms": rooms}).body
+
+
+def _cached(registry, cache):
+    return Response(cache.get().body, media_type="application/json").body
+
+
+def _cached_gzip(registry, cache):
+    return Response(cache.get().gzip_body, media_type="application/json",
+                    headers={"Content-Encoding": "gzip"}).body
+
+
+def _measure(fn, registry, cache, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn(registry, cache)
+    return n / (time.perf_counter() - start)
+
+
+def run_benchmark(rooms=100, n=5000):
+    registry = RoomRegistry()
+    _populate(registry, rooms)
+    cache = RoomListCache(registry)
+    snapshot = cache.get()
+    assert _rebuild(registry, cache) == snapshot.body
+
+    old = _measure(_rebuild, registry, cache, n)
+    results = {
+        "cached": (old, _measure(_cached, registry, cache, n)),
+        "cached+gzip": (old, _measure(_cached_gzip, registry, cache, n)),
+    }
+
+    print("=" * 60)
+    print(f"房间列表响应基准 ({rooms} 个房间, {n} 次请求, "
+          f"{len(snapshot.body)} B / gzip {len(snapshot.gzip_body)} B)")
+    print("=" * 60)
+    print(f"{'模式':<14}{'rebuild req/s':>16}{'cached req/s':>16}{'提升':>10}")
+    for name, (before, after) in results.items():
+        print(f"{name:<14}{before:>16,.0f}{after:>16,.0f}{after / before:>9.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100,
+                  int(sys.argv[2]) if len(sys.argv) > 2 else 5000)
@@ -0,0 +1,189 @@
+"""
+负载测试：多进程模式的吞吐扩展性
+
+用 app.py 分别以 1、2、4... 个工作进程启动真实服务（各自的临时工作目录和数据库），
+多个压测进程通过 HTTP keep-alive 连接轮流请求各个工作进程。两种负载：
+- access: 只请求无状态路由 GET /api/check_access
+- lobby: 大厅读为主的混合负载，房间列表 (gzip) / 房间检索 / check_access 轮流请求；
+  数据库预置 ROOMS 个公开房间，从进程使用主进程发布的房间镜像处理大厅读请求
+请求带不同的 X-Forwarded-For（模拟 Nginx 后的大量客户端），每个请求都经过共享内存中的
+限流表和封禁表。报告每种进程数下的总吞吐和相对单进程的加速比。
+
+压测客户端和服务在同一台机器上争用 CPU，加速比只在核数不少于 工作进程数 + 压测进程数 时有意义。
+
+运行: python test/bench_workers.py [最大进程数] [每轮秒数] [access|lobby|all]
+"""
+import asyncio
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SERVER_DIR)
+APP = os.path.join(SERVER_DIR, "app.py")
+
+CONNECTIONS = 64
+CLIENTS = 100000
+ROOMS = 500
+
+# 每种负载轮流请求的路径和附加请求头
+WORKLOADS = {
+    "access": [(b"/api/check_access", b"")],
+    "lobby": [(b"/api/lobby/rooms", b"Accept-Encoding: gzip\r\n"),
+              (b"/api/lobby/rooms/search?q=room&sort=players", b""),
+              (b"/api/lobby/rooms", b"Accept-Encoding: gzip\r\n"),
+              (b"/api/lobby/rooms/search?q=survival", b""),
+              (b"/api/check_access", b"")],
+}
+
+
+def _free_port_range(n):
+    """找一段连续的空闲端口"""
+    while True:
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            base = s.getsockname()[1]
+        if base + n >= 65535:
+            continue
+        try:
+            socks = []
+            for port in range(base, base + n):
+                sock = socket.socket()
+                socks.append(sock)
+                sock.bind(("127.0.0.1", port))
+            return base
+        except OSError:
+            continue
+        finally:
+            for sock in socks:
+                sock.close()
+
+
+def _wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1) as s:
+                s.sendall(b"GET / HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+                if s.recv(16).startswith(b"HTTP/1.1 200"):
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"worker on port {port} did not start")
+
+
+def _seed_rooms(workdir, rooms):
+    """在工作目录的数据库中预置公开房间；心跳时间设在一小时后，压测期间不会过期"""
+    from src import database
+    from src.models import RoomInfo
+    database.set_db_path(os.path.join(workdir, "data.db"))
+    database.init_db()
+    future = time.time() + 3600
+    names = ("survival", "skyblock", "creative", "minigames", "modded")
+    database.save_rooms([database.room_row(RoomInfo(
+        remote_port=20000 + i, node_id=1 + i % 4, room_name=f"{names[i % len(names)]} room",
+        description=f"{names[(i + 1) % len(names)]} server", game_version="1.20.1",
+        player_count=i % 20, host_player="Steve", server_addr="127.0.0.1",
+        full_room_code=f"{20000 + i}_{1 + i % 4}", updated_at=future - i, client_ip=f"10.9.{i // 256}.{i % 256}"))
+        for i in range(rooms)], [])
+    database.close_db()
+
+
+async def _connection(port, offset, deadline, counts, requests):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    i = offset
+    try:
+        while time.monotonic() < deadline:
+            ip = f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"
+            path, headers = requests[i % len(requests)]
+            writer.write(b"GET " + path + b" HTTP/1.1\r\nHost: bench\r\n" + headers +
+                         b"X-Forwarded-For: " + ip.encode() + b"\r\n\r\n")
+            await writer.drain()
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+            await reader.readexactly(length)
+            counts[head[9:12]] = counts.get(head[9:12], 0) + 1
+            i += CONNECTIONS * 16
+    finally:
+        writer.close()
+
+
+def _client(ports, seconds, index, workload, results):
+    async def run():
+        counts = {}
+        deadline = time.monotonic() + seconds
+        requests = WORKLOADS[workload]
+        await asyncio.gather(*(_connection(ports[c % len(ports)], index * CONNECTIONS + c, deadline, counts,
+                                           requests)
+                               for c in range(CONNECTIONS)))
+        return counts
+
+    results.put(asyncio.run(run()))
+
+
+def _measure(workers, seconds, client_procs, workload):
+    base = _free_port_range(workers)
+    workdir = tempfile.mkdtemp()
+    if workload == "lobby":
+        _seed_rooms(workdir, ROOMS)
+    proc = subprocess.Popen([sys.executable, APP, "--host", "127.0.0.1", "--port", str(base),
+                             "--workers", str(workers)], cwd=workdir,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ports = list(range(base, base + workers))
+        for port in ports:
+            _wait_ready(port)
+        # 等主进程发布第一份房间镜像
+        time.sleep(1)
+        # 主进程还要处理大厅写入和事件流，压测只打到从进程；单进程时打到唯一的进程
+        targets = ports[1:] or ports
+
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        clients = [ctx.Process(target=_client, args=(targets, seconds, i, workload, results)) for i in range(client_procs)]
+        for client in clients:
+            client.start()
+        counts = {}
+        for _ in clients:
+            for status, n in results.get(timeout=seconds + 60).items():
+                counts[status] = counts.get(status, 0) + n
+        for client in clients:
+            client.join()
+    finally:
+        proc.terminate()
+        proc.wait()
+    return counts
+
+
+def run_benchmark(max_workers=4, seconds=10, workload="access"):
+    cpus = os.cpu_count() or 1
+    client_procs = max(1, min(4, cpus // 2))
+    rows = []
+    workers = 1
+    while workers <= max_workers:
+        # 多进程模式下主进程不参与压测，N 个工作进程 = 1 主 + N 从
+        counts = _measure(workers if workers == 1 else workers + 1, seconds, client_procs, workload)
+        total = sum(counts.values())
+        rows.append((workers, total / seconds, counts))
+        workers *= 2
+
+    print("=" * 60)
+    print(f"多进程扩展性 [{workload}] (CPU {cpus} 核, 压测进程 {client_procs} x {CONNECTIONS} 连接, 每轮 {seconds}s)")
+    print("=" * 60)
+    base = rows[0][1]
+    for workers, rps, counts in rows:
+        statuses = ", ".join(f"{k.decode()}: {v}" for k, v in sorted(counts.items()))
+        print(f"{workers} 个工作进程: {rps:>9,.0f} req/s  加速比 {rps / base:.2f}x  ({statuses})")
+    return rows
+
+
+if __name__ == "__main__":
+    workload = sys.argv[3] if len(sys.argv) > 3 else "all"
+    for name in (WORKLOADS if workload == "all" else (workload,)):
+        run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 4,
+                      int(sys.argv[2]) if len(sys.argv) > 2 else 10, name)
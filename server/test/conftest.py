@@ -0,0 +1,48 @@
+"""
+测试公共设置与 fixture
+
+导入被测模块前把 server/ 加入 sys.path，并切换到 server/ 目录（配置文件等使用相对路径）。
+test/ 目录本身由 pytest 加入 sys.path，测试可以直接 `from fake_slp import ...`。
+"""
+import os
+import sys
+
+import pytest
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SERVER_DIR)
+os.chdir(SERVER_DIR)
+
+from src import database
+from src.ban_table import auto_bans
+from src.models import RoomCreate
+
+
+@pytest.fixture
+def fresh_db(tmp_path):
+    """独立的临时数据库（已建表），测试结束后关闭连接"""
+    database.set_db_path(str(tmp_path / "data.db"))
+    database.init_db()
+    yield database
+    database.close_db()
+
+
+def _make_room(port: int = 25565, node_id: int = 1, **kwargs) -> RoomCreate:
+    data = dict(remote_port=port, node_id=node_id, room_name="测试房间", host_player="Steve",
+                server_addr="frp.example.com", full_room_code=f"{port}_{node_id}")
+    data.update(kwargs)
+    return RoomCreate(**data)
+
+
+@pytest.fixture
+def make_room():
+    """房间心跳请求的工厂：make_room(端口, 节点, 其它字段覆盖默认值)"""
+    return _make_room
+
+
+@pytest.fixture
+def clean_auto_bans():
+    """测试前后清空全局自动封禁表，避免封禁的 IP（如 TestClient 的 "testclient"）泄漏到其它测试"""
+    auto_bans.clear()
+    yield auto_bans
+    auto_bans.clear()
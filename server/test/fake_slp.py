@@ -0,0 +1,249 @@
+"""
+本地假 Minecraft 服务器 (Server List Ping)，供探测相关测试和基准测试使用
+
+- FakeSLPServer: 单个端点，可配置版本/MOTD/人数、响应延迟，以及丢包、截断帧、连接重置等故障
+- FakeSLPFleet: 在本机同时运行成千上万个端点
+"""
+import asyncio
+import json
+import random
+import socket
+import struct
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+def _varint(value: int) -> bytes:
+    value &= 0xFFFFFFFF
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _frame(payload: bytes) -> bytes:
+    return _varint(len(payload)) + payload
+
+
+async def _read_varint(reader: asyncio.StreamReader) -> int:
+    value = 0
+    for i in range(5):
+        byte = (await reader.readexactly(1))[0]
+        value |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            return value
+    raise ValueError("VarInt too long")
+
+
+async def read_packet(reader: asyncio.StreamReader) -> bytes:
+    return await reader.readexactly(await _read_varint(reader))
+
+
+def status_packet(status: dict) -> bytes:
+    data = json.dumps(status).encode("utf-8")
+    return _frame(_varint(0) + _varint(len(data)) + data)
+
+
+def make_status(version="1.20.1", motd="A Minecraft Server", online=0, max_players=20, protocol=763) -> dict:
+    return {
+        "version": {"name": version, "protocol": protocol},
+        "players": {"online": online, "max": max_players},
+        "description": motd,
+    }
+
+
+# 单个连接的行为
+OK = "ok"              # 正常响应状态和 Ping
+LOSS = "loss"          # 读完请求后不再响应（模拟丢包），直到客户端超时断开
+TRUNCATE = "truncate"  # 只发出半个状态帧就关闭连接
+RESET = "reset"        # 读完请求后直接发送 RST
+MODES = (OK, LOSS, TRUNCATE, RESET)
+
+
+class FakeSLPServer:
+    """
+    单个假 SLP 服务器
+
+    每个连接的行为依次取自 faults 序列（用于精确复现重试场景），序列用完后按 loss / truncate / reset
+    概率随机决定；随机数由 seed 决定，同样的 seed 得到同样的故障序列。
+
+    :param status: 状态响应 JSON (dict)
+    :param delay: 收到状态请求后延迟多少秒再响应
+    :param jitter: 额外的随机延迟上限（秒）
+    :param answer_ping: 是否响应 Ping 包
+    :param loss: 连接按 LOSS 处理的概率
+    :param truncate: 连接按 TRUNCATE 处理的概率
+    :param reset: 连接按 RESET 处理的概率
+    :param faults: 前若干个连接的行为，如 [RESET, LOSS]
+    :param seed: 随机数种子
+    """
+
+    def __init__(self, status: Optional[dict] = None, delay: float = 0.0, answer_ping: bool = True,
+                 jitter: float = 0.0, loss: float = 0.0, truncate: float = 0.0, reset: float = 0.0,
+                 faults: Iterable[str] = (), seed: Optional[int] = None):
+        self.status = status or make_status()
+        self.delay = delay
+        self.jitter = jitter
+        self.answer_ping = answer_ping
+        self.loss = loss
+        self.truncate = truncate
+        self.reset = reset
+        self.faults = deque(faults)
+        self._rng = random.Random(seed)
+        self.connections = 0
+        # 每个连接到达的时间 (time.monotonic) 和实际采用的行为
+        self.connection_times: List[float] = []
+        self.outcomes: Dict[str, int] = {mode: 0 for mode in MODES}
+        self.port = None
+        self._server = None
+
+    def update(self, version: Optional[str] = None, motd=None, online: Optional[int] = None,
+               max_players: Optional[int] = None):
+        """修改之后的状态响应（模拟服务器换版本、改 MOTD、玩家进出）"""
+        if version is not None:
+            self.status["version"]["name"] = version
+        if motd is not None:
+            self.status["description"] = motd
+        if online is not None:
+            self.status["players"]["online"] = online
+        if max_players is not None:
+            self.status["players"]["max"] = max_players
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """开始监听；stop() 之后可以用同一个端口再次 start()，模拟服务器宕机后恢复"""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    @property
+    def running(self) -> bool:
+        return self._server is not None
+
+    def _next_mode(self) -> str:
+        if self.faults:
+            return self.faults.popleft()
+        r = self._rng.random()
+        for mode, probability in ((LOSS, self.loss), (TRUNCATE, self.truncate), (RESET, self.reset)):
+            if r < probability:
+                return mode
+            r -= probability
+        return OK
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self.connection_times.append(time.monotonic())
+        mode = self._next_mode()
+        self.outcomes[mode] += 1
+        try:
+            await read_packet(reader)  # handshake
+            await read_packet(reader)  # status request
+            if mode == LOSS:
+                # 不响应，等客户端放弃
+                await reader.read()
+                return
+            if mode == RESET:
+                writer.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_LINGER,
+                                                           struct.pack("ii", 1, 0))
+                writer.transport.abort()
+                return
+
+            delay = self.delay + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            if delay:
+                await asyncio.sleep(delay)
+            packet = status_packet(self.status)
+            if mode == TRUNCATE:
+                writer.write(packet[:len(packet) // 2])
+                await writer.drain()
+                return
+            writer.write(packet)
+            await writer.drain()
+            ping = await read_packet(reader)
+            if self.answer_ping and ping[:1] == b"\x01":
+                writer.write(_frame(ping))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+
+class FakeSLPFleet:
+    """
+    一组假 SLP 服务器，每个监听 host 上的独立端口（数千个端点需要足够的 ulimit -n）
+
+    :param count: 端点数
+    :param profile: profile(i, rng) -> FakeSLPServer 的参数 dict，用于生成不同版本/人数/故障率的端点；
+                    不提供时所有端点都使用 **defaults
+    :param seed: 随机数种子，决定 profile 的 rng 和每个端点的故障序列
+    """
+
+    def __init__(self, count: int, profile: Optional[Callable[[int, random.Random], dict]] = None,
+                 seed: int = 0, **defaults):
+        rng = random.Random(seed)
+        self.servers: List[FakeSLPServer] = []
+        for i in range(count):
+            kwargs = dict(defaults)
+            if profile is not None:
+                kwargs.update(profile(i, rng))
+            kwargs.setdefault("seed", seed * 1000003 + i)
+            self.servers.append(FakeSLPServer(**kwargs))
+        self.host = None
+
+    async def start(self, host: str = "127.0.0.1", batch: int = 500) -> List[int]:
+        self.host = host
+        for i in range(0, len(self.servers), batch):
+            await asyncio.gather(*(server.start(host) for server in self.servers[i:i + batch]))
+        return self.ports
+
+    async def stop(self):
+        await asyncio.gather(*(server.stop() for server in self.servers))
+
+    @property
+    def ports(self) -> List[int]:
+        return [server.port for server in self.servers]
+
+    @property
+    def endpoints(self) -> List[Tuple[str, int]]:
+        return [(self.host, server.port) for server in self.servers]
+
+    def stats(self) -> dict:
+        """全部端点的连接数和各行为的次数"""
+        outcomes = {mode: sum(server.outcomes[mode] for server in self.servers) for mode in MODES}
+        return {"endpoints": len(self.servers), "connections": sum(s.connections for s in self.servers),
+                "outcomes": outcomes}
+
+    def __len__(self):
+        return len(self.servers)
+
+    def __getitem__(self, index) -> FakeSLPServer:
+        return self.servers[index]
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+
+__all__ = ["FakeSLPServer", "FakeSLPFleet", "make_status", "status_packet", "read_packet",
+           "OK", "LOSS", "TRUNCATE", "RESET"]
@@ -0,0 +1,130 @@
+"""
+测试访问日志后台批量写入 (AccessLogWriter)
+"""
+import time
+
+from src import access_log, database
+from src.access_log import AccessLogWriter
+
+
+def test_dedupe_within_window():
+    """同一 (ip, action) 在窗口内只入队一次"""
+    writer = AccessLogWriter(dedupe_window=300)
+    assert writer.record("1.1.1.1", "GET /", now=1000)
+    assert not writer.record("1.1.1.1", "GET /", now=1100)
+    assert writer.record("1.1.1.1", "POST /", now=1100)
+    assert writer.record("1.1.1.1", "GET /", now=1301)
+    assert writer.pending_count == 3
+
+
+def test_lru_bounded():
+    """去重表超过上限时淘汰最旧条目"""
+    writer = AccessLogWriter(max_entries=100)
+    for i in range(1000):
+        writer.record(f"10.0.{i // 256}.{i % 256}", "GET /", now=1000)
+    assert len(writer._seen) == 100
+
+
+def test_flush_on_stop(fresh_db):
+    """stop() 时写完所有剩余日志"""
+    writer = AccessLogWriter(flush_interval=60, batch_size=10000)
+    writer.start()
+    for i in range(50):
+        writer.record(f"10.0.0.{i}", "GET /api/lobby/rooms")
+    writer.stop()
+    assert len(database.get_access_logs(limit=1000)) == 50
+    assert writer.pending_count == 0
+
+
+def test_flush_by_batch_size(fresh_db):
+    """队列达到 batch_size 时后台线程立即刷新"""
+    writer = AccessLogWriter(flush_interval=60, batch_size=20)
+    writer.start()
+    for i in range(20):
+        writer.record(f"10.0.1.{i}", "GET /")
+    deadline = time.time() + 5
+    while writer.pending_count and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(database.get_access_logs(limit=1000)) == 20
+    writer.stop()
+
+
+def test_failed_flush_is_retried(fresh_db):
+    """写入失败时日志和汇总放回缓冲区，下次刷新写入；缓冲区有上限"""
+    writer = AccessLogWriter(max_pending=30)
+    for i in range(20):
+        writer.record(f"10.0.2.{i}", "GET /", now=1000)
+
+    def broken(*args):
+        raise RuntimeError("database is locked")
+
+    original = access_log.insert_access_logs
+    access_log.insert_access_logs = broken
+    try:
+        assert writer.flush() == 0
+        assert writer.pending_count == 20
+        for i in range(20, 40):
+            writer.record(f"10.0.2.{i}", "GET /", now=1001)
+        assert writer.flush() == 0
+    finally:
+        access_log.insert_access_logs = original
+
+    # 超出上限时丢弃最早的行，新记录保留
+    assert writer.pending_count == 30
+    assert writer.flush() == 30
+    logs = database.get_access_logs(limit=1000)
+    assert len(logs) == 30 and "10.0.2.0" not in {log["client_ip"] for log in logs}
+    stats = database.get_access_stats(0)
+    assert stats["hourly"] == [{"hour": 0, "requests": 40}]
+    assert len(database.get_access_stats(0, limit=100)["top_ips"]) == 30
+
+
+def test_daily_partitions_and_rollups(fresh_db):
+    """日志按本地日期分表；汇总包含被去重的请求，跨批次累加"""
+    day = time.mktime((2026, 3, 1, 12, 0, 0, 0, 0, -1))
+    writer = AccessLogWriter()
+    for i in range(3):
+        writer.record("1.1.1.1", "POST /api/lobby/heartbeat", now=day + i)
+    writer.record("2.2.2.2", "GET /api/lobby/rooms", now=day + 86400)
+    writer.flush()
+    writer.record("1.1.1.1", "POST /api/lobby/heartbeat", now=day + 10)
+    writer.flush()
+
+    conn = database.get_db_connection()
+    assert conn.execute("SELECT COUNT(*) FROM access_logs_20260301").fetchone()[0] == 1
+    assert conn.execute("SELECT COUNT(*) FROM access_logs_20260302").fetchone()[0] == 1
+    logs = database.get_access_logs(limit=10)
+    assert [log["client_ip"] for log in logs] == ["2.2.2.2", "1.1.1.1"]
+
+    stats = database.get_access_stats(since_hour=0)
+    assert stats["top_ips"][0] == {"client_ip": "1.1.1.1", "requests": 4}
+    assert stats["top_routes"][0] == {"action": "POST /api/lobby/heartbeat", "requests": 4}
+    assert sum(row["requests"] for row in stats["hourly"]) == 5
+    assert database.get_access_stats(since_hour=int(day) + 3600)["top_ips"] == [
+        {"client_ip": "2.2.2.2", "requests": 1}]
+
+
+def test_prune_retention(fresh_db):
+    """过期的日分表整表删除，过期的汇总按小时删除，旧的单表清空后删除"""
+    now = time.mktime((2026, 3, 20, 12, 0, 0, 0, 0, -1))
+    conn = database.get_db_connection()
+    with conn:
+        conn.execute("CREATE TABLE access_logs (id INTEGER PRIMARY KEY, client_ip TEXT, timestamp REAL, action TEXT)")
+        conn.execute("INSERT INTO access_logs (client_ip, timestamp, action) VALUES ('9.9.9.9', ?, 'GET /')",
+                     (now - 30 * 86400,))
+    writer = AccessLogWriter()
+    for days_ago in range(20):
+        writer.record(f"10.0.0.{days_ago}", "GET /", now=now - days_ago * 86400)
+    writer.flush()
+
+    dropped, removed = database.prune_access_logs(retention_days=14, rollup_retention_days=7, now=now)
+    # 保留今天和之前 14 天的分表
+    assert dropped == 5
+    # 7 天前的中午那一小时仍在保留期内，8~19 天前的每天 IP + 路由各一行
+    assert removed == 12 * 2
+    assert len(database.get_access_logs(limit=100)) == 15
+    assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'access_logs'").fetchone() is None
+    # 删除后仍可写入
+    writer.record("10.0.0.99", "GET /", now=now)
+    writer.flush()
+    assert database.prune_access_logs(14, 7, now=now) == (0, 0)
@@ -0,0 +1,38 @@
+"""
+测试内存自动封禁表 (BanTable)
+"""
+import time
+
+from src import database
+from src.ban_table import BanTable
+
+
+def test_ban_and_expiry(fresh_db):
+    """封禁立即生效，到期后自动解除并从表中清理"""
+    table = BanTable()
+    until = table.ban("1.2.3.4", duration_minutes=10)
+    assert table.is_banned("1.2.3.4")
+    assert not table.is_banned("4.3.2.1")
+    assert not table.is_banned("1.2.3.4", now=until + 1)
+    assert len(table) == 0
+
+
+def test_reban_extends():
+    """重复封禁以最新的解封时间为准，旧的堆条目不会误删"""
+    table = BanTable()
+    table._add("1.2.3.4", 100)
+    table._add("1.2.3.4", 200)
+    assert table.purge_expired(now=150) == 0
+    assert table.is_banned("1.2.3.4", now=150)
+    assert table.purge_expired(now=250) == 1
+
+
+def test_persist_and_load(fresh_db):
+    """封禁持久化到数据库，重启后加载未过期的记录"""
+    BanTable().ban("5.5.5.5", duration_minutes=10)
+    database.ban_ip("6.6.6.6", time.time() - 1)
+
+    restored = BanTable()
+    assert restored.load() == 1
+    assert restored.is_banned("5.5.5.5")
+    assert not restored.is_banned("6.6.6.6")
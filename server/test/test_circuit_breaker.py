@@ -0,0 +1,150 @@
+"""
+测试探测目标熔断器 (CircuitBreaker) 及其在稳健探测中的使用
+"""
+import asyncio
+import time
+
+from fake_slp import FakeSLPServer, RESET
+from src import minecraft_pinger
+from src.circuit_breaker import CircuitBreaker, BREAKER_OPEN, CLOSED, OPEN, HALF_OPEN, TRIAL
+
+
+def test_state_machine():
+    """连续失败后熔断；冷却后只放行一次试探；试探失败冷却翻倍，成功后恢复"""
+    breaker = CircuitBreaker("test_state", failure_threshold=3, cooldown=10, max_cooldown=25)
+    key = "frp.example.com:25565"
+    assert breaker.allow(key, now=0) == CLOSED
+    assert breaker.record(key, False, now=0) is False
+    assert breaker.record(key, False, now=1) is False
+    assert breaker.record(key, False, now=2) is True
+    assert breaker.state(key) == OPEN
+    assert BREAKER_OPEN.labels("test_state").value == 1
+
+    assert breaker.allow(key, now=11) is None
+    assert breaker.allow(key, now=12) == TRIAL
+    assert breaker.state(key) == HALF_OPEN
+    # 试探进行中，其余调用直接失败
+    assert breaker.allow(key, now=12) is None
+
+    breaker.record(key, False, now=13)
+    assert breaker.state(key) == OPEN
+    assert breaker.allow(key, now=32) is None
+    assert breaker.allow(key, now=33) == TRIAL
+    breaker.record(key, False, now=33)
+    # 冷却期翻倍但不超过上限 25
+    assert breaker.allow(key, now=57) is None
+    assert breaker.allow(key, now=58) == TRIAL
+
+    breaker.record(key, True, now=58)
+    assert breaker.state(key) == CLOSED
+    assert len(breaker) == 0
+    assert BREAKER_OPEN.labels("test_state").value == 0
+    assert breaker.stats() == {"tracked": 0, "open": 0, "opened": 1, "rejected": 4}
+
+
+def test_failure_window_and_abandon():
+    """间隔太久的失败不算连续；放弃的试探可以被下一次调用重新领取"""
+    breaker = CircuitBreaker("test_window", failure_threshold=2, cooldown=5, failure_window=60)
+    breaker.record("a", False, now=0)
+    breaker.record("a", False, now=100)
+    assert breaker.state("a") == CLOSED
+    breaker.record("a", False, now=101)
+    assert breaker.state("a") == OPEN
+
+    assert breaker.allow("a", now=110) == TRIAL
+    breaker.abandon("a")
+    assert breaker.allow("a", now=110) == TRIAL
+
+    # 成功清除失败计数
+    breaker.record("b", False, now=0)
+    breaker.record("b", True, now=1)
+    breaker.record("b", False, now=2)
+    assert breaker.state("b") == CLOSED
+
+
+def test_bounded_entries():
+    """只跟踪有失败记录的目标，数量有上限"""
+    breaker = CircuitBreaker("test_bounded", failure_threshold=2, max_entries=100)
+    for i in range(1000):
+        breaker.record(f"10.0.{i // 256}.{i % 256}:25565", False, now=i)
+    assert len(breaker) <= 100
+
+
+def test_probe_fails_fast_and_recovers():
+    """端点宕机：熔断前每次都付出重试的耗时，熔断后立即失败；恢复后一次试探即恢复正常"""
+    endpoint = CircuitBreaker("test_endpoint", failure_threshold=2, cooldown=0.5)
+    host = CircuitBreaker("test_host", failure_threshold=100)
+    saved = minecraft_pinger.endpoint_breaker, minecraft_pinger.host_breaker
+    minecraft_pinger.endpoint_breaker, minecraft_pinger.host_breaker = endpoint, host
+
+    async def timed(port):
+        start = time.perf_counter()
+        status = await minecraft_pinger._guarded_probe("127.0.0.1", port)
+        return status, time.perf_counter() - start
+
+    async def run():
+        server = FakeSLPServer(faults=[RESET])
+        port = await server.start()
+        await server.stop()
+
+        # 两次完整的重试（每次 0.5s + 1s 退避）后熔断
+        slow = [await timed(port) for _ in range(2)]
+        fast = await timed(port)
+
+        # 冷却结束后的试探只探测一次：服务器恢复但第一个连接被重置，试探失败
+        await server.start(port=port)
+        await asyncio.sleep(0.6)
+        trial_failed = await timed(port)
+        connections_after_trial = server.connections
+        await asyncio.sleep(1.1)
+        recovered = await timed(port)
+        await server.stop()
+        return slow, fast, trial_failed, connections_after_trial, recovered
+
+    try:
+        slow, fast, trial_failed, connections_after_trial, recovered = asyncio.run(run())
+    finally:
+        minecraft_pinger.endpoint_breaker, minecraft_pinger.host_breaker = saved
+
+    assert all(status is None and elapsed >= 1.4 for status, elapsed in slow)
+    assert fast[0] is None and fast[1] < 0.05
+    assert trial_failed[0] is None and trial_failed[1] < 0.5
+    assert connections_after_trial == 1
+    assert recovered[0] is not None
+    assert len(endpoint) == 0
+    assert endpoint.stats()["rejected"] == 1
+
+
+def test_host_breaker_covers_all_endpoints():
+    """节点级熔断：同一节点上多个端点连续失败后，该节点上其它端点也直接失败"""
+    endpoint = CircuitBreaker("test_endpoint2", failure_threshold=100)
+    host = CircuitBreaker("test_host2", failure_threshold=2, cooldown=60)
+    saved = minecraft_pinger.endpoint_breaker, minecraft_pinger.host_breaker
+    minecraft_pinger.endpoint_breaker, minecraft_pinger.host_breaker = endpoint, host
+
+    async def probe_down(host_, port):
+        # 退避耗时与本测试无关，直接把稳健探测换成一次短超时的探测
+        return await minecraft_pinger.get_server_status(host_, port, timeout=0.2)
+
+    async def run():
+        ports = []
+        for _ in range(3):
+            server = FakeSLPServer()
+            ports.append(await server.start())
+            await server.stop()
+        results = [await minecraft_pinger._guarded_probe("127.0.0.1", port) for port in ports]
+        return results, host.state("127.0.0.1"), host.open_keys()
+
+    original = minecraft_pinger._probe_with_retries
+    minecraft_pinger._probe_with_retries = probe_down
+    try:
+        results, state, open_hosts = asyncio.run(run())
+    finally:
+        minecraft_pinger._probe_with_retries = original
+        minecraft_pinger.endpoint_breaker, minecraft_pinger.host_breaker = saved
+
+    assert results == [None, None, None]
+    assert state == OPEN and open_hosts == ["127.0.0.1"]
+    assert host.stats()["rejected"] == 1
+    # 第三个端点没有被真正探测，端点熔断器没有它的失败记录
+    assert len(endpoint) == 2
@@ -0,0 +1,75 @@
+"""
+测试 SQLite 连接池与数据库层
+"""
+import os
+import tempfile
+import threading
+import time
+
+from src import database
+from src.db_pool import ConnectionPool
+from src.models import RoomInfo
+
+
+def test_connection_reused_per_thread():
+    """同一线程复用连接，不同线程各自持有连接"""
+    pool = ConnectionPool(os.path.join(tempfile.mkdtemp(), "pool.db"))
+    conn = pool.connection()
+    assert pool.connection() is conn
+
+    other = []
+    t = threading.Thread(target=lambda: other.append(pool.connection()))
+    t.start()
+    t.join()
+    assert other[0] is not conn
+    pool.close_all()
+
+
+def test_pragma_profile_applied():
+    """建连时应用 PRAGMA 配置"""
+    pool = ConnectionPool(os.path.join(tempfile.mkdtemp(), "pool.db"))
+    conn = pool.connection()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+    pool.close_all()
+
+
+def test_reset_switches_database():
+    """reset() 后旧连接失效，新连接指向新文件"""
+    tmp = tempfile.mkdtemp()
+    pool = ConnectionPool(os.path.join(tmp, "a.db"))
+    old = pool.connection()
+    pool.reset(os.path.join(tmp, "b.db"))
+    new = pool.connection()
+    assert new is not old
+    assert os.path.exists(os.path.join(tmp, "b.db"))
+    pool.close_all()
+
+
+def test_database_functions_on_pool(fresh_db, make_room):
+    """数据库函数在复用连接上正常读写"""
+    def room(**kwargs):
+        return RoomInfo(**make_room(**kwargs).model_dump(), updated_at=time.time(), client_ip="1.2.3.4")
+
+    database.save_rooms([database.room_row(room())], [])
+    database.save_rooms([database.room_row(room(player_count=3, is_public=False))], [])
+    rooms = database.load_rooms()
+    assert len(rooms) == 1 and rooms[0].player_count == 3 and rooms[0].is_public is False
+
+    database.ban_ip("5.6.7.8", time.time() + 60)
+    database.ban_ip("5.6.7.9", time.time() - 1)
+    assert [ip for ip, _ in database.load_active_bans()] == ["5.6.7.8"]
+    assert database.cleanup_expired_bans() == 1
+
+    database.save_presence_stats([("2026-01-01", 3, b"sketch"), ("2026-01-01 08", 2, b"sketch")])
+    assert [r["bucket"] for r in database.load_presence_stats()] == ["2026-01-01", "2026-01-01 08"]
+    assert database.load_presence_stats(["2026-01-01 08"])[0]["peak"] == 2
+
+    database.save_tunnels([("1.2.3.4", "frp.example.com", 25565, time.time())], [])
+    assert database.load_tunnels()[0]["remote_port"] == 25565
+    database.save_tunnels([], [("frp.example.com", 25565)])
+    assert database.load_tunnels() == []
+
+    database.save_rooms([], ["25565_1"])
+    assert database.load_rooms() == []
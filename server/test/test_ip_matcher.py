@@ -0,0 +1,93 @@
+"""
+测试预编译 IP 规则匹配器
+"""
+import ipaddress
+import random
+import time
+
+from src import database, security
+from src.ip_matcher import IPRuleMatcher
+from src.utils import parse_ip_rule
+
+
+def _reference_match(ip_str, rules):
+    """旧实现：逐条解析规则并线性扫描"""
+    ip = ipaddress.ip_address(ip_str)
+    return any(ip in net for rule in rules for net in parse_ip_rule(rule))
+
+
+def test_rule_formats():
+    """CIDR、范围、列表、单 IP 及 IPv6"""
+    matcher = IPRuleMatcher([
+        "192.168.1.0/24",
+        "10.0.0.1-10.0.0.5, 1.1.1.1",
+        "2001:db8::/32",
+        "::1",
+        "not-an-ip, 8.8.8.8",
+    ])
+    assert matcher.matches("192.168.1.77")
+    assert not matcher.matches("192.168.2.1")
+    assert matcher.matches("10.0.0.5")
+    assert not matcher.matches("10.0.0.6")
+    assert matcher.matches("1.1.1.1")
+    assert matcher.matches("2001:db8:1::5")
+    assert matcher.matches("::1")
+    assert matcher.matches("8.8.8.8")
+    assert not matcher.matches("garbage")
+    assert not IPRuleMatcher().matches("1.2.3.4")
+
+
+def test_matches_reference_implementation():
+    """随机规则下与旧实现结果一致"""
+    rng = random.Random(42)
+    rules = []
+    for _ in range(100):
+        base = ipaddress.IPv4Address(rng.getrandbits(32))
+        kind = rng.randrange(3)
+        if kind == 0:
+            rules.append(f"{base}/{rng.randint(16, 30)}")
+        elif kind == 1:
+            rules.append(f"{base}-{ipaddress.IPv4Address(min(int(base) + rng.randint(0, 5000), 2**32 - 1))}")
+        else:
+            rules.append(str(base))
+    matcher = IPRuleMatcher(rules)
+    probes = [str(ipaddress.IPv4Address(rng.getrandbits(32))) for _ in range(200)]
+    # 也探测规则边界附近的地址
+    for rule in rules[:30]:
+        for net in parse_ip_rule(rule):
+            probes += [str(net.network_address), str(net.broadcast_address),
+                       str(ipaddress.IPv4Address(max(int(net.network_address) - 1, 0)))]
+    for ip in probes:
+        assert matcher.matches(ip) == _reference_match(ip, rules), ip
+
+
+def test_large_rule_set_lookup():
+    """10万条规则下查找保持快速"""
+    rules = [f"{(i >> 8) & 255}.{i & 255}.{i % 7}.0/24" for i in range(100000)]
+    matcher = IPRuleMatcher(rules)
+    start = time.perf_counter()
+    for i in range(10000):
+        matcher.matches(f"{i & 255}.{(i >> 3) & 255}.3.9")
+    elapsed = time.perf_counter() - start
+    print(f"10k lookups over 100k rules: {elapsed * 1000:.1f} ms")
+    assert elapsed < 1.0
+
+
+def test_reload_applies_immediately(fresh_db):
+    """规则写入后 reload_rules() 立即生效，过期白名单自动失效"""
+    security.reload_rules()
+    assert not security._current_rules()['blacklist'].matches("6.6.6.6")
+
+    database.add_blacklist_rule("6.6.6.0/24", "test")
+    security.reload_rules()
+    assert security._current_rules()['blacklist'].matches("6.6.6.6")
+
+    database.add_whitelist_rule("7.7.7.7", "temp", duration_minutes=1)
+    security.reload_rules()
+    assert security._current_rules()['whitelist'].matches("7.7.7.7")
+    # 模拟到期
+    security._rules_cache['next_expiry'] = 0
+    conn = database.get_db_connection()
+    with conn:
+        conn.execute("UPDATE whitelist_rules SET expires_at = ? WHERE rule = ?", (time.time() - 1, "7.7.7.7"))
+    assert not security._current_rules()['whitelist'].matches("7.7.7.7")
@@ -0,0 +1,70 @@
+"""
+测试隧道校验租约 (TunnelLeaseManager)
+"""
+import asyncio
+
+from src.leases import TunnelLeaseManager
+
+
+def test_issue_and_check():
+    """租约绑定隧道并在有效期内有效"""
+    leases = TunnelLeaseManager(secret=b"k", lease_ttl=40)
+    token = leases.issue("frp.example.com", 25565, now=1000)
+    assert leases.check(token, "frp.example.com", 25565, now=1030)
+    assert not leases.check(token, "frp.example.com", 25565, now=1041)
+    assert not leases.check(token, "frp.example.com", 25566, now=1030)
+    assert not leases.check(token, "other.example.com", 25565, now=1030)
+    assert not leases.check(None, "frp.example.com", 25565, now=1030)
+
+
+def test_tampered_or_foreign_lease_rejected():
+    """篡改或其他密钥签发的租约无效"""
+    leases = TunnelLeaseManager(secret=b"k")
+    token = leases.issue("frp.example.com", 25565, now=1000)
+    encoded, signature = token.rsplit(".", 1)
+    assert not leases.check(encoded + "." + "0" * len(signature), "frp.example.com", 25565, now=1001)
+    assert not TunnelLeaseManager(secret=b"other").check(token, "frp.example.com", 25565, now=1001)
+    assert not leases.check("garbage.token", "frp.example.com", 25565, now=1001)
+
+
+def test_failed_reverification_revokes():
+    """后台复核失败后，下一次心跳取到失败原因，旧租约作废"""
+    leases = TunnelLeaseManager(secret=b"k", reverify_interval=0.05)
+
+    async def dead_probe(host, port):
+        return None
+
+    async def run():
+        token = leases.issue("frp.example.com", 25565)
+        verifier = asyncio.ensure_future(leases.run_verifier(dead_probe, tick=0.02))
+        await asyncio.sleep(0.2)
+        verifier.cancel()
+        return token
+
+    token = asyncio.run(run())
+    assert leases.stats()["verification_failures"] == 1
+    assert leases.check(token, "frp.example.com", 25565)
+    assert leases.pop_failure("frp.example.com", 25565)
+    assert not leases.check(token, "frp.example.com", 25565)
+    # 重新完整校验后签发的新租约有效
+    assert leases.check(leases.issue("frp.example.com", 25565), "frp.example.com", 25565)
+
+
+def test_healthy_tunnel_rescheduled():
+    """复核成功的隧道按间隔反复复核，不产生失败"""
+    leases = TunnelLeaseManager(secret=b"k", reverify_interval=0.05)
+    probes = []
+
+    async def ok_probe(host, port):
+        probes.append((host, port))
+        return {"version": "1.20.1"}
+
+    async def run():
+        leases.issue("frp.example.com", 25565)
+        verifier = asyncio.ensure_future(leases.run_verifier(ok_probe, tick=0.01))
+        await asyncio.sleep(0.3)
+        verifier.cancel()
+
+    asyncio.run(run())
+    assert len(probes) >= 3
+    assert leases.pop_failure("frp.example.com", 25565) is None
@@ -0,0 +1,102 @@
+"""
+测试大厅事件广播 (LobbyEventHub)
+"""
+import asyncio
+import json
+
+from src.lobby_events import LobbyEventHub
+from src.registry import RoomRegistry
+from src.room_list import RoomListCache
+
+
+def _parse(raw: bytes):
+    """把 SSE 字节流解析为 [(event, id, data)]，忽略注释和 retry"""
+    events = []
+    for block in raw.decode().split("\n\n"):
+        fields = {}
+        for line in block.split("\n"):
+            if line and not line.startswith(":"):
+                key, _, value = line.partition(": ")
+                fields[key] = value
+        if "event" in fields:
+            events.append((fields["event"], fields.get("id"), json.loads(fields["data"])))
+    return events
+
+
+def _hub(**kwargs):
+    registry = RoomRegistry()
+    return registry, LobbyEventHub(RoomListCache(registry), **kwargs)
+
+
+def test_snapshot_then_room_events(make_room):
+    """连接时收到完整列表，之后收到房间变化和在线人数变化"""
+    registry, hub = _hub(keepalive=0.05)
+
+    async def run():
+        registry.upsert(make_room(), "1.2.3.4")
+        subscriber = hub.subscribe()
+        stream = hub.stream(subscriber, hub.initial_events())
+        first = _parse(await stream.__anext__())
+        assert first[0][0] == "snapshot" and len(first[0][2]["rooms"]) == 1
+
+        registry.upsert(make_room(), "1.2.3.4")  # 纯心跳不广播
+        registry.upsert(make_room(player_count=3), "1.2.3.4")
+        registry.delete(25565, 1)
+        hub.set_online_count(7)
+        hub.set_online_count(7)
+        events = _parse(await stream.__anext__())
+        assert [e[0] for e in events] == ["room", "remove", "online"]
+        assert events[0][2]["player_count"] == 3 and events[0][2]["host_ip"] == "1.2.3.***"
+        assert events[1][1] == str(registry.version)
+        assert events[2][2] == {"online_count": 7}
+
+        # 空闲时发送保活注释
+        assert await stream.__anext__() == b": ping\n\n"
+        await stream.aclose()
+        assert len(hub) == 0
+
+    asyncio.run(run())
+
+
+def test_reconnect_with_last_event_id_gets_delta(make_room):
+    """带 Last-Event-ID 重连时只补发增量，无效 id 回退到完整列表"""
+    registry, hub = _hub()
+
+    async def run():
+        registry.upsert(make_room(), "1.2.3.4")
+        last_id = registry.version
+        registry.upsert(make_room(port=25566), "5.6.7.8")
+        events = _parse(hub.initial_events(str(last_id)))
+        assert events[0][0] == "delta"
+        assert [r["full_room_code"] for r in events[0][2]["rooms"]] == ["25566_1"]
+        assert _parse(hub.initial_events("1"))[0][0] == "snapshot"
+        assert _parse(hub.initial_events("garbage"))[0][0] == "snapshot"
+
+    asyncio.run(run())
+
+
+def test_slow_consumer_evicted(make_room):
+    """缓冲积压超过上限的订阅者被断开，不影响其他订阅者"""
+    registry, hub = _hub(max_buffer=3)
+
+    async def run():
+        slow = hub.subscribe()
+        fast = hub.subscribe()
+        for i in range(3):
+            registry.upsert(make_room(port=26000 + i), "1.2.3.4")
+        assert len(await fast.drain(0.1)) == 3
+        registry.upsert(make_room(port=26010), "1.2.3.4")
+        assert slow.closed and len(hub) == 1 and hub.evicted == 1
+        assert not fast.closed
+
+    asyncio.run(run())
+
+
+def test_subscriber_limit():
+    registry, hub = _hub(max_subscribers=2)
+
+    async def run():
+        assert hub.subscribe() and hub.subscribe()
+        assert hub.subscribe() is None
+
+    asyncio.run(run())
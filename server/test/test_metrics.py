@@ -0,0 +1,61 @@
+"""
+测试指标 (metrics)：直方图/计数器的文本格式，以及按路由统计请求的中间件
+"""
+from src.metrics import Counter, Histogram, MetricsMiddleware, MetricsRegistry, HTTP_REQUESTS, HTTP_SECONDS
+
+
+def test_render_text_format():
+    """直方图的桶是累计的，带 +Inf、_sum 和 _count；标签值转义"""
+    registry = MetricsRegistry()
+    hist = registry.register(Histogram("probe_seconds", "Probe time", ("outcome",), buckets=(0.1, 1.0)))
+    hist.labels("ok").observe(0.05)
+    hist.labels("ok").observe(0.5)
+    hist.labels("ok").observe(3)
+    requests = registry.register(Counter("requests_total", "Requests", ("route",)))
+    requests.labels('/a"b').inc(2)
+
+    text = registry.render()
+    assert '# TYPE probe_seconds histogram' in text
+    assert 'probe_seconds_bucket{outcome="ok",le="0.1"} 1' in text
+    assert 'probe_seconds_bucket{outcome="ok",le="1.0"} 2' in text
+    assert 'probe_seconds_bucket{outcome="ok",le="+Inf"} 3' in text
+    assert 'probe_seconds_sum{outcome="ok"} 3.55' in text
+    assert 'probe_seconds_count{outcome="ok"} 3' in text
+    assert 'requests_total{route="/a\\"b"} 2' in text
+
+
+def test_timed_decorator():
+    hist = Histogram("calls_seconds", "Call time", ("function",))
+
+    @hist.timed
+    def load_things():
+        return 42
+
+    assert load_things() == 42
+    assert load_things.__name__ == "load_things"
+    assert hist.labels("load_things").count == 1
+
+
+def test_middleware_route_labels():
+    """按路由模板统计，未匹配的路由记为 unmatched；SSE 等流式响应在响应头发出时记录"""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"id": item_id}
+
+    client = TestClient(app)
+    before = HTTP_REQUESTS.labels("GET", "/items/{item_id}", "200").value
+    for i in range(3):
+        assert client.get(f"/items/{i}").status_code == 200
+    assert client.get("/items/x").status_code == 422
+    assert client.get("/missing").status_code == 404
+
+    assert HTTP_REQUESTS.labels("GET", "/items/{item_id}", "200").value == before + 3
+    assert HTTP_REQUESTS.labels("GET", "/items/{item_id}", "422").value >= 1
+    assert HTTP_REQUESTS.labels("GET", "unmatched", "404").value >= 1
+    assert HTTP_SECONDS.labels("GET", "/items/{item_id}").count >= 4
@@ -0,0 +1,195 @@
+"""
+测试原生 asyncio SLP 探测 (minecraft_pinger.get_server_status)
+"""
+import asyncio
+import time
+
+from fake_slp import FakeSLPServer, FakeSLPFleet, make_status, OK, LOSS, TRUNCATE, RESET
+from src import minecraft_pinger
+from src.minecraft_pinger import get_server_status, get_server_motd, _motd_to_text, _probe_with_retries, PROBES
+
+
+def test_status_parsed():
+    """解析版本、MOTD、人数和延迟"""
+    async def run():
+        async with FakeSLPServer(make_status("Paper 1.20.4", "§a欢迎来玩", 3, 50)) as server:
+            status = await get_server_status("127.0.0.1", server.port)
+            motd = await get_server_motd("127.0.0.1", server.port)
+        return status, motd
+
+    status, motd = asyncio.run(run())
+    assert status["version"] == "Paper 1.20.4"
+    assert status["description"] == "§a欢迎来玩"
+    assert status["players_online"] == 3 and status["players_max"] == 50
+    assert status["latency"] >= 0
+    assert motd == "§a欢迎来玩"
+
+
+def test_json_motd_components():
+    """JSON 文本组件 (含 extra) 转为带格式代码的字符串"""
+    motd = {"text": "", "extra": [{"text": "Hello ", "color": "gold", "bold": True}, {"text": "World"}]}
+    assert _motd_to_text(motd) == "§6§lHello §rWorld"
+
+
+def test_no_ping_falls_back_to_status_latency():
+    """服务器不响应 Ping 时仍返回状态"""
+    async def run():
+        async with FakeSLPServer(answer_ping=False) as server:
+            return await get_server_status("127.0.0.1", server.port, timeout=0.3)
+
+    assert asyncio.run(run())["version"] == "1.20.1"
+
+
+def test_timeout_and_refused():
+    """响应过慢或端口未监听时返回 None"""
+    async def run():
+        async with FakeSLPServer(delay=1.0) as server:
+            slow = await get_server_status("127.0.0.1", server.port, timeout=0.2)
+        closed_port = server.port
+        refused = await get_server_status("127.0.0.1", closed_port, timeout=0.5)
+        return slow, refused
+
+    assert asyncio.run(run()) == (None, None)
+
+
+def test_many_concurrent_probes():
+    """单事件循环并发探测 1000 次，不依赖线程池"""
+    async def run():
+        async with FakeSLPServer(delay=0.05) as server:
+            start = time.perf_counter()
+            results = await asyncio.gather(*(get_server_status("127.0.0.1", server.port) for _ in range(1000)))
+            return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(run())
+    print(f"1000 concurrent probes: {elapsed:.2f}s")
+    assert all(results)
+    assert elapsed < 10
+
+
+def test_fault_outcomes():
+    """丢包判定为超时，截断帧和连接重置判定为连接错误，都返回 None"""
+    def count(outcome):
+        return PROBES.labels(outcome).value
+
+    async def run():
+        results = {}
+        for mode in (LOSS, TRUNCATE, RESET):
+            async with FakeSLPServer(faults=[mode]) as server:
+                results[mode] = await get_server_status("127.0.0.1", server.port, timeout=0.3)
+        return results
+
+    before = {outcome: count(outcome) for outcome in ("timeout", "refused")}
+    assert asyncio.run(run()) == {LOSS: None, TRUNCATE: None, RESET: None}
+    assert count("timeout") - before["timeout"] == 1
+    assert count("refused") - before["refused"] == 2
+
+
+def test_retry_backoff():
+    """稳健探测：前两次失败后第三次成功，两次重试之间分别退避 0.5 秒和 1 秒"""
+    async def run():
+        async with FakeSLPServer(make_status("1.20.4"), faults=[RESET, TRUNCATE]) as server:
+            status = await _probe_with_retries("127.0.0.1", server.port)
+            return status, server
+
+    status, server = asyncio.run(run())
+    assert status["version"] == "1.20.4"
+    assert server.connections == 3
+    assert server.outcomes == {OK: 1, LOSS: 0, TRUNCATE: 1, RESET: 1}
+    first, second, third = server.connection_times
+    assert 0.45 <= second - first < 0.9
+    assert 0.95 <= third - second < 1.5
+
+
+def test_fleet_mixed_faults():
+    """1000 个端点、不同版本和故障率：每个端点的探测结果与它实际采用的行为一致"""
+    def profile(i, rng):
+        return {"status": make_status(f"1.{16 + i % 5}", f"服务器 {i}", rng.randint(0, 20)),
+                "loss": 0.05, "truncate": 0.05, "reset": 0.05}
+
+    async def run():
+        async with FakeSLPFleet(1000, profile, seed=7) as fleet:
+            results = await asyncio.gather(*(get_server_status(host, port, timeout=0.5)
+                                             for host, port in fleet.endpoints))
+            return fleet, results
+
+    fleet, results = asyncio.run(run())
+    stats = fleet.stats()
+    assert stats["connections"] == 1000
+    assert 50 < stats["outcomes"][OK] < 1000
+    assert sum(1 for status in results if status) == stats["outcomes"][OK]
+    for i, (server, status) in enumerate(zip(fleet, results)):
+        if server.outcomes[OK]:
+            assert status["version"] == f"1.{16 + i % 5}"
+            assert status["players_online"] == server.status["players"]["online"]
+        else:
+            assert status is None
+
+    # 相同的种子得到相同的端点配置和故障序列
+    again = FakeSLPFleet(1000, profile, seed=7)
+    assert [s.status for s in again] == [s.status for s in fleet]
+    assert [s._next_mode() for s in again] == [mode for s in fleet for mode, n in s.outcomes.items() if n]
+
+
+def test_server_down_and_update():
+    """端点停止后探测失败，在同一端口恢复后返回更新后的状态"""
+    async def run():
+        server = FakeSLPServer(make_status("1.20.1", "旧的 MOTD"))
+        port = await server.start()
+        first = await get_server_status("127.0.0.1", port, timeout=0.3)
+        await server.stop()
+        down = await get_server_status("127.0.0.1", port, timeout=0.3)
+        server.update(version="1.21", motd="新的 MOTD", online=5)
+        await server.start(port=port)
+        try:
+            return first, down, await get_server_status("127.0.0.1", port, timeout=0.3)
+        finally:
+            await server.stop()
+
+    first, down, after = asyncio.run(run())
+    assert first["description"] == "旧的 MOTD"
+    assert down is None
+    assert (after["version"], after["description"], after["players_online"]) == ("1.21", "新的 MOTD", 5)
+
+
+def test_dns_cache_bounded_and_timed():
+    """解析缓存按主机名索引且有上限；慢解析受 timeout 约束，失败结果短暂缓存"""
+    lookups = []
+
+    async def fake_getaddrinfo(host, port, **kwargs):
+        lookups.append(host)
+        if host.startswith("slow"):
+            await asyncio.sleep(5)
+        if host.startswith("missing"):
+            raise OSError("no such host")
+        return [(None, None, None, "", ("10.0.0.1", 0))]
+
+    async def run():
+        asyncio.get_running_loop().getaddrinfo = fake_getaddrinfo
+        for i in range(20):
+            await minecraft_pinger._resolve(f"node{i}.example.com", 1)
+        # 同一主机不同端口共用一个条目
+        await minecraft_pinger._resolve("node19.example.com", 1)
+
+        start = time.perf_counter()
+        slow = await get_server_status("slow.example.com", 25565, timeout=0.2)
+        elapsed = time.perf_counter() - start
+        # 失败被缓存：再次探测不再发起解析
+        again = await get_server_status("slow.example.com", 25566, timeout=0.2)
+        missing = [await get_server_status("missing.example.com", 25565, timeout=0.2) for _ in range(2)]
+        return slow, elapsed, again, missing
+
+    saved_size = minecraft_pinger.DNS_CACHE_SIZE
+    minecraft_pinger.DNS_CACHE_SIZE = 10
+    minecraft_pinger._dns_cache.clear()
+    try:
+        slow, elapsed, again, missing = asyncio.run(run())
+        cached = list(minecraft_pinger._dns_cache)
+    finally:
+        minecraft_pinger.DNS_CACHE_SIZE = saved_size
+        minecraft_pinger._dns_cache.clear()
+
+    assert slow is None and elapsed < 0.5 and again is None
+    assert missing == [None, None]
+    assert lookups.count("node19.example.com") == 1
+    assert lookups.count("slow.example.com") == 1 and lookups.count("missing.example.com") == 1
+    assert len(cached) == 10 and "node0.example.com" not in cached
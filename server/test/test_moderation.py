@@ -0,0 +1,67 @@
+"""
+测试敏感词 Aho-Corasick 自动机
+"""
+import random
+
+from src.moderation import AhoCorasick, ContentModerator
+
+
+def _brute_force_all(text, patterns):
+    lower = text.lower()
+    found = set()
+    for p in dict.fromkeys(patterns):
+        key = p.lower()
+        if not key:
+            continue
+        start = lower.find(key)
+        while start != -1:
+            found.add((start, p))
+            start = lower.find(key, start + 1)
+    return found
+
+
+def test_basic_matching():
+    """中英文、大小写不敏感、重叠匹配"""
+    ac = AhoCorasick(["he", "she", "his", "hers", "外挂", "Hack"])
+    # "she" 与 "he" 在同一位置结束，取规则列表中靠前的 "he"
+    assert ac.search_first("ushers") == (2, "he")
+    assert sorted(ac.find_all("ushers")) == [(1, "she"), (2, "he"), (2, "hers")]
+    assert ac.search_first("免费外挂下载") == (2, "外挂")
+    assert ac.search_first("HACKED client") == (0, "Hack")
+    assert ac.search_first("普通的生存服务器") is None
+    assert AhoCorasick([]).search_first("anything") is None
+
+
+def test_find_all_matches_brute_force():
+    """随机规则与文本下，全部匹配结果与暴力查找一致"""
+    rng = random.Random(7)
+    alphabet = "abc中文"
+    patterns = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(60)]
+    ac = AhoCorasick(patterns)
+    for _ in range(200):
+        text = "".join(rng.choice(alphabet + "xyz") for _ in range(rng.randint(0, 40)))
+        assert set(ac.find_all(text)) == _brute_force_all(text, patterns)
+        first = ac.search_first(text)
+        assert (first is None) == (not _brute_force_all(text, patterns))
+
+
+def test_offsets_index_original_text():
+    """小写后变长的字符（如 'İ'）不会使匹配下标偏离原文"""
+    ac = AhoCorasick(["hack", "İzmir"])
+    text = "İİ hack"
+    assert ac.search_first(text) == (3, "hack")
+    assert text[3:3 + len("hack")] == "hack"
+    assert sorted(ac.find_all("İZMİR hack")) == [(0, "İzmir"), (6, "hack")]
+    assert ac.search_first("izmir") == (0, "İzmir")
+
+
+def test_moderator_uses_loaded_rules():
+    """ContentModerator 加载规则文件后可检测并返回位置"""
+    moderator = ContentModerator()
+    moderator.load_rules()
+    assert len(moderator.rules) > 0
+    word = moderator.rules[0]
+    assert moderator.check_text(f"欢迎来到{word}服务器") == word
+    assert (4, word) in moderator.find_matches(f"欢迎来到{word}服务器")
+    assert moderator.check_text("") is None
+    assert moderator.find_matches(None) == []
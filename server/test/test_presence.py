@@ -0,0 +1,81 @@
+"""
+测试软件在线状态 (PresenceTracker) 与 HyperLogLog
+"""
+import time
+
+from src import database
+from src.presence import HyperLogLog, PresenceTracker, PRESENCE_HOURLY_RETENTION_DAYS, PRESENCE_DAILY_RETENTION_DAYS
+
+
+def test_hyperloglog_estimate():
+    """估计误差在几个标准误差以内，重复元素不计数，合并等价于并集"""
+    a, b = HyperLogLog(), HyperLogLog()
+    for i in range(20000):
+        a.add(f"10.{i // 65536}.{(i // 256) % 256}.{i % 256}")
+        a.add(f"10.{i // 65536}.{(i // 256) % 256}.{i % 256}")
+    assert abs(a.count() - 20000) / 20000 < 0.05
+    for i in range(10000, 30000):
+        b.add(f"10.{i // 65536}.{(i // 256) % 256}.{i % 256}")
+    a.merge(b)
+    assert abs(a.count() - 30000) / 30000 < 0.05
+
+    small = HyperLogLog()
+    for ip in ("1.1.1.1", "2.2.2.2", "3.3.3.3"):
+        small.add(ip)
+    assert small.count() == 3
+    assert HyperLogLog.from_bytes(small.to_bytes()).count() == 3
+    assert len(HyperLogLog().to_bytes()) < 100
+
+
+def test_online_count_and_expiry():
+    """在线人数随心跳和超时即时变化"""
+    tracker = PresenceTracker(timeout=15)
+    now = time.time()
+    tracker.heartbeat("1.1.1.1", now)
+    tracker.heartbeat("2.2.2.2", now)
+    tracker.heartbeat("1.1.1.1", now + 10)
+    assert tracker.count(now + 10) == 2
+    assert tracker.count(now + 17) == 1
+    assert [u["client_ip"] for u in tracker.list_users()] == ["1.1.1.1"]
+    assert tracker.count(now + 27) == 0
+
+
+def test_stats_persist_and_restore(fresh_db):
+    """独立用户与峰值按小时/天统计，落库后重启合并计算"""
+    now = time.time()
+    tracker = PresenceTracker()
+    for ip in ("1.1.1.1", "2.2.2.2", "3.3.3.3"):
+        tracker.heartbeat(ip, now)
+    assert tracker.flush(now) == 2
+    assert tracker.flush(now) == 0
+
+    restarted = PresenceTracker()
+    assert restarted.load(now) == 2
+    restarted.heartbeat("4.4.4.4", now)
+    restarted.heartbeat("1.1.1.1", now)
+    stats = restarted.stats(hours=2, days=1, now=now)
+    assert stats["hourly"][0]["unique_users"] == 4
+    assert stats["hourly"][0]["peak_online"] == 3
+    assert stats["daily"][0]["unique_users"] == 4
+
+    # 时段结束后释放内存草图，统计仍可从数据库读取
+    restarted.flush(now)
+    restarted.flush(now + 86400 * 2)
+    assert restarted.stats(hours=1, days=3, now=now + 86400 * 2)["daily"][-1]["unique_users"] == 4
+
+
+def test_prune_retention(fresh_db):
+    """小时统计和天统计按各自的保留期删除"""
+    now = time.time()
+    tracker = PresenceTracker()
+    for days in (0, PRESENCE_HOURLY_RETENTION_DAYS + 1, PRESENCE_DAILY_RETENTION_DAYS + 1):
+        tracker.heartbeat("1.1.1.1", now - days * 86400)
+    tracker.flush(now)
+    assert len(database.load_presence_stats()) == 6
+
+    assert tracker.prune(now) == 3
+    buckets = [row["bucket"] for row in database.load_presence_stats()]
+    day = lambda days: time.strftime("%Y-%m-%d", time.localtime(now - days * 86400))
+    assert buckets == sorted([time.strftime("%Y-%m-%d %H", time.localtime(now)), day(0),
+                              day(PRESENCE_HOURLY_RETENTION_DAYS + 1)])
+    assert tracker.prune(now) == 0
@@ -0,0 +1,88 @@
+"""
+测试探测结果缓存 (ProbeCache) 的 single-flight 与 TTL
+"""
+import asyncio
+import time
+
+from fake_slp import FakeSLPServer
+from src.probe_cache import ProbeCache, probe_cache
+from src.minecraft_pinger import robust_get_server_status
+
+
+class _CountingProbe:
+    def __init__(self, result=None, latency=0.05):
+        self.calls = 0
+        self.result = result if result is not None else {"version": "1.20.1"}
+        self.latency = latency
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self.result
+
+
+def test_single_flight():
+    """并发调用只触发一次探测"""
+    cache = ProbeCache(ttl=10)
+    probe = _CountingProbe()
+
+    async def run():
+        return await asyncio.gather(*(cache.get("h", 1, probe) for _ in range(100)))
+
+    results = asyncio.run(run())
+    assert probe.calls == 1
+    assert all(r == {"version": "1.20.1"} for r in results)
+    assert cache.stats()["misses"] == 1 and cache.stats()["coalesced"] == 99
+
+
+def test_ttl_reuse_and_expiry():
+    """有效期内复用，过期后重新探测；失败结果同样缓存"""
+    cache = ProbeCache(ttl=0.2, failure_ttl=0.1)
+    ok = _CountingProbe(latency=0)
+    fail = _CountingProbe(result={}, latency=0)
+
+    async def run():
+        await cache.get("h", 1, ok)
+        await cache.get("h", 1, ok)
+        await cache.get("dead", 1, fail)
+        assert await cache.get("dead", 1, fail) == {}
+        await asyncio.sleep(0.25)
+        await cache.get("h", 1, ok)
+        await cache.get("dead", 1, fail)
+
+    asyncio.run(run())
+    assert ok.calls == 2
+    assert fail.calls == 2
+
+
+def test_caller_cancellation_does_not_cancel_probe():
+    """发起探测的调用方被取消，其余等待者仍拿到结果"""
+    cache = ProbeCache(ttl=10)
+    probe = _CountingProbe(latency=0.1)
+
+    async def run():
+        leader = asyncio.ensure_future(cache.get("h", 1, probe))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(cache.get("h", 1, probe))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(run()) == {"version": "1.20.1"}
+    assert probe.calls == 1
+
+
+def test_robust_status_shares_probe():
+    """大量心跳同时到达时，对同一端点只发起一次真实探测"""
+    probe_cache.clear()
+
+    async def run():
+        async with FakeSLPServer(delay=0.05) as server:
+            start = time.perf_counter()
+            results = await asyncio.gather(*(robust_get_server_status("127.0.0.1", server.port) for _ in range(500)))
+            return results, server.connections, time.perf_counter() - start
+
+    results, connections, elapsed = asyncio.run(run())
+    assert all(results)
+    assert connections == 1
+    print(f"500 concurrent callers, {connections} probe, {elapsed * 1000:.0f} ms")
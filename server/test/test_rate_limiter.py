@@ -0,0 +1,127 @@
+"""
+测试 GCRA 限流器 (RateLimiter) 与限流中间件
+"""
+import tracemalloc
+
+from src.rate_limiter import RateLimiter, RoutePolicy
+from src.security import ROUTE_POLICIES
+
+
+def test_burst_and_refill():
+    """窗口内允许 limit 次突发，之后按 window/limit 的速率恢复额度"""
+    limiter = RateLimiter(RoutePolicy("default", limit=10, window=60))
+    policy = limiter.default
+    assert all(limiter.check("1.1.1.1", policy, now=100.0) == 0 for _ in range(10))
+    retry = limiter.check("1.1.1.1", policy, now=100.0)
+    assert 5.9 < retry <= 6.0
+    # 被拒绝的请求不消耗额度
+    assert limiter.check("1.1.1.1", policy, now=105.0) > 0
+    assert limiter.check("1.1.1.1", policy, now=106.0) == 0
+    assert limiter.check("1.1.1.1", policy, now=106.0) > 0
+    # 其它 IP 互不影响；长时间空闲后恢复满额度
+    assert limiter.check("2.2.2.2", policy, now=106.0) == 0
+    assert all(limiter.check("1.1.1.1", policy, now=1000.0) == 0 for _ in range(10))
+
+
+def test_route_policies():
+    """最长前缀优先；同名策略共享额度，cost 按倍数消耗"""
+    limiter = RateLimiter(RoutePolicy("default", 60, 60, ban_minutes=10), ROUTE_POLICIES)
+    assert limiter.policy_for("POST", "/api/lobby/rooms").name == "heartbeat"
+    assert limiter.policy_for("GET", "/api/lobby/rooms").name == "lobby_read"
+    assert limiter.policy_for("GET", "/api/lobby/rooms/search").cost == 2
+    assert limiter.policy_for("DELETE", "/api/admin/rules/1").name == "admin"
+    assert limiter.policy_for("GET", "/").name == "default"
+
+    search = limiter.policy_for("GET", "/api/lobby/rooms/search")
+    rooms = limiter.policy_for("GET", "/api/lobby/rooms")
+    assert all(limiter.check("1.1.1.1", search, now=0.0) == 0 for _ in range(30))
+    assert limiter.check("1.1.1.1", rooms, now=0.0) > 0
+    # 其它策略组的额度不受影响
+    assert limiter.check("1.1.1.1", limiter.default, now=0.0) == 0
+
+    limiter.reset("1.1.1.1")
+    assert len(limiter) == 0
+    assert limiter.check("1.1.1.1", rooms, now=0.0) == 0
+
+
+def test_lru_eviction():
+    """超出容量时淘汰最久未访问的条目，活跃的超限者保留在表中"""
+    limiter = RateLimiter(RoutePolicy("default", limit=2, window=60), max_keys=3)
+    policy = limiter.default
+    limiter.check("abuser", policy, now=0.0)
+    limiter.check("abuser", policy, now=0.0)
+    for i in range(10):
+        assert limiter.check(f"10.0.0.{i}", policy, now=0.0) == 0
+        assert limiter.check("abuser", policy, now=0.0) > 0
+    assert len(limiter) == 3
+    assert limiter.stats() == {"keys": 3, "max_keys": 3, "evicted": 8}
+
+
+def test_memory_ceiling_with_1m_ips():
+    """100 万个不同 IP 各请求一次，状态表条目数和内存都有上限"""
+    max_keys = 50000
+    limiter = RateLimiter(RoutePolicy("default", limit=60, window=60), max_keys=max_keys)
+    policy = limiter.default
+
+    tracemalloc.start()
+    try:
+        for i in range(1_000_000):
+            limiter.check(f"{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}.{i >> 24}", policy, now=i * 1e-4)
+            if i == 2 * max_keys:
+                filled, _ = tracemalloc.get_traced_memory()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert len(limiter) == max_keys
+    assert limiter.evicted == 1_000_000 - max_keys
+    # 填满之后内存不再增长；峰值包含哈希表扩容时新旧表并存的瞬时开销
+    # （每条含 IP 字符串、键元组和 LRU 链表节点约 420 字节）
+    assert current - filled < max_keys * 10
+    assert peak < max_keys * 600
+
+
+def test_middleware_policies(fresh_db, clean_auto_bans):
+    """读接口超限返回 429 + Retry-After；心跳接口超限封禁"""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from src.security import RateLimitMiddleware, auto_bans, reload_rules
+
+    reload_rules()
+    auto_bans.load()
+
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware, limit=60, window=60)
+
+    @app.get("/api/lobby/rooms")
+    async def rooms():
+        return {"success": True}
+
+    @app.post("/api/lobby/heartbeat")
+    async def heartbeat():
+        return {"success": True}
+
+    client = TestClient(app)
+    assert all(client.get("/api/lobby/rooms").status_code == 200 for _ in range(60))
+    response = client.get("/api/lobby/rooms")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert not auto_bans.is_banned("testclient")
+
+    assert all(client.post("/api/lobby/heartbeat").status_code == 200 for _ in range(60))
+    assert client.post("/api/lobby/heartbeat").status_code == 403
+    assert auto_bans.is_banned("testclient")
+    assert client.get("/api/lobby/rooms").status_code == 403
+
+
+def test_scope_ip():
+    """纯 ASGI 中间件直接从 scope 取真实 IP，规则与 get_effective_ip 一致"""
+    from src.utils import get_scope_ip
+
+    scope = {"client": ("10.0.0.1", 5000), "headers": []}
+    assert get_scope_ip(scope) == "10.0.0.1"
+    scope["headers"] = [(b"x-real-ip", b"2.2.2.2")]
+    assert get_scope_ip(scope) == "2.2.2.2"
+    scope["headers"].append((b"x-forwarded-for", b"1.1.1.1, 172.16.0.1"))
+    assert get_scope_ip(scope) == "1.1.1.1"
+    assert get_scope_ip({"client": None, "headers": []}) == "127.0.0.1"
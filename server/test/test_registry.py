@@ -0,0 +1,195 @@
+"""
+测试内存房间/隧道注册表 (RoomRegistry / TunnelRegistry) 与时间轮
+"""
+import time
+
+from src import database
+from src.registry import RoomRegistry, TunnelRegistry
+from src.timer_wheel import TimerWheel
+from src.utils import etag_matches
+
+
+def test_timer_wheel_expiry_and_reschedule():
+    """到期的 key 在截止 tick 结束后返回，续期后不会提前过期"""
+    wheel = TimerWheel(tick=1.0, slots=8, now=100)
+    wheel.schedule("a", 105)
+    wheel.schedule("b", 103)
+    assert wheel.advance(103.5) == []
+    assert wheel.advance(104.1) == [("b", 103)]
+    wheel.schedule("a", 120)  # 续期，超过一圈
+    assert wheel.advance(110) == []
+    assert "a" in wheel and wheel.deadline("a") == 120
+    assert wheel.advance(121) == [("a", 120)]
+    assert len(wheel) == 0
+    assert not wheel.cancel("a")
+
+
+def test_room_expires_on_time(make_room):
+    """房间在超时后的下一个 tick 被移除，而不是等待分钟级清理"""
+    registry = RoomRegistry(timeout=10)
+    now = time.time()
+    registry.upsert(make_room(), "1.2.3.4")
+    assert registry.expire(now + 5) == 0
+    assert len(registry.list_public()) == 1
+    assert registry.expire(now + 12) == 1
+    assert registry.list_public() == []
+    assert not registry.check_ip_conflict("1.2.3.4", "25566_1")
+
+
+def test_room_upsert_keeps_probed_version(make_room):
+    """心跳不会覆盖服务端探测到的版本和描述"""
+    registry = RoomRegistry()
+    registry.upsert(make_room(), "1.2.3.4")
+    assert registry.update_status("25565_1", "1.21", "探测到的MOTD")
+    info = registry.upsert(make_room(player_count=3, game_version="1.20.1"), "1.2.3.4")
+    assert info.game_version == "1.21"
+    assert info.description == "探测到的MOTD"
+    assert info.player_count == 3
+
+
+def test_ip_conflict_index(make_room):
+    """同一IP开设第二个房间被视为多开；房间删除后释放"""
+    registry = RoomRegistry()
+    registry.upsert(make_room(), "1.2.3.4")
+    assert registry.check_ip_conflict("1.2.3.4", "25566_1")
+    assert not registry.check_ip_conflict("1.2.3.4", "25565_1")
+    assert not registry.check_ip_conflict("5.6.7.8", "25566_1")
+    assert registry.delete(25565, 1)
+    assert not registry.delete(25565, 1)
+    assert not registry.check_ip_conflict("1.2.3.4", "25566_1")
+
+
+def test_flush_and_restore(fresh_db, make_room):
+    """flush 只写变化，重启后从快照恢复，删除同步到数据库"""
+    registry = RoomRegistry()
+    registry.upsert(make_room(), "1.2.3.4")
+    registry.upsert(make_room(port=25566, is_public=False), "5.6.7.8")
+    assert registry.flush() == 2
+    assert registry.flush() == 0
+
+    restored = RoomRegistry()
+    assert restored.load() == 2
+    assert [r.full_room_code for r in restored.list_public()] == ["25565_1"]
+    assert restored.check_ip_conflict("5.6.7.8", "25567_1")
+
+    restored.delete(25565, 1)
+    assert restored.flush() == 1
+    assert [r.full_room_code for r in database.load_rooms()] == ["25566_1"]
+
+    tunnels = TunnelRegistry()
+    tunnels.upsert("1.2.3.4", "frp.example.com", 25565)
+    tunnels.flush()
+    restored_tunnels = TunnelRegistry()
+    assert restored_tunnels.load() == 1
+    assert restored_tunnels.list_active()[0]["client_ip"] == "1.2.3.4"
+    assert restored_tunnels.expire(time.time() + 60) == 1
+    restored_tunnels.flush()
+    assert database.load_tunnels() == []
+
+
+def test_snapshot_rows_are_isolated_and_restored_on_failure(fresh_db, make_room):
+    """快照行在事件循环线程生成，之后的修改不影响它；写入失败时变化被重新标记"""
+    registry = RoomRegistry()
+    registry.upsert(make_room(), "1.2.3.4")
+    snapshot = registry.snapshot()
+    assert registry.snapshot() is None
+
+    # 快照之后（写入线程运行期间）的修改不会混入快照，会进入下一次快照
+    registry.update_status("25565_1", "1.21", "新的 MOTD")
+    rows, removed = snapshot
+    assert rows[0][4] == "未知版本" and removed == []
+
+    def fail(rows, removed_keys):
+        raise RuntimeError("database is locked")
+
+    registry._persist = fail
+    registry.delete(25565, 1)
+    registry.upsert(make_room(port=25566), "5.6.7.8")
+    failed = registry.snapshot()
+    try:
+        registry.write_snapshot(failed)
+    except RuntimeError:
+        registry.restore_snapshot(failed)
+    assert registry.flush() == 0
+    del registry._persist
+
+    assert registry.flush() == 2
+    assert [r.full_room_code for r in database.load_rooms()] == ["25566_1"]
+
+
+def test_list_version_ignores_plain_heartbeats(make_room):
+    """列表版本只在可见内容变化时递增，纯心跳不改变 ETag"""
+    registry = RoomRegistry()
+    etag = registry.etag
+    registry.upsert(make_room(), "1.2.3.4")
+    assert registry.etag != etag
+    etag = registry.etag
+    registry.upsert(make_room(), "1.2.3.4")
+    assert registry.etag == etag
+    registry.upsert(make_room(player_count=2), "1.2.3.4")
+    assert registry.etag != etag
+
+    # 私有房间的变化不影响公开列表
+    etag = registry.etag
+    registry.upsert(make_room(port=25566, is_public=False), "5.6.7.8")
+    registry.update_status("25566_1", "1.21", "MOTD")
+    assert registry.etag == etag
+
+    registry.update_status("25565_1", "1.21", "MOTD")
+    assert registry.etag != etag
+    etag = registry.etag
+    registry.update_status("25565_1", "1.21", "MOTD")
+    assert registry.etag == etag
+    registry.delete(25565, 1)
+    assert registry.etag != etag
+
+
+def test_etag_matches():
+    """If-None-Match 按弱比较匹配"""
+    assert etag_matches('W/"abc-1"', 'W/"abc-1"')
+    assert etag_matches('"abc-1"', 'W/"abc-1"')
+    assert etag_matches('"x", W/"abc-1"', 'W/"abc-1"')
+    assert etag_matches('*', 'W/"abc-1"')
+    assert not etag_matches('W/"abc-2"', 'W/"abc-1"')
+    assert not etag_matches(None, 'W/"abc-1"')
+
+
+def test_extend_holds_room_until_probe_finishes(make_room):
+    """房主心跳的探测进行中，房间不会在超时后被过期；其它 IP 不能推迟房间过期"""
+    registry = RoomRegistry(timeout=10)
+    now = time.time()
+    registry.upsert(make_room(), "1.2.3.4")
+    assert not registry.extend("25565_1", "5.6.7.8", 40, now=now + 5)
+    assert not registry.extend("25566_1", "1.2.3.4", 40, now=now + 5)
+    version, _ = registry.version, registry.snapshot()
+    assert registry.extend("25565_1", "1.2.3.4", 40, now=now + 5)
+    assert registry.version == version and registry.snapshot() is None
+    assert registry.expire(now + 20) == 0
+    assert registry.expire(now + 47) == 1
+
+
+def test_slow_probe_does_not_expire_room(fresh_db, clean_auto_bans, make_room, monkeypatch):
+    """心跳的探测耗时超过房间超时（最慢约 11.5s 以上）时，房间不会先被移除再重新加入"""
+    from fastapi.testclient import TestClient
+    from src import main
+
+    registry = RoomRegistry(timeout=10)
+    monkeypatch.setattr(main, "room_registry", registry)
+    room = make_room()
+    registry.upsert(room, "testclient")
+    events = []
+    registry.listeners.append(lambda version, code: events.append((code, code in registry)))
+
+    async def slow_probe(host, port):
+        # 模拟探测期间时间流逝：时间轮推进到心跳之后 11.5 秒
+        assert registry.expire(time.time() + 11.5) == 0
+        return {"version": "1.21", "description": ""}
+
+    async def no_motd(host, port):
+        return None
+
+    monkeypatch.setattr(main, "robust_get_server_status", slow_probe)
+    monkeypatch.setattr(main, "get_server_motd", no_motd)
+    response = TestClient(main.app).post("/api/lobby/rooms", json=room.model_dump())
+    assert response.json()["success"] is True
+    assert "25565_1" in registry and events == []
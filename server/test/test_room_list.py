@@ -0,0 +1,109 @@
+"""
+测试房间列表预序列化缓存 (RoomListCache)
+"""
+import gzip
+import json
+
+from src.registry import RoomRegistry
+from src.room_list import RoomListCache
+
+
+def test_snapshot_reused_until_version_changes(make_room):
+    """同一列表版本复用同一份字节，可见变化后重新生成"""
+    registry = RoomRegistry()
+    cache = RoomListCache(registry)
+    registry.upsert(make_room(), "192.168.1.100")
+
+    first = cache.get()
+    data = json.loads(first.body)
+    assert data["success"] and data["rooms"][0]["host_ip"] == "192.168.1.***"
+    assert "client_ip" not in data["rooms"][0]
+    assert first.etag == registry.etag
+
+    registry.upsert(make_room(), "192.168.1.100")  # 纯心跳
+    assert cache.get() is first
+
+    registry.upsert(make_room(port=25566, is_public=False), "10.0.0.1")  # 私有房间
+    assert cache.get() is first
+
+    registry.upsert(make_room(player_count=5), "192.168.1.100")
+    second = cache.get()
+    assert second is not first and json.loads(second.body)["rooms"][0]["player_count"] == 5
+    assert cache.stats()["builds"] == 2 and cache.stats()["hits"] == 2
+
+
+def test_gzip_variant_only_for_large_lists(make_room):
+    """小响应不压缩，大响应附带等价的 gzip 版本"""
+    registry = RoomRegistry()
+    cache = RoomListCache(registry, gzip_min_size=1024)
+    registry.upsert(make_room(), "1.2.3.4")
+    assert cache.get().gzip_body is None
+
+    for i in range(30):
+        registry.upsert(make_room(port=26000 + i), f"10.0.0.{i}")
+    snapshot = cache.get()
+    assert snapshot.gzip_body is not None
+    assert gzip.decompress(snapshot.gzip_body) == snapshot.body
+    assert len(json.loads(snapshot.body)["rooms"]) == 31
+
+
+def test_delta_since_version(make_room):
+    """增量只包含 since 之后的变化，并为移除或转私有的房间返回墓碑"""
+    registry = RoomRegistry()
+    cache = RoomListCache(registry)
+    registry.upsert(make_room(), "1.2.3.4")
+    registry.upsert(make_room(port=25566), "5.6.7.8")
+    base = json.loads(cache.get().body)
+    assert base["full"] and len(base["rooms"]) == 2
+
+    delta = json.loads(cache.delta(base["version"]))
+    assert not delta["full"] and delta["rooms"] == [] and delta["removed"] == []
+
+    registry.upsert(make_room(player_count=4), "1.2.3.4")
+    registry.upsert(make_room(port=25566, is_public=False), "5.6.7.8")
+    registry.upsert(make_room(port=25567), "9.9.9.9")
+    delta = json.loads(cache.delta(base["version"]))
+    assert delta["version"] == registry.version
+    assert sorted(r["full_room_code"] for r in delta["rooms"]) == ["25565_1", "25567_1"]
+    assert delta["removed"] == ["25566_1"]
+
+    registry.delete(25567, 1)
+    delta = json.loads(cache.delta(base["version"]))
+    assert [r["full_room_code"] for r in delta["rooms"]] == ["25565_1"]
+    assert sorted(delta["removed"]) == ["25566_1", "25567_1"]
+
+
+def test_snapshot_covers_every_public_room(make_room):
+    """完整列表不截断：在完整列表之上应用增量，结果与新的完整列表一致"""
+    registry = RoomRegistry()
+    cache = RoomListCache(registry)
+    for i in range(150):
+        registry.upsert(make_room(port=26000 + i), f"10.0.{i // 256}.{i % 256}")
+    base = json.loads(cache.get().body)
+    assert len(base["rooms"]) == 150
+
+    # 最早心跳的房间（若截断为前 100 个则不在列表中）发生变化或被移除
+    registry.upsert(make_room(port=26000, player_count=7), "10.0.0.0")
+    registry.delete(26001, 1)
+    delta = json.loads(cache.delta(base["version"]))
+    rooms = {room["full_room_code"]: room for room in base["rooms"]}
+    for code in delta["removed"]:
+        rooms.pop(code, None)
+    rooms.update((room["full_room_code"], room) for room in delta["rooms"])
+    current = json.loads(cache.get().body)["rooms"]
+    assert rooms == {room["full_room_code"]: room for room in current}
+
+
+def test_delta_falls_back_when_too_far_behind(make_room):
+    """since 超出变更日志范围（或来自其他进程）时要求完整列表"""
+    import src.registry as registry_module
+    registry = RoomRegistry()
+    cache = RoomListCache(registry)
+    start = registry.version
+    assert cache.delta(start - 1) is None
+    assert cache.delta(registry.version + 1) is None
+
+    for i in range(registry_module.CHANGE_LOG_SIZE + 1):
+        registry.upsert(make_room(port=30000 + i), "1.2.3.4")
+    assert cache.delta(start) is None
+    assert cache.delta(registry.version - 10) is not None
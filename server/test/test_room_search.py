@@ -0,0 +1,62 @@
+"""
+测试公开房间检索索引 (RoomSearchIndex)
+"""
+from src.registry import RoomRegistry
+from src.room_search import RoomSearchIndex
+
+
+def _codes(rooms):
+    return [room.full_room_code for room in rooms]
+
+
+def _setup(make_room):
+    registry = RoomRegistry()
+    index = RoomSearchIndex(registry)
+    registry.upsert(make_room(25565, room_name="生存服务器", description="Vanilla survival",
+                               game_version="1.20.1", player_count=5), "10.0.0.1")
+    registry.upsert(make_room(25566, room_name="空岛生存", description="SkyBlock",
+                               game_version="1.21", player_count=2), "10.0.0.2")
+    registry.upsert(make_room(25567, node_id=2, room_name="创造建筑", description="Creative build",
+                               game_version="1.20.1", player_count=9), "10.0.0.3")
+    registry.upsert(make_room(25568, room_name="生存服务器 私有", is_public=False), "10.0.0.4")
+    return registry, index
+
+
+def test_text_and_exact_filters(make_room):
+    """名称/简介匹配（中文子串、英文前缀），版本和节点精确过滤，私有房间不可见"""
+    registry, index = _setup(make_room)
+    assert sorted(_codes(index.search("生存")[0])) == ["25565_1", "25566_1"]
+    assert _codes(index.search("生存服务器")[0]) == ["25565_1"]
+    assert _codes(index.search("服器")[0]) == []
+    assert _codes(index.search("surv")[0]) == ["25565_1"]
+    assert _codes(index.search("SKYBLOCK")[0]) == ["25566_1"]
+    assert sorted(_codes(index.search(game_version="1.20.1")[0])) == ["25565_1", "25567_2"]
+    assert _codes(index.search("build", node_id=2)[0]) == ["25567_2"]
+    assert _codes(index.search("build", node_id=1)[0]) == []
+
+
+def test_incremental_updates(make_room):
+    """房间变化、删除后索引同步更新；未经钩子的变化触发重建"""
+    registry, index = _setup(make_room)
+    assert _codes(index.search("空岛")[0]) == ["25566_1"]
+    registry.upsert(make_room(25566, room_name="空岛战争", description="SkyWars",
+                               game_version="1.21", player_count=2), "10.0.0.2")
+    assert _codes(index.search("战争")[0]) == ["25566_1"]
+    registry.delete(25566, 1)
+    assert _codes(index.search("空岛")[0]) == []
+
+    registry.version += 1  # 模拟从快照恢复
+    registry.upsert(make_room(25569, room_name="小游戏"), "10.0.0.5")
+    assert _codes(index.search("小游戏")[0]) == ["25569_1"]
+
+
+def test_sort_and_keyset_pagination(make_room):
+    """按人数倒序分页，游标之后的页面不重复不遗漏"""
+    registry, index = _setup(make_room)
+    page, cursor = index.search(sort="players", limit=2)
+    assert _codes(page) == ["25567_2", "25565_1"] and cursor
+    page, cursor = index.search(sort="players", limit=2, cursor=cursor)
+    assert _codes(page) == ["25566_1"] and cursor is None
+
+    page, _ = index.search(limit=10)
+    assert _codes(page)[0] == "25567_2"  # 最近一次心跳
@@ -0,0 +1,180 @@
+"""
+测试多进程共享状态 (SharedState)：限流额度、自动封禁、规则版本
+"""
+import asyncio
+import multiprocessing
+
+from src.ban_table import BanTable
+from src.rate_limiter import RateLimiter, RoutePolicy
+from src.shared_state import SharedState, BUCKET
+from src.lobby_mirror import LobbyMirror
+from src.registry import RoomRegistry
+from src.room_list import RoomListCache
+from src.room_search import RoomSearchIndex
+from src.security import WorkerRouteGuard
+
+
+def test_shared_rate_limit():
+    """两个连接到同一段共享内存的限流器共用额度，语义与进程内限流器一致"""
+    state = SharedState.create(rate_slots=1024, ban_slots=64)
+    other = SharedState.attach(state.name)
+    try:
+        policy = RoutePolicy("default", limit=10, window=60)
+        a = RateLimiter(policy, shared=state)
+        b = RateLimiter(policy, shared=other)
+        allowed = [(a if i % 2 else b).check("1.1.1.1", policy, now=100.0) == 0 for i in range(12)]
+        assert allowed.count(True) == 10
+        assert 5.9 < b.check("1.1.1.1", policy, now=100.0) <= 6.0
+        assert a.check("1.1.1.1", policy, now=106.0) == 0
+        assert a.check("2.2.2.2", policy, now=106.0) == 0
+
+        b.reset("1.1.1.1")
+        assert a.check("1.1.1.1", policy, now=106.0) == 0
+    finally:
+        other.close()
+        state.close()
+
+
+def test_shared_table_is_bounded():
+    """桶满时替换最早到期的条目，表大小固定"""
+    state = SharedState.create(rate_slots=BUCKET, ban_slots=BUCKET)
+    try:
+        for i in range(100):
+            assert state.gcra(f"10.0.0.{i} default", 1.0, 60.0, now=float(i)) == 0
+        # 只有最近的 BUCKET 个键还在表中
+        assert state.gcra("10.0.0.99 default", 60.0, 60.0, now=99.0) > 0
+        assert state.gcra("10.0.0.0 default", 60.0, 60.0, now=99.0) == 0
+    finally:
+        state.close()
+
+
+def test_shared_bans_and_rules_version(fresh_db):
+    state = SharedState.create(rate_slots=64, ban_slots=64)
+    other = SharedState.attach(state.name)
+    try:
+        a, b = BanTable(state), BanTable(other)
+        a.ban("3.3.3.3", duration_minutes=10)
+        assert b.is_banned("3.3.3.3")
+        assert not b.is_banned("4.4.4.4")
+        # 命中后缓存到本地表
+        assert len(b) == 1
+
+        assert other.rules_version == 0
+        state.bump_rules_version()
+        assert other.rules_version == 1
+    finally:
+        other.close()
+        state.close()
+
+
+def _worker(name, results):
+    state = SharedState.attach(name)
+    policy = RoutePolicy("default", limit=1000, window=3600)
+    limiter = RateLimiter(policy, shared=state)
+    results.put(sum(limiter.check("5.5.5.5", policy) == 0 for _ in range(600)))
+    state.close()
+
+
+def test_shared_across_processes():
+    """多个进程并发消耗同一个 IP 的额度，放行总数等于额度"""
+    state = SharedState.create(rate_slots=1024, ban_slots=64)
+    try:
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        procs = [ctx.Process(target=_worker, args=(state.name, results)) for _ in range(4)]
+        for proc in procs:
+            proc.start()
+        allowed = sum(results.get(timeout=60) for _ in procs)
+        for proc in procs:
+            proc.join()
+        assert allowed == 1000
+    finally:
+        state.close()
+
+
+def test_lobby_mirror(make_room):
+    """从进程装入主进程发布的房间镜像：列表、ETag 和检索与主进程一致；镜像超出容量时保留上一份"""
+    state = SharedState.create(rate_slots=64, ban_slots=64, lobby_bytes=4096)
+    other = SharedState.attach(state.name)
+    try:
+        primary, secondary = RoomRegistry(), RoomRegistry()
+        publisher = LobbyMirror(primary, state, primary=True)
+        mirror = LobbyMirror(secondary, other, primary=False)
+        assert not mirror.sync()
+
+        for port, name, public in ((25565, "生存服务器", True), (25566, "空岛生存", True), (25567, "私人房间", False)):
+            primary.upsert(make_room(port, room_name=name, is_public=public), f"10.0.0.{port % 256}")
+        assert publisher.publish() and not publisher.publish()
+        assert mirror.sync() and not mirror.sync()
+
+        assert secondary.etag == primary.etag and len(secondary) == 2
+        assert RoomListCache(secondary).get().body == RoomListCache(primary).get().body
+        rooms, _ = RoomSearchIndex(secondary).search("空岛")
+        assert [room.full_room_code for room in rooms] == ["25566_1"]
+        # 镜像中之前的版本号一律改发完整列表
+        assert secondary.changes_since(primary.version - 1) is None
+
+        primary.delete(25565, 1)
+        for port in range(30000, 30040):
+            primary.upsert(make_room(port, room_name="大量房间", host_player="Alex"), f"10.1.0.{port % 256}")
+        assert not publisher.publish()
+        assert not mirror.sync() and len(secondary) == 2
+    finally:
+        other.close()
+        state.close()
+
+
+def test_secondary_before_first_publish(fresh_db, monkeypatch):
+    """主进程首次发布前，从进程的大厅读接口返回 503，而不是以自己的版本号返回空列表"""
+    from fastapi.testclient import TestClient
+    from src import main
+
+    state = SharedState.create(rate_slots=64, ban_slots=64, lobby_bytes=4096)
+    other = SharedState.attach(state.name)
+    try:
+        secondary = RoomRegistry()
+        mirror = LobbyMirror(secondary, other, primary=False)
+        monkeypatch.setattr(main, "room_registry", secondary)
+        monkeypatch.setattr(main, "room_list_cache", RoomListCache(secondary))
+        monkeypatch.setattr(main, "room_search", RoomSearchIndex(secondary))
+        monkeypatch.setattr(main, "lobby_mirror", mirror)
+        client = TestClient(main.app)
+
+        assert not mirror.sync() and not mirror.ready
+        response = client.get("/api/lobby/rooms")
+        assert response.status_code == 503 and response.headers["Retry-After"] == "1"
+        assert "ETag" not in response.headers
+        assert client.get("/api/lobby/rooms/search", params={"q": "空岛"}).status_code == 503
+
+        # 主进程没有房间时的首次发布同样让从进程就绪，ETag 与主进程一致
+        primary = RoomRegistry()
+        assert LobbyMirror(primary, state, primary=True).publish()
+        response = client.get("/api/lobby/rooms")
+        assert response.status_code == 200 and mirror.ready
+        assert response.headers["ETag"] == primary.etag and response.json()["rooms"] == []
+    finally:
+        other.close()
+        state.close()
+
+
+def test_worker_route_guard():
+    """从进程只放行镜像支持的大厅读路由"""
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def status(method, path):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        await WorkerRouteGuard(app)({"type": "http", "method": method, "path": path}, None, send)
+        return sent[0]["status"]
+
+    async def run():
+        return [await status(method, path) for method, path in (
+            ("GET", "/api/lobby/rooms"), ("GET", "/api/lobby/rooms/search"), ("POST", "/api/lobby/rooms"),
+            ("GET", "/api/lobby/events"), ("GET", "/api/admin/stats"), ("GET", "/api/check_access"))]
+
+    assert asyncio.run(run()) == [200, 200, 421, 421, 421, 200]
@@ -0,0 +1,159 @@
+"""
+测试并发版本探测扫描 (VersionSweeper)
+"""
+import asyncio
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+from src.version_sweep import VersionSweeper, ProbeScheduler
+
+
+def _rooms(count, hosts):
+    return [SimpleNamespace(full_room_code=f"{20000 + i}_1", remote_port=20000 + i, node_id=1,
+                            server_addr=f"node{i % hosts}.example.com") for i in range(count)]
+
+
+class _ProbeRecorder:
+    """记录每个节点的并发数与探测开始时间"""
+
+    def __init__(self, latency=0.05, fail_ports=()):
+        self.latency = latency
+        self.fail_ports = set(fail_ports)
+        self.active = defaultdict(int)
+        self.max_active = defaultdict(int)
+        self.total_active = 0
+        self.max_total = 0
+        self.starts = defaultdict(list)
+
+    async def __call__(self, host, port):
+        self.starts[host].append(time.monotonic())
+        self.active[host] += 1
+        self.total_active += 1
+        self.max_active[host] = max(self.max_active[host], self.active[host])
+        self.max_total = max(self.max_total, self.total_active)
+        await asyncio.sleep(self.latency)
+        self.active[host] -= 1
+        self.total_active -= 1
+        if port in self.fail_ports:
+            return None
+        return {"version": "1.20.1", "description": "hi"}
+
+
+def test_sweep_respects_limits():
+    """全局与单节点并发上限、单节点探测间隔均被遵守"""
+    probe = _ProbeRecorder(latency=0.05)
+    results = []
+
+    async def on_result(room, status):
+        results.append((room.full_room_code, status))
+
+    sweeper = VersionSweeper(on_result, concurrency=8, per_host_concurrency=2,
+                             per_host_interval=0.02, probe=probe)
+    stats = asyncio.run(sweeper.sweep(_rooms(60, hosts=5)))
+
+    assert stats["rooms"] == 60 and stats["ok"] == 60
+    assert len(results) == 60
+    assert probe.max_total <= 8
+    assert max(probe.max_active.values()) <= 2
+    for starts in probe.starts.values():
+        gaps = [b - a for a, b in zip(starts, starts[1:])]
+        assert min(gaps) >= 0.015
+    # 串行实现需要 60 * (0.05 + 0.5) 秒
+    assert stats["duration"] < 2.0
+
+
+def test_stats_and_failures():
+    """统计成功率与排队数，失败的探测以 None 回调"""
+    probe = _ProbeRecorder(latency=0.01, fail_ports={20000, 20001})
+    failed = []
+
+    async def on_result(room, status):
+        if status is None:
+            failed.append(room.remote_port)
+
+    sweeper = VersionSweeper(on_result, per_host_interval=0, probe=probe)
+    asyncio.run(sweeper.sweep(_rooms(10, hosts=2)))
+    stats = sweeper.stats()
+    assert sorted(failed) == [20000, 20001]
+    assert stats["sweeps"] == 1
+    assert stats["probes_total"] == 10 and stats["probes_ok"] == 8
+    assert stats["last_sweep_success_rate"] == 0.8
+    assert stats["queue_depth"] == 0 and stats["in_flight"] == 0
+
+
+def _status(version="1.20.1", online=0):
+    return {"version": version, "description": "hi", "players_online": online, "players_max": 20}
+
+
+def test_scheduler_backoff_and_reset():
+    """新房间立即到期；结果不变时间隔翻倍直到上限，结果变化（含人数、成败）时重置"""
+    scheduler = ProbeScheduler(min_interval=30, max_interval=200)
+    room = _rooms(1, hosts=1)[0]
+    code = room.full_room_code
+    scheduler.sync([room], now=0)
+    assert scheduler.due(now=0) == [room]
+    assert scheduler.due(now=0) == []
+
+    now = 0
+    intervals = []
+    for status in [_status()] * 5:
+        assert scheduler.observe(code, status, now=now) == (not intervals)
+        next_at = scheduler.next_due()
+        intervals.append(next_at - now)
+        assert scheduler.due(now=next_at - 1) == []
+        assert scheduler.due(now=next_at) == [room]
+        now = next_at
+    assert intervals == [30, 60, 120, 200, 200]
+
+    assert scheduler.observe(code, _status(online=3), now=now) is True
+    assert scheduler.next_due() == now + 30
+    assert scheduler.observe(code, _status(online=3), now=now) is False
+    assert scheduler.next_due() == now + 60
+    assert scheduler.observe(code, None, now=now) is True
+    assert scheduler.next_due() == now + 30
+    stats = scheduler.stats()
+    assert stats["rooms"] == 1 and stats["probes"] == 8 and stats["changed"] == 3
+
+
+def test_scheduler_sync_and_limit():
+    """消失的房间不再调度；每轮最多取出 limit 个，按到期先后"""
+    scheduler = ProbeScheduler(min_interval=30)
+    rooms = _rooms(10, hosts=2)
+    scheduler.sync(rooms, now=0)
+    first = scheduler.due(now=0, limit=4)
+    assert len(first) == 4
+    scheduler.sync(rooms[5:], now=1)
+    rest = scheduler.due(now=1)
+    assert {r.full_room_code for r in rest} == {r.full_room_code for r in rooms[5:]} - \
+        {r.full_room_code for r in first}
+    assert len(scheduler) == 5
+    # 取出后未收到结果的房间按当前间隔再次到期
+    assert {r.full_room_code for r in scheduler.due(now=31)} == {r.full_room_code for r in rooms[5:]}
+    assert scheduler.observe(rooms[0].full_room_code, _status(), now=31) is False
+
+
+def test_scheduler_with_sweeper():
+    """调度器驱动 VersionSweeper：结果不变的房间探测次数随时间减少"""
+    probe = _ProbeRecorder(latency=0)
+    scheduler = ProbeScheduler(min_interval=30, max_interval=600)
+    clock = [0]
+
+    async def on_result(room, status):
+        scheduler.observe(room.full_room_code, status, now=clock[0])
+
+    sweeper = VersionSweeper(on_result, per_host_interval=0, probe=probe)
+    rooms = _rooms(20, hosts=4)
+
+    async def run():
+        for tick in range(0, 3600, 5):
+            clock[0] = tick
+            scheduler.sync(rooms, now=tick)
+            due = scheduler.due(now=tick)
+            if due:
+                await sweeper.sweep(due)
+
+    asyncio.run(run())
+    # 固定 30 秒一轮需要 20 * 120 次；退避后每个房间在 0/30/90/210/450/930 秒探测，之后每 600 秒一次
+    assert sweeper.probes_total == 20 * 10
+    assert scheduler.stats()["max_interval_rooms"] == 20
@@ -1,8 +1,8 @@
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-                              QLabel, QScrollArea, QFrame, QApplication, QMessageBox)
+                              QLabel, QScrollArea, QFrame, QApplication, QMessageBox, QLineEdit)
 from PySide6.QtCore import Qt, QTimer
 from PySide6.QtGui import QCursor
-from src.network.LobbyService import LobbyWorker, OnlineCountWorker, UserHeartbeatManager
+from src.network.LobbyService import LobbyWorker, LobbyEventStream, LobbySearchWorker, UserHeartbeatManager
 from src.utils.LogManager import get_logger
 
 logger = get_logger()
@@ -83,21 +83,28 @@ class RoomCard(QFrame):
 
 
 class LobbyTab(QWidget):
+    # 输入停止多久后才发起检索（毫秒）
+    SEARCH_DEBOUNCE_MS = 300
+
     def __init__(self, parent_window):
         super().__init__()
         self.parent_window = parent_window
         self.worker = None
-        self.online_worker = None
+        self.event_stream = None
+        self.search_worker = None
         self.heartbeat_manager = None
+        # 实时房间列表（事件流推送），检索结果显示期间暂存，清空搜索框后恢复
+        self.live_rooms = []
+        self.search_query = ""
+        self.next_cursor = None
         self.setup_ui()
-        # 延迟刷新，避免启动时卡顿
-        QTimer.singleShot(1000, self.refresh_list)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.timeout.connect(self.run_search)
+        # 延迟连接事件流，避免启动时卡顿；房间列表和在线人数由服务器推送，不再轮询
+        QTimer.singleShot(1000, self.start_event_stream)
         # 启动用户心跳
         QTimer.singleShot(500, self.start_heartbeat)
-        # 定时刷新在线人数
-        self.online_timer = QTimer(self)
-        self.online_timer.timeout.connect(self.refresh_online_count)
-        self.online_timer.start(10000)  # 每10秒刷新一次
 
     def setup_ui(self):
         main_layout = QVBoxLayout(self)
@@ -110,6 +117,12 @@ class LobbyTab(QWidget):
         top_bar.addWidget(title)
         
         top_bar.addStretch() 
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("搜索房间名 / 简介")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.textChanged.connect(lambda: self.search_timer.start(self.SEARCH_DEBOUNCE_MS))
+        top_bar.addWidget(self.search_edit)
         
         self.refresh_btn = QPushButton("🔄 刷新列表")
         self.refresh_btn.clicked.connect(self.refresh_list)
@@ -130,6 +143,11 @@ class LobbyTab(QWidget):
         self.scroll.setWidget(self.content_widget)
         main_layout.addWidget(self.scroll)
 
+        self.more_btn = QPushButton("加载更多")
+        self.more_btn.clicked.connect(self.load_more)
+        self.more_btn.hide()
+        main_layout.addWidget(self.more_btn)
+
         # 底部栏：状态 + 在线人数
         bottom_bar = QHBoxLayout()
         
@@ -149,24 +167,19 @@ class LobbyTab(QWidget):
         """启动用户心跳"""
         self.heartbeat_manager = UserHeartbeatManager(self)
         self.heartbeat_manager.start()
-        # 立即获取一次在线人数
-        self.refresh_online_count()
 
-    def refresh_online_count(self):
-        """刷新在线人数"""
-        # 防止重入：如果上一次请求还没完成，跳过本次
-        if self.online_worker:
-            try:
-                if self.online_worker.isRunning():
-                    return
-            except RuntimeError:
-                self.online_worker = None
+    def start_event_stream(self):
+        """连接大厅事件流（断线自动重连）"""
+        self.status_label.setText("正在加载房间列表...")
+        self.event_stream = LobbyEventStream(self)
+        self.event_stream.rooms_loaded.connect(self.on_live_rooms)
+        self.event_stream.online_count_updated.connect(self.on_online_count_updated)
+        self.event_stream.connection_changed.connect(self.on_stream_connection_changed)
+        self.event_stream.start()
 
-        self.online_worker = OnlineCountWorker(self)
-        self.online_worker.online_count_updated.connect(self.on_online_count_updated)
-        # 任务完成后自动清理
-        self.online_worker.finished.connect(self.online_worker.deleteLater)
-        self.online_worker.start()
+    def on_stream_connection_changed(self, connected):
+        if not connected:
+            self.status_label.setText("与大厅服务器的连接已断开，正在重连...")
 
     def on_online_count_updated(self, count):
         """更新在线人数显示"""
@@ -183,32 +196,83 @@ class LobbyTab(QWidget):
 
         self.refresh_btn.setEnabled(False)
         self.status_label.setText("正在加载房间列表...")
-        
-        # 清空现有列表
-        while self.content_layout.count():
-            item = self.content_layout.takeAt(0)
-            widget = item.widget()
-            if widget:
-                widget.deleteLater()
 
         # 启动后台线程
         self.worker = LobbyWorker(self)
-        self.worker.rooms_loaded.connect(self.on_rooms_loaded)
+        self.worker.rooms_loaded.connect(self.on_live_rooms)
         self.worker.error_occurred.connect(self.on_error)
         self.worker.finished.connect(lambda: self.refresh_btn.setEnabled(True))
         self.worker.finished.connect(self.worker.deleteLater)
         self.worker.start()
 
+    def on_live_rooms(self, rooms):
+        """实时房间列表更新；正在显示检索结果时只暂存"""
+        self.live_rooms = rooms
+        if not self.search_query:
+            self.on_rooms_loaded(rooms)
+
     def on_rooms_loaded(self, rooms):
+        # 清空现有列表
+        while self.content_layout.count():
+            item = self.content_layout.takeAt(0)
+            widget = item.widget()
+            if widget:
+                widget.deleteLater()
+        self.more_btn.hide()
+
         if not rooms:
-            self.status_label.setText("当前暂无公开房间")
+            self.status_label.setText("没有找到匹配的房间" if self.search_query else "当前暂无公开房间")
             return
 
+        self.append_rooms(rooms)
+
+    def append_rooms(self, rooms):
         for room in rooms:
             card = RoomCard(room)
             self.content_layout.addWidget(card)
-        
-        self.status_label.setText(f"已加载 {len(rooms)} 个房间")
+
+        self.status_label.setText(f"已加载 {self.content_layout.count()} 个房间")
+
+    def run_search(self):
+        """搜索框停止输入后发起检索；清空时恢复实时列表"""
+        self.search_query = self.search_edit.text().strip()
+        self.next_cursor = None
+        if not self.search_query:
+            self.on_rooms_loaded(self.live_rooms)
+            return
+        self.status_label.setText("正在搜索...")
+        self.start_search(self.search_query)
+
+    def load_more(self):
+        if self.search_query and self.next_cursor:
+            self.more_btn.setEnabled(False)
+            self.start_search(self.search_query, self.next_cursor)
+
+    def start_search(self, query, cursor=None):
+        worker = LobbySearchWorker(query, cursor, self)
+        worker.results_loaded.connect(
+            lambda rooms, next_cursor: self.on_search_results(query, cursor, rooms, next_cursor))
+        worker.error_occurred.connect(self.on_search_error)
+        worker.finished.connect(worker.deleteLater)
+        self.search_worker = worker
+        worker.start()
+
+    def on_search_results(self, query, cursor, rooms, next_cursor):
+        # 忽略已过期的检索（用户又修改了搜索词）
+        if query != self.search_query:
+            return
+        if cursor is None:
+            self.on_rooms_loaded(rooms)
+        else:
+            self.append_rooms(rooms)
+        self.next_cursor = next_cursor
+        self.more_btn.setEnabled(True)
+        self.more_btn.setVisible(bool(next_cursor))
+
+    def on_search_error(self, msg):
+        self.more_btn.setEnabled(True)
+        self.status_label.setText("搜索失败")
+        logger.warning(f"Lobby search failed: {msg}")
 
     def on_error(self, msg):
         self.status_label.setText("加载失败")
@@ -218,5 +282,5 @@ class LobbyTab(QWidget):
         """清理资源"""
         if self.heartbeat_manager:
             self.heartbeat_manager.stop()
-        if self.online_timer:
-            self.online_timer.stop()
+        if self.event_stream:
+            self.event_stream.stop()
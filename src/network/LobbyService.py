@@ -1,7 +1,10 @@
 import json
+import random
+import threading
+import urllib.parse
 import urllib.request
 from PySide6.QtCore import QThread, Signal, QTimer, QObject
-from src.utils.HttpManager import fetch_url_content
+from src.utils.HttpManager import fetch_url_content, fetch_url_cached, fetch_url_if_modified, get_session
 from src.utils.LogManager import get_logger
 
 logger = get_logger()
@@ -11,30 +14,113 @@ class LobbyService:
     API_BASE = "https://mapi.clash.ink/api/lobby"
     API_URL = f"{API_BASE}/rooms"
     HEARTBEAT_URL = f"{API_BASE}/heartbeat"
-    ONLINE_URL = f"{API_BASE}/online"
+    EVENTS_URL = f"{API_BASE}/events"
+    SEARCH_URL = f"{API_BASE}/rooms/search"
+    SEARCH_PAGE_SIZE = 30
+
+    # 本地房间表 full_room_code -> room，以及对应的服务器列表版本（用于增量请求）
+    _rooms = {}
+    _version = None
+    _lock = threading.Lock()
 
     @staticmethod
     def get_rooms():
         """
         从服务器获取房间列表
+        已有本地房间表时只请求 since 之后的增量并合并；服务器返回完整列表时整体替换。
+        所有请求都是条件请求：首次请求带上次响应的 ETag；增量请求带本地版本对应的校验器
+        （服务器的 ETag 为 W/"<version>"），列表未变化时服务器返回 304，本地房间表保持不变
         Returns:
-            list: 房间字典列表，如果失败则返回空列表
+            list: 房间字典列表（按更新时间倒序），如果失败则返回空列表
         """
-        try:
-            content = fetch_url_content(LobbyService.API_URL)
-            if not content:
-                logger.error("Empty response from Lobby API")
+        with LobbyService._lock:
+            try:
+                version = LobbyService._version
+                if version is None:
+                    content = fetch_url_cached(LobbyService.API_URL)
+                else:
+                    content = fetch_url_if_modified(f"{LobbyService.API_URL}?since={version}",
+                                                    f'W/"{version}"')
+                    if content is None:
+                        return LobbyService._sorted_rooms()
+                if not content:
+                    logger.error("Empty response from Lobby API")
+                    return []
+
+                data = json.loads(content)
+                if not data.get("success"):
+                    logger.warning(f"Lobby API returned failure: {data.get('message')}")
+                    return []
+                LobbyService._apply_rooms(data)
+                return LobbyService._sorted_rooms()
+            except Exception as e:
+                logger.error(f"Failed to fetch lobby rooms: {e}")
                 return []
-            
-            data = json.loads(content)
-            if data.get("success"):
-                return data.get("rooms", [])
+
+    @staticmethod
+    def _sorted_rooms():
+        """本地房间表（按更新时间倒序），调用方需持有 _lock"""
+        return sorted(LobbyService._rooms.values(),
+                      key=lambda r: r.get("updated_at", 0), reverse=True)
+
+    @staticmethod
+    def _apply_rooms(data):
+        """把完整列表或增量合并进本地房间表"""
+        rooms = data.get("rooms", [])
+        if data.get("full", True):
+            LobbyService._rooms = {room["full_room_code"]: room for room in rooms}
+        else:
+            for code in data.get("removed", []):
+                LobbyService._rooms.pop(code, None)
+            for room in rooms:
+                LobbyService._rooms[room["full_room_code"]] = room
+        # 旧版服务器不返回 version，此时每次都拉取完整列表
+        LobbyService._version = data.get("version")
+
+    @staticmethod
+    def apply_event(event, data, event_id=None):
+        """
+        把一条大厅事件合并进本地房间表
+        Returns:
+            list | None: 房间列表变化时返回新的房间列表，否则返回 None
+        """
+        with LobbyService._lock:
+            if event in ("snapshot", "delta"):
+                LobbyService._apply_rooms(data)
+            elif event == "room":
+                LobbyService._rooms[data["full_room_code"]] = data
+            elif event == "remove":
+                LobbyService._rooms.pop(data["full_room_code"], None)
             else:
-                logger.warning(f"Lobby API returned failure: {data.get('message')}")
-                return []
-        except Exception as e:
-            logger.error(f"Failed to fetch lobby rooms: {e}")
-            return []
+                return None
+            if event_id and event_id.isdigit():
+                LobbyService._version = int(event_id)
+            return LobbyService._sorted_rooms()
+
+    @staticmethod
+    def last_version():
+        with LobbyService._lock:
+            return LobbyService._version
+
+    @staticmethod
+    def search_rooms(query, cursor=None):
+        """
+        服务端检索公开房间（房间名/简介匹配，按最近心跳排序）
+        Returns:
+            tuple: (房间字典列表, 下一页游标或 None)
+        Raises:
+            RuntimeError: 请求失败
+        """
+        params = {"q": query, "limit": LobbyService.SEARCH_PAGE_SIZE}
+        if cursor:
+            params["cursor"] = cursor
+        content = fetch_url_content(f"{LobbyService.SEARCH_URL}?{urllib.parse.urlencode(params)}")
+        if not content:
+            raise RuntimeError("Empty response from Lobby search API")
+        data = json.loads(content)
+        if not data.get("success"):
+            raise RuntimeError(data.get("message") or data.get("detail") or "Search failed")
+        return data.get("rooms", []), data.get("next_cursor")
 
     @staticmethod
     def send_heartbeat():
@@ -50,19 +136,6 @@ class LobbyService:
         except Exception:
             return False
 
-    @staticmethod
-    def get_online_count():
-        """获取在线用户数量"""
-        try:
-            content = fetch_url_content(LobbyService.ONLINE_URL)
-            if content:
-                data = json.loads(content)
-                if data.get("success"):
-                    return data.get("online_count", 0)
-        except Exception:
-            pass
-        return 0
-
 class LobbyWorker(QThread):
     """
     后台拉取房间列表的线程
@@ -80,16 +153,124 @@ class LobbyWorker(QThread):
         except Exception as e:
             self.error_occurred.emit(str(e))
 
-class OnlineCountWorker(QThread):
-    """后台获取在线人数的线程"""
-    online_count_updated = Signal(int)
-    
+class LobbySearchWorker(QThread):
+    """
+    后台检索房间的线程
+    Signals:
+        results_loaded (list, object): 本页房间列表和下一页游标（没有更多时为 None）
+        error_occurred (str): 检索失败，携带错误信息
+    """
+    results_loaded = Signal(list, object)
+    error_occurred = Signal(str)
+
+    def __init__(self, query, cursor=None, parent=None):
+        super().__init__(parent)
+        self.query = query
+        self.cursor = cursor
+
     def run(self):
         try:
-            count = LobbyService.get_online_count()
-            self.online_count_updated.emit(count)
-        except Exception:
-            self.online_count_updated.emit(0)
+            rooms, next_cursor = LobbyService.search_rooms(self.query, self.cursor)
+            self.results_loaded.emit(rooms, next_cursor)
+        except Exception as e:
+            self.error_occurred.emit(str(e))
+
+class LobbyEventStream(QThread):
+    """
+    大厅事件流 (SSE) 消费线程，替代轮询房间列表和在线人数
+    断线后按指数退避重连，并带上 Last-Event-ID 只补发增量
+    Signals:
+        rooms_loaded (list): 房间列表变化，携带完整的房间列表
+        online_count_updated (int): 在线人数变化
+        connection_changed (bool): 连接建立 / 断开
+    """
+    rooms_loaded = Signal(list)
+    online_count_updated = Signal(int)
+    connection_changed = Signal(bool)
+
+    # 服务端每 15 秒发送一次保活注释，超过该时间没有任何数据视为连接已断开
+    READ_TIMEOUT = 45
+    BACKOFF_INITIAL = 1.0
+    BACKOFF_MAX = 60.0
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._stopped = threading.Event()
+        self._response = None
+
+    def stop(self):
+        """停止并等待线程退出"""
+        self._stopped.set()
+        response = self._response
+        if response is not None:
+            try:
+                response.close()
+            except Exception:
+                pass
+        self.wait(3000)
+
+    def run(self):
+        backoff = self.BACKOFF_INITIAL
+        while not self._stopped.is_set():
+            try:
+                if self._consume():
+                    backoff = self.BACKOFF_INITIAL
+            except Exception as e:
+                if not self._stopped.is_set():
+                    logger.warning(f"Lobby event stream disconnected: {e}")
+            finally:
+                self._response = None
+            if self._stopped.is_set():
+                break
+            self.connection_changed.emit(False)
+            # 加入抖动，避免服务器重启后所有客户端同时重连
+            self._stopped.wait(backoff * random.uniform(0.5, 1.0))
+            backoff = min(backoff * 2, self.BACKOFF_MAX)
+
+    def _consume(self):
+        """读取一条连接直到断开；收到过事件时返回 True"""
+        headers = {"Accept": "text/event-stream", "Cache-Control": "no-cache"}
+        version = LobbyService.last_version()
+        if version is not None:
+            headers["Last-Event-ID"] = str(version)
+        response = get_session().get(LobbyService.EVENTS_URL, headers=headers, stream=True,
+                                     timeout=(10, self.READ_TIMEOUT))
+        self._response = response
+        with response:
+            response.raise_for_status()
+            self.connection_changed.emit(True)
+            received = False
+            event, event_id, data = None, None, []
+            for line in response.iter_lines(decode_unicode=True):
+                if self._stopped.is_set():
+                    break
+                if line:
+                    if line.startswith(":"):
+                        continue
+                    field, _, value = line.partition(":")
+                    value = value[1:] if value.startswith(" ") else value
+                    if field == "event":
+                        event = value
+                    elif field == "id":
+                        event_id = value
+                    elif field == "data":
+                        data.append(value)
+                    continue
+                # 空行：一条事件结束
+                if event and data:
+                    received = True
+                    self._dispatch(event, "\n".join(data), event_id)
+                event, event_id, data = None, None, []
+            return received
+
+    def _dispatch(self, event, raw, event_id):
+        payload = json.loads(raw)
+        if event == "online":
+            self.online_count_updated.emit(payload.get("online_count", 0))
+            return
+        rooms = LobbyService.apply_event(event, payload, event_id)
+        if rooms is not None:
+            self.rooms_loaded.emit(rooms)
 
 class UserHeartbeatManager(QObject):
     """用户心跳管理器，每10秒发送一次心跳"""
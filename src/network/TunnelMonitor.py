@@ -9,6 +9,8 @@ class TunnelMonitor(QThread):
     """
     Independent thread to monitor active tunnel health via Server API.
     Sends heartbeat every 15 seconds.
+    The first heartbeat is fully validated by the server, which then hands out
+    a lease; later heartbeats carry the lease and are only renewed.
     If Server says 'stop', emits stop_mapping_signal.
     """
     stop_mapping_signal = Signal(str) # Emits reason for stopping
@@ -19,6 +21,7 @@ class TunnelMonitor(QThread):
         self.remote_port = remote_port
         self.is_running = True
         self.api_url = "https://mapi.clash.ink/api/tunnel/validate"
+        self.lease = None  # 服务端签发的校验租约
 
     def run(self):
         logger.info(f"TunnelMonitor started for {self.server_addr}:{self.remote_port}")
@@ -30,9 +33,11 @@ class TunnelMonitor(QThread):
                     "server_addr": self.server_addr,
                     "remote_port": int(self.remote_port)
                 }
+                if self.lease:
+                    payload["lease"] = self.lease
                 
-                # 2. Send Heartbeat (Robust check happens on server side)
-                # Client timeout 15s to allow server to perform 5 retries (2s * 5 + buffer)
+                # 2. Send Heartbeat (Robust check happens on server side when there is no valid lease)
+                # Client timeout 15s to allow server to perform 3 retries (2s + 3s + 5s + backoff)
                 response = post_json(self.api_url, payload, timeout=15)
                 
                 if response:
@@ -42,6 +47,8 @@ class TunnelMonitor(QThread):
                         logger.warning(f"TunnelMonitor received STOP command: {reason}")
                         self.stop_mapping_signal.emit(reason)
                         break # Exit loop
+                    # 保存（续期后的）租约，服务端不支持租约时为 None
+                    self.lease = response.get("lease")
                 
             except Exception as e:
                 logger.error(f"TunnelMonitor error: {e}")
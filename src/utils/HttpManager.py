@@ -8,6 +8,9 @@ logger = get_logger()
 
 _session = None
 
+# url -> (ETag, body) of the last 200 response, used for conditional GETs
+_validators = {}
+
 def get_session():
     """
     Returns a pre-configured, singleton requests.Session object.
@@ -56,6 +59,48 @@ def fetch_url_content(url, timeout=10):
         # Return empty string on failure, let caller handle it
         return "" 
 
+def fetch_url_cached(url, timeout=10):
+    """
+    Conditional GET: sends the stored ETag as If-None-Match and returns the
+    cached body when the server answers 304 Not Modified.
+    """
+    try:
+        session = get_session()
+        headers = {}
+        cached = _validators.get(url)
+        if cached:
+            headers['If-None-Match'] = cached[0]
+        response = session.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and cached:
+            return cached[1]
+        response.raise_for_status()
+        etag = response.headers.get('ETag')
+        if etag:
+            _validators[url] = (etag, response.text)
+        else:
+            _validators.pop(url, None)
+        return response.text
+    except Exception as e:
+        logger.error(f"Failed to fetch {url}: {e}")
+        return ""
+
+def fetch_url_if_modified(url, etag, timeout=10):
+    """
+    Conditional GET with a validator held by the caller (e.g. derived from a
+    list version). Returns None when the server answers 304 Not Modified,
+    otherwise the body ("" on failure, like fetch_url_content).
+    """
+    try:
+        session = get_session()
+        response = session.get(url, headers={'If-None-Match': etag}, timeout=timeout)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        return response.text
+    except Exception as e:
+        logger.error(f"Failed to fetch {url}: {e}")
+        return ""
+
 def post_json(url, data, timeout=10):
     """
     Unified HTTP POST interface for JSON data.